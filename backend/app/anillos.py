@@ -0,0 +1,123 @@
+"""
+anillos.py - Búsqueda de candidatos por anillos cuando los cercanos no alcanzan
+
+Si el barrio o la ciudad del cliente tienen pocos trabajadores de un oficio, la búsqueda
+se amplía por anillos hasta reunir CANDIDATOS_MINIMOS:
+
+1. Barrio: los trabajadores cuya cobertura alcanza la ubicación del cliente (si se conoce).
+2. Ciudad: el resto de trabajadores de la ciudad del cliente.
+3. Ciudades vecinas, de la más cercana a la más lejana.
+
+Las ciudades vecinas de cada ciudad (distancia entre los centroides de sus barrios) se
+precalculan en CiudadesVecinas, así que cada anillo es una búsqueda más por (ciudad, oficio)
+—un acceso al índice en memoria— y no otra consulta con joins sobre todo el oficio.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select, func
+
+from database import Barrio
+from geo import distancias_km, matriz_distancias_km
+
+
+# Por debajo de esto se amplía la búsqueda al siguiente anillo
+CANDIDATOS_MINIMOS = int(os.getenv("ANILLOS_CANDIDATOS_MINIMOS", "5"))
+
+# Solo se consideran vecinas las ciudades a menos de esta distancia, y como mucho estas
+RADIO_VECINAS_KM = float(os.getenv("ANILLOS_RADIO_VECINAS_KM", "300"))
+MAX_CIUDADES_VECINAS = int(os.getenv("ANILLOS_MAX_CIUDADES_VECINAS", "5"))
+
+
+class CiudadesVecinas:
+    """Para cada ciudad, las ciudades más cercanas ordenadas por distancia entre centroides."""
+
+    def __init__(self, radio_km: float = RADIO_VECINAS_KM, maximo: int = MAX_CIUDADES_VECINAS):
+        self.radio_km = radio_km
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._vecinas = None
+        self._ultima_actualizacion = {"ciudades": 0, "ms": 0.0}
+
+    @property
+    def lista(self) -> bool:
+        return self._vecinas is not None
+
+    def actualizar(self, engine):
+        """Recalcula los centroides de las ciudades y sus listas de vecinas."""
+        inicio = time.perf_counter()
+        with self._lock:
+            with engine.connect() as conexion:
+                filas = conexion.execute(
+                    select(Barrio.id_ciudad, func.avg(Barrio.latitud), func.avg(Barrio.longitud))
+                    .where(Barrio.latitud.isnot(None), Barrio.longitud.isnot(None))
+                    .group_by(Barrio.id_ciudad)
+                    .order_by(Barrio.id_ciudad)
+                ).all()
+            ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+            latitudes = np.array([float(fila[1]) for fila in filas])
+            longitudes = np.array([float(fila[2]) for fila in filas])
+
+            distancias = matriz_distancias_km(latitudes, longitudes, latitudes, longitudes)
+            np.fill_diagonal(distancias, np.inf)
+            vecinas = {}
+            for i, id_ciudad in enumerate(ids.tolist()):
+                orden = np.lexsort((ids, distancias[i]))[:self.maximo]
+                vecinas[id_ciudad] = [
+                    (int(ids[j]), round(float(distancias[i, j]), 1))
+                    for j in orden if distancias[i, j] <= self.radio_km
+                ]
+            self._vecinas = vecinas
+        ms = (time.perf_counter() - inicio) * 1000
+        self._ultima_actualizacion = {"ciudades": len(ids), "ms": round(ms, 1)}
+        print(f"🧭 Ciudades vecinas: {len(ids)} ciudades georreferenciadas ({ms:.0f} ms)")
+
+    def vecinas(self, id_ciudad: int) -> list:
+        """[(id_ciudad, km), ...] de la más cercana a la más lejana; [] si no se conoce."""
+        return (self._vecinas or {}).get(id_ciudad, [])
+
+    def invalidar(self):
+        self._vecinas = None
+
+    def metricas(self) -> dict:
+        vecinas = self._vecinas
+        return {
+            "lista": vecinas is not None,
+            "ciudades": len(vecinas) if vecinas is not None else 0,
+            "radio_km": self.radio_km,
+            "ultima_actualizacion": self._ultima_actualizacion,
+        }
+
+
+def ampliar(candidatos: list, buscar_ciudad, ciudades: list, limite: int = None,
+            ubicacion: tuple = None, minimo: int = CANDIDATOS_MINIMOS) -> tuple:
+    """Completa `candidatos` con los de `ciudades`, una a una, hasta tener `minimo`.
+
+    `buscar_ciudad(id_ciudad)` devuelve los candidatos de esa ciudad en orden; los que ya
+    están se omiten y los nuevos llevan su distancia_km al cliente si hay coordenadas.
+    Devuelve (candidatos, ciudades recorridas).
+    """
+    candidatos = list(candidatos)
+    vistos = {c["id_trabajador"] for c in candidatos}
+    recorridas = []
+    for id_ciudad in ciudades:
+        if len(candidatos) >= minimo or (limite is not None and len(candidatos) >= limite):
+            break
+        recorridas.append(id_ciudad)
+        nuevos = [c for c in buscar_ciudad(id_ciudad) if c["id_trabajador"] not in vistos]
+        if limite is not None:
+            nuevos = nuevos[:limite - len(candidatos)]
+        if not nuevos:
+            continue
+        distancias = [None] * len(nuevos)
+        if ubicacion is not None and all(c.get("latitud") is not None for c in nuevos):
+            distancias = distancias_km(
+                ubicacion[0], ubicacion[1], [c["latitud"] for c in nuevos], [c["longitud"] for c in nuevos]
+            ).round(2).tolist()
+        for candidato, distancia in zip(nuevos, distancias):
+            vistos.add(candidato["id_trabajador"])
+            candidatos.append({**candidato, "distancia_km": distancia})
+    return candidatos, recorridas
@@ -0,0 +1,296 @@
+"""
+asignacion.py - Asignación óptima por lotes de las solicitudes pendientes
+
+El pipeline recomienda a cada solicitud por separado, así que los trabajadores mejor
+puntuados le salen a todo el mundo mientras otros quedan sin trabajo. Este proceso toma
+las solicitudes pendientes de una ventana de tiempo y resuelve una asignación con
+capacidad que maximiza la suma de scores:
+
+1. Las solicitudes se agrupan por (oficio, ciudad del barrio de servicio); cada grupo es un
+   problema independiente con los candidatos de esa ciudad y oficio.
+2. La matriz solicitud × trabajador usa la fórmula por urgencia de puntuacion.py, con la
+   proximidad calculada desde el barrio de cada solicitud. Un trabajador que no alcanza el
+   barrio según su cobertura_km queda prohibido para esa solicitud.
+3. Cada trabajador aparece tantas veces como servicios le quedan libres (capacidad menos
+   sus servicios asignados/en proceso y sus asignaciones por lotes de solicitudes que
+   siguen pendientes) y el método húngaro resuelve la asignación:
+   primero el máximo de solicitudes atendidas, luego el máximo score total.
+4. Las asignaciones se escriben en bloque como recomendaciones con es_asignado = true.
+   Una solicitud que ya tiene una recomendación asignada no vuelve a entrar.
+
+La capacidad es global: un trabajador con varios oficios la va gastando grupo a grupo.
+Dentro de la API los cupos libres salen de capacidad.CapacidadTrabajadores (que también
+cuenta las reservas de las solicitudes recién guardadas) y cada asignación reserva su cupo;
+desde la línea de comandos se leen de la base (capacidad.carga_trabajadores).
+
+Uso:
+    python asignacion.py [--ventana-horas 24] [--capacidad 2] [--simular]
+"""
+
+import argparse
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, exists, and_
+
+from database import (
+    Solicitud, Barrio, Ciudad, Oficio, Trabajador, Recomendacion
+)
+from consultas import SENTENCIA_CANDIDATOS_UBICADOS
+from geo import matriz_distancias_km, COBERTURA_MAX_KM
+from puntuacion import COMPONENTES, VALOR_NEUTRO, matriz_componentes, precio_referencia, vector_pesos
+from capacidad import MAX_CONCURRENCIA, carga_trabajadores
+
+
+VENTANA_HORAS = float(os.getenv("ASIGNACION_VENTANA_HORAS", "24"))
+
+# Cada cuántos minutos corre el proceso dentro de la API (0 = solo a demanda)
+INTERVALO_MINUTOS = float(os.getenv("ASIGNACION_INTERVALO_MINUTOS", "0"))
+
+_PROXIMIDAD = COMPONENTES.index("proximidad")
+
+
+# =========================
+# MÉTODO HÚNGARO
+# =========================
+
+def hungaro(costo: np.ndarray) -> np.ndarray:
+    """Asignación de costo mínimo para una matriz n × m con n <= m.
+
+    Devuelve, para cada fila, la columna asignada. Es el método húngaro con potenciales
+    (camino de aumento más corto, O(n²·m)); el recorrido de columnas está vectorizado.
+    """
+    n, m = costo.shape
+    if n > m:
+        raise ValueError("hungaro() necesita al menos tantas columnas como filas")
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    fila_de = np.zeros(m + 1, dtype=np.int64)      # fila (base 1) asignada a cada columna; 0 = libre
+    anterior = np.zeros(m + 1, dtype=np.int64)     # columna previa en el camino de aumento
+
+    for i in range(1, n + 1):
+        fila_de[0] = i
+        j0 = 0
+        minimo = np.full(m + 1, np.inf)
+        usada = np.zeros(m + 1, dtype=bool)
+        while True:
+            usada[j0] = True
+            i0 = fila_de[j0]
+            libres = ~usada[1:]
+            reducido = costo[i0 - 1] - u[i0] - v[1:]
+            mejora = libres & (reducido < minimo[1:])
+            minimo[1:][mejora] = reducido[mejora]
+            anterior[1:][mejora] = j0
+
+            pendientes = np.where(libres, minimo[1:], np.inf)
+            j1 = int(np.argmin(pendientes)) + 1
+            delta = pendientes[j1 - 1]
+            u[fila_de[usada]] += delta
+            v[usada] -= delta
+            minimo[1:][libres] -= delta
+            j0 = j1
+            if fila_de[j0] == 0:
+                break
+        while j0:
+            j1 = anterior[j0]
+            fila_de[j0] = fila_de[j1]
+            j0 = j1
+
+    columna_de = np.full(n, -1, dtype=np.int64)
+    columnas = np.flatnonzero(fila_de[1:])
+    columna_de[fila_de[1:][columnas] - 1] = columnas
+    return columna_de
+
+
+def asignar_con_capacidad(scores: np.ndarray, permitido: np.ndarray, capacidad: np.ndarray) -> np.ndarray:
+    """Trabajador asignado a cada solicitud (-1 = ninguno), maximizando primero cuántas
+    se atienden y luego la suma de scores.
+
+    scores y permitido son solicitudes × trabajadores; capacidad, los cupos de cada trabajador.
+    """
+    n = scores.shape[0]
+    # Más de n cupos de un trabajador no sirven de nada
+    cupos = np.repeat(np.arange(scores.shape[1]), np.minimum(capacidad, n))
+    if n == 0 or len(cupos) == 0:
+        return np.full(n, -1, dtype=np.int64)
+
+    # Cualquier asignación permitida cuesta <= 1: prohibir cuesta más que todas juntas
+    prohibido = n + 1.0
+    costo = np.where(permitido, 1.0 - scores, prohibido)[:, cupos]
+    if n <= len(cupos):
+        columna = hungaro(costo)
+        trabajador = cupos[columna]
+    else:
+        # Más solicitudes que cupos: se resuelve la transpuesta (cada cupo elige solicitud)
+        solicitud_de_cupo = hungaro(costo.T)
+        trabajador = np.full(n, -1, dtype=np.int64)
+        trabajador[solicitud_de_cupo] = cupos
+    filas = np.flatnonzero(trabajador >= 0)
+    prohibidas = filas[~permitido[filas, trabajador[filas]]]
+    trabajador[prohibidas] = -1
+    return trabajador
+
+
+# =========================
+# PROCESO POR LOTES
+# =========================
+
+def _pendientes(conexion, desde: datetime) -> list:
+    ya_asignada = exists().where(and_(
+        Recomendacion.id_solicitud == Solicitud.id_solicitud,
+        Recomendacion.es_asignado
+    ))
+    return conexion.execute(
+        select(
+            Solicitud.id_solicitud, Solicitud.id_oficio, Solicitud.urgencia,
+            Solicitud.precio_estimado_mercado, Barrio.id_ciudad, Barrio.latitud, Barrio.longitud
+        )
+        .join(Barrio, Solicitud.id_barrio_servicio == Barrio.id_barrio)
+        .where(Solicitud.estado == "pendiente", Solicitud.fecha_creacion >= desde, ~ya_asignada)
+        .order_by(Solicitud.fecha_creacion, Solicitud.id_solicitud)
+    ).all()
+
+
+def _candidatos(conexion, oficios: set, ciudades: set) -> dict:
+    """{(id_oficio, id_ciudad): filas} de los candidatos de esos oficios y ciudades."""
+    filas = conexion.execute(
+        SENTENCIA_CANDIDATOS_UBICADOS
+        .where(Oficio.id_oficio.in_(oficios), Ciudad.id_ciudad.in_(ciudades))
+        .order_by(Trabajador.id_trabajador)
+    ).mappings().all()
+    grupos = defaultdict(list)
+    for fila in filas:
+        grupos[(fila["id_oficio"], fila["id_ciudad"])].append(fila)
+    return grupos
+
+
+def _resolver_grupo(solicitudes: list, candidatos: list, capacidad: np.ndarray) -> tuple:
+    """Resuelve un grupo. Devuelve (trabajador por solicitud, scores, distancias, componentes
+    de los candidatos sin proximidad, proximidad y pesos por solicitud) para armar las filas."""
+    latitudes = np.array([np.nan if s.latitud is None else float(s.latitud) for s in solicitudes])
+    longitudes = np.array([np.nan if s.longitud is None else float(s.longitud) for s in solicitudes])
+    distancias = matriz_distancias_km(
+        latitudes, longitudes,
+        [np.nan if c["latitud"] is None else float(c["latitud"]) for c in candidatos],
+        [np.nan if c["longitud"] is None else float(c["longitud"]) for c in candidatos]
+    )
+    cobertura = np.minimum(np.array([c["cobertura_km"] for c in candidatos], dtype=np.float64), COBERTURA_MAX_KM)
+    cobertura = np.where(cobertura > 0, cobertura, COBERTURA_MAX_KM)
+    # Sin coordenadas no se puede descartar a nadie: vale el filtro por ciudad
+    permitido = np.isnan(distancias) | (distancias <= cobertura)
+    proximidad = np.where(np.isnan(distancias), VALOR_NEUTRO, np.clip(1 - distancias / cobertura, 0, 1))
+
+    base = matriz_componentes(candidatos)
+    base[:, _PROXIMIDAD] = 0.0
+    pesos = np.stack([vector_pesos(s.urgencia) for s in solicitudes])
+    scores = pesos @ base.T + proximidad * pesos[:, _PROXIMIDAD][:, None]
+    return asignar_con_capacidad(scores, permitido, capacidad), scores, distancias, base, proximidad, pesos
+
+
+def asignar_pendientes(conexion, ventana_horas: float = VENTANA_HORAS,
+                       capacidad_trabajador: int = MAX_CONCURRENCIA, simular: bool = False,
+                       capacidades=None) -> dict:
+    """Asigna las solicitudes pendientes de las últimas `ventana_horas` y escribe las
+    recomendaciones asignadas (salvo con `simular`). Devuelve un resumen.
+
+    Con `capacidades` (CapacidadTrabajadores) los cupos libres salen de ahí y cada
+    asignación reserva el suyo a nombre de la solicitud; una reserva rechazada (otra
+    solicitud se llevó el cupo entretanto) deja la solicitud para la siguiente corrida.
+    En ese caso la escritura se confirma aquí mismo, y si falla se liberan las reservas.
+    """
+    inicio = time.perf_counter()
+    solicitudes = _pendientes(conexion, datetime.utcnow() - timedelta(hours=ventana_horas))
+    grupos = defaultdict(list)
+    for solicitud in solicitudes:
+        grupos[(solicitud.id_oficio, solicitud.id_ciudad)].append(solicitud)
+
+    candidatos_por_grupo = _candidatos(
+        conexion, {clave[0] for clave in grupos}, {clave[1] for clave in grupos}
+    ) if grupos else {}
+    ids_trabajador = {c["id_trabajador"] for filas in candidatos_por_grupo.values() for c in filas}
+    if capacidades is not None:
+        ids_ordenados = sorted(ids_trabajador)
+        libres = dict(zip(ids_ordenados, capacidades.disponibles(ids_ordenados, capacidad_trabajador).tolist()))
+    else:
+        carga = carga_trabajadores(conexion, ids_trabajador)
+        libres = {i: max(0, capacidad_trabajador - carga.get(i, 0)) for i in ids_trabajador}
+
+    filas = []
+    for clave in sorted(grupos):
+        pendientes = grupos[clave]
+        candidatos = [c for c in candidatos_por_grupo.get(clave, []) if libres[c["id_trabajador"]] > 0]
+        if not candidatos:
+            continue
+        capacidad = np.array([libres[c["id_trabajador"]] for c in candidatos], dtype=np.int64)
+        trabajador, scores, distancias, base, proximidad, pesos = _resolver_grupo(pendientes, candidatos, capacidad)
+
+        for i in np.flatnonzero(trabajador >= 0):
+            j = trabajador[i]
+            candidato, solicitud = candidatos[j], pendientes[i]
+            libres[candidato["id_trabajador"]] -= 1
+            if (capacidades is not None and not simular
+                    and not capacidades.reservar(candidato["id_trabajador"], capacidad_trabajador,
+                                                 id_solicitud=solicitud.id_solicitud)):
+                continue
+            contribuciones = base[j] * pesos[i]
+            contribuciones[_PROXIMIDAD] = proximidad[i, j] * pesos[i, _PROXIMIDAD]
+            precio = precio_referencia(candidato)
+            distancia = 0.0 if np.isnan(distancias[i, j]) else float(distancias[i, j])
+            filas.append({
+                "id_solicitud": solicitud.id_solicitud,
+                "id_trabajador": candidato["id_trabajador"],
+                "score_relevancia": round(float(min(max(scores[i, j], 0.0), 1.0)), 3),
+                "distancia_km": round(min(distancia, 999.99), 2),
+                "motivo_top": COMPONENTES[int(np.argmax(contribuciones))],
+                "precio_estimado": solicitud.precio_estimado_mercado,
+                "precio_propuesto": int(precio) if precio is not None else 0,
+                "explicacion": (
+                    f"Asignación por lotes entre {len(pendientes)} solicitudes y {len(candidatos)} "
+                    f"trabajadores de este oficio en la ciudad (score {scores[i, j]:.3f})."
+                ),
+                "es_asignado": True,
+            })
+
+    if filas and not simular:
+        try:
+            conexion.execute(Recomendacion.__table__.insert(), filas)
+            if capacidades is not None:
+                conexion.commit()
+        except Exception:
+            if capacidades is not None:
+                for fila in filas:
+                    capacidades.liberar(id_solicitud=fila["id_solicitud"])
+            raise
+
+    return {
+        "solicitudes_pendientes": len(solicitudes),
+        "grupos": len(grupos),
+        "asignadas": len(filas),
+        "sin_asignar": len(solicitudes) - len(filas),
+        "trabajadores_distintos": len({fila["id_trabajador"] for fila in filas}),
+        "score_promedio": round(float(np.mean([fila["score_relevancia"] for fila in filas])), 3) if filas else None,
+        "simulado": simular,
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Asignación óptima por lotes de solicitudes pendientes")
+    parser.add_argument("--ventana-horas", type=float, default=VENTANA_HORAS, help="Antigüedad máxima")
+    parser.add_argument("--capacidad", type=int, default=MAX_CONCURRENCIA,
+                        help="Servicios simultáneos por trabajador")
+    parser.add_argument("--simular", action="store_true", help="Calcular sin escribir recomendaciones")
+    args = parser.parse_args()
+
+    with engine.begin() as conexion:
+        resumen = asignar_pendientes(conexion, args.ventana_horas, args.capacidad, args.simular)
+    print(f"✅ Asignación por lotes: {resumen}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+cache_recomendaciones.py - Resultados de recomendación cacheados por cubeta y versión
+
+Para un mismo oficio, ciudad (o barrio) y urgencia la lista ordenada de candidatos y el
+orden de puntuacion.py son los mismos en cada solicitud hasta que cambian los datos, y se
+recalculaban cada vez. Aquí se guardan:
+
+- listas de candidatos de la búsqueda por anillos, por (oficio, ciudad, barrio);
+- recomendaciones deterministas de puntuacion.py (RecomendacionOutput con explicaciones
+  de plantilla), por (oficio, ciudad, barrio, urgencia).
+
+Lo que redacta el LLM no se guarda: parte de la descripción de cada solicitud, y no
+debe llegarle a otro usuario.
+
+La clave lleva la versión de lo que determina el resultado: la de las cubetas del índice
+que entran en la búsqueda (IndiceCandidatos.version), la de la capacidad de los
+trabajadores y la de los precios de mercado. Un cambio sube la versión y la clave vieja
+deja de pedirse; sale de la caché por TTL o por tamaño. No hace falta borrar nada.
+
+Una búsqueda sin candidatos se guarda aparte con un TTL corto (TTL_VACIO_SEGUNDOS): se
+responde el 404 sin volver a buscar, pero un trabajador nuevo aparece enseguida aunque su
+aviso no alcance a cambiar la versión.
+"""
+
+import copy
+import os
+import threading
+
+from cachetools import TTLCache
+from pydantic import BaseModel
+
+
+TTL_SEGUNDOS = int(os.getenv("CACHE_RECOMENDACIONES_TTL_SEGUNDOS", "3600"))
+TTL_VACIO_SEGUNDOS = int(os.getenv("CACHE_RECOMENDACIONES_TTL_VACIO_SEGUNDOS", "30"))
+MAXIMO_ENTRADAS = int(os.getenv("CACHE_RECOMENDACIONES_MAXIMO", "10000"))
+
+
+def _copia(valor):
+    if isinstance(valor, list):
+        # Las filas de candidatos no se modifican: basta otra lista
+        return list(valor)
+    if isinstance(valor, BaseModel):
+        return valor.model_copy(deep=True)
+    return copy.deepcopy(valor)
+
+
+class CacheRecomendaciones:
+    """Resultados por clave versionada, con caché negativa de TTL corto."""
+
+    def __init__(self, ttl: int = TTL_SEGUNDOS, ttl_vacio: int = TTL_VACIO_SEGUNDOS,
+                 maximo: int = MAXIMO_ENTRADAS):
+        self._lock = threading.Lock()
+        self._resultados = TTLCache(maxsize=maximo, ttl=ttl)
+        self._vacios = TTLCache(maxsize=maximo, ttl=ttl_vacio)
+        self._contadores = {"aciertos": 0, "fallos": 0, "aciertos_vacios": 0, "guardados": 0, "vacios_guardados": 0}
+
+    def obtener(self, clave: tuple):
+        """Copia del resultado guardado, o None. Las recomendaciones se modifican después
+        (distancias, explicaciones), por eso no se entrega el objeto cacheado."""
+        with self._lock:
+            valor = self._resultados.get(clave)
+            self._contadores["aciertos" if valor is not None else "fallos"] += 1
+        return _copia(valor) if valor is not None else None
+
+    def guardar(self, clave: tuple, valor):
+        """Guarda una copia: quien la calculó puede seguir modificando la suya."""
+        valor = _copia(valor)
+        with self._lock:
+            self._resultados[clave] = valor
+            self._contadores["guardados"] += 1
+
+    def es_vacio(self, clave: tuple) -> bool:
+        """True si esa búsqueda no encontró candidatos hace menos de TTL_VACIO_SEGUNDOS."""
+        with self._lock:
+            vacio = clave in self._vacios
+            self._contadores["aciertos_vacios"] += vacio
+            return vacio
+
+    def guardar_vacio(self, clave: tuple):
+        with self._lock:
+            self._vacios[clave] = True
+            self._contadores["vacios_guardados"] += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._resultados.clear()
+            self._vacios.clear()
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                **self._contadores,
+                "entradas": len(self._resultados),
+                "vacios": len(self._vacios),
+                "ttl_segundos": self._resultados.ttl,
+                "ttl_vacio_segundos": self._vacios.ttl,
+            }
@@ -0,0 +1,267 @@
+"""
+caches.py - Cachés en memoria del proceso, invalidadas por LISTEN/NOTIFY
+
+- Catálogo de oficios formateado para los prompts del LLM (se arma en cada solicitud).
+- Candidatos del pipeline de recomendación: índice por (ciudad, oficio) de
+  indice_candidatos.py, reconstruido en cada RECARGA y actualizado por aviso.
+- Matriz de distancias entre barrios (matriz_distancias.py), reabierta al cambiar barrios.
+- Ciudades vecinas de cada ciudad (anillos.py), para ampliar la búsqueda si faltan candidatos.
+- Candidatos y puntuaciones deterministas ya calculados (cache_recomendaciones.py), con la
+  versión de las cubetas del índice en la clave.
+
+Los avisos de notificaciones.py tocan solo lo afectado (p. ej. un cambio en
+trabajador_oficio solo recarga a ese trabajador en el índice), por eso el TTL puede ser
+largo aunque haya varias réplicas de la API escribiendo. Mientras la escucha no está
+conectada las cachés no se usan: se consulta la base directamente.
+
+Para evitar guardar un resultado calculado antes de una invalidación que llegó durante
+la consulta, cada caché lleva un contador de generación que las invalidaciones incrementan.
+"""
+
+import os
+import threading
+
+from cachetools import TTLCache
+from sqlalchemy import select
+
+from database import engine, Oficio
+from consultas import buscar_candidatos as buscar_candidatos_bd, LIMITE_CANDIDATOS
+from anillos import CiudadesVecinas, ampliar, CANDIDATOS_MINIMOS
+from cache_recomendaciones import CacheRecomendaciones
+from indice_candidatos import IndiceCandidatos
+from matriz_distancias import MatrizDistancias
+from notificaciones import EscuchaCambios
+from puntuacion import TOP_RECOMENDADOS
+
+
+TTL_SEGUNDOS = int(os.getenv("CACHE_TTL_SEGUNDOS", "3600"))
+
+escucha = EscuchaCambios(engine)
+matriz = MatrizDistancias()
+indice = IndiceCandidatos(engine, matriz)
+vecinas = CiudadesVecinas()
+recomendaciones = CacheRecomendaciones()
+
+_lock = threading.RLock()
+_oficios = TTLCache(maxsize=1, ttl=TTL_SEGUNDOS)
+_generacion = {"oficios": 0, "barrios": 0}
+_contadores = {"aciertos": 0, "fallos": 0, "sin_cache": 0, "invalidaciones": 0, "ampliaciones": 0}
+
+
+def _leer(cache, clave):
+    with _lock:
+        valor = cache.get(clave)
+        _contadores["aciertos" if valor is not None else "fallos"] += 1
+        return valor
+
+
+def _guardar(cache, nombre: str, generacion: int, clave, valor):
+    with _lock:
+        if _generacion[nombre] == generacion:
+            cache[clave] = valor
+
+
+# =========================
+# CONSULTAS CACHEADAS
+# =========================
+
+def catalogo_oficios(db) -> tuple:
+    """(texto de oficios para el LLM, ids de oficio válidos). Texto vacío si no hay oficios."""
+    if not escucha.conectada:
+        _contadores["sin_cache"] += 1
+        return _catalogo_oficios_bd(db)
+    valor = _leer(_oficios, "catalogo")
+    if valor is None:
+        generacion = _generacion["oficios"]
+        valor = _catalogo_oficios_bd(db)
+        _guardar(_oficios, "oficios", generacion, "catalogo", valor)
+    return valor
+
+
+def _catalogo_oficios_bd(db) -> tuple:
+    oficios = db.execute(
+        select(Oficio.id_oficio, Oficio.nombre_oficio, Oficio.categoria_servicio, Oficio.descripcion)
+        .order_by(Oficio.id_oficio)
+    ).all()
+    texto = "\n".join(
+        f"ID: {oficio.id_oficio}, Nombre: {oficio.nombre_oficio}, "
+        f"Categoría: {oficio.categoria_servicio}, Descripción: {oficio.descripcion}"
+        for oficio in oficios
+    )
+    return texto, frozenset(oficio.id_oficio for oficio in oficios)
+
+
+def buscar_candidatos(db, id_oficio: int, id_ciudad: int = None, limite: int = LIMITE_CANDIDATOS,
+                      ubicacion: tuple = None, id_barrio: int = None) -> list:
+    """consultas.buscar_candidatos resuelto con el índice en memoria cuando está al día.
+
+    `id_barrio` (el barrio de `ubicacion`) permite tomar las distancias de la matriz.
+    """
+    if not (escucha.conectada and indice.listo):
+        _contadores["sin_cache"] += 1
+        return list(buscar_candidatos_bd(db, id_oficio, id_ciudad, limite, ubicacion))
+    return indice.buscar(id_oficio, id_ciudad, limite, ubicacion, id_barrio)
+
+
+def mejores_candidatos(id_oficio: int, urgencia: str, k: int = TOP_RECOMENDADOS, excluir=None):
+    """Top-k por score del oficio con el índice (ver topk.mejores), sin los trabajadores de
+    `excluir`; None si no está al día."""
+    if not (escucha.conectada and indice.listo):
+        _contadores["sin_cache"] += 1
+        return None
+    return indice.mejores(id_oficio, urgencia, k, excluir=excluir)
+
+
+def buscar_candidatos_ampliando(db, id_oficio: int, id_ciudad: int, limite: int = LIMITE_CANDIDATOS,
+                                ubicacion: tuple = None, id_barrio: int = None) -> list:
+    """buscar_candidatos y, si salen menos de CANDIDATOS_MINIMOS, los anillos siguientes.
+
+    Con `ubicacion` el primer anillo es el de cobertura del barrio y el segundo el resto de
+    la ciudad; después, las ciudades vecinas por distancia (ver anillos.py).
+    """
+    candidatos = buscar_candidatos(db, id_oficio, id_ciudad, limite, ubicacion, id_barrio)
+    if id_ciudad is None or len(candidatos) >= CANDIDATOS_MINIMOS:
+        return candidatos
+
+    if not vecinas.lista:
+        _actualizar_vecinas()
+    ciudades = ([id_ciudad] if ubicacion is not None else []) + [c for c, _ in vecinas.vecinas(id_ciudad)]
+    ampliados, recorridas = ampliar(
+        candidatos, lambda ciudad: buscar_candidatos(db, id_oficio, ciudad, limite), ciudades, limite, ubicacion
+    )
+    if len(ampliados) > len(candidatos):
+        _contadores["ampliaciones"] += 1
+        print(f"🧭 Búsqueda ampliada: {len(candidatos)} → {len(ampliados)} candidatos "
+              f"(ciudades {recorridas})")
+    return ampliados
+
+
+def version_candidatos(id_oficio: int, id_ciudad: int = None) -> tuple:
+    """Versión de los candidatos del oficio en la ciudad y sus vecinas (todo el oficio sin
+    ciudad), para las claves de cache_recomendaciones. None si el índice no está al día."""
+    if not (escucha.conectada and indice.listo):
+        return None
+    ciudades = None if id_ciudad is None else (id_ciudad, *(c for c, _ in vecinas.vecinas(id_ciudad)))
+    # Un barrio cambiado mueve distancias y vecinas aunque ninguna cubeta cambie
+    return _generacion["barrios"], indice.version(id_oficio, ciudades)
+
+
+def buscar_candidatos_cacheados(db, id_oficio: int, id_ciudad: int, ubicacion: tuple = None,
+                                id_barrio: int = None) -> list:
+    """buscar_candidatos_ampliando con los resultados en cache_recomendaciones.
+
+    Sin candidatos devuelve [] y lo recuerda TTL_VACIO_SEGUNDOS.
+    """
+    version = version_candidatos(id_oficio, id_ciudad)
+    if version is None:
+        return buscar_candidatos_ampliando(db, id_oficio, id_ciudad, ubicacion=ubicacion, id_barrio=id_barrio)
+
+    clave = ("candidatos", id_oficio, id_ciudad, id_barrio if ubicacion is not None else None, version)
+    if recomendaciones.es_vacio(clave):
+        return []
+    candidatos = recomendaciones.obtener(clave)
+    if candidatos is None:
+        candidatos = buscar_candidatos_ampliando(db, id_oficio, id_ciudad, ubicacion=ubicacion, id_barrio=id_barrio)
+        if candidatos:
+            recomendaciones.guardar(clave, candidatos)
+        else:
+            recomendaciones.guardar_vacio(clave)
+    return candidatos
+
+
+# =========================
+# INVALIDACIÓN
+# =========================
+
+def _ids(aviso: dict, columna: str) -> set:
+    valores = [aviso.get("claves", {}).get(columna), (aviso.get("anteriores") or {}).get(columna)]
+    return {valor for valor in valores if valor is not None}
+
+
+def _invalidar_oficios():
+    with _lock:
+        _generacion["oficios"] += 1
+        _oficios.clear()
+        _contadores["invalidaciones"] += 1
+
+
+def _actualizar_indice(aviso: dict, actualizar, columna: str):
+    """Aplica un aviso al índice; si no trae claves o algo falla, se reconstruye entero."""
+    if aviso.get("op") in ("RECARGA", "TRUNCATE"):
+        return  # De eso se encarga _al_recargar
+    _contadores["invalidaciones"] += 1
+    ids = _ids(aviso, columna)
+    try:
+        if ids:
+            actualizar(ids)
+            return
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el índice de candidatos ({e}); se reconstruye")
+    indice.invalidar()
+    indice.reconstruir()
+
+
+def _al_cambiar_oficio(aviso: dict):
+    _invalidar_oficios()
+    # Las filas de candidatos llevan el nombre del oficio
+    _actualizar_indice(aviso, indice.actualizar_oficios, "id_oficio")
+
+
+def _al_cambiar_trabajador(aviso: dict):
+    """Cambios en trabajadores o trabajador_oficio: se recarga solo a ese trabajador."""
+    _actualizar_indice(aviso, indice.actualizar_trabajadores, "id_trabajador")
+
+
+def _actualizar_matriz():
+    """Sin matriz las distancias se calculan con haversine: no impide nada más."""
+    try:
+        matriz.actualizar(engine)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar la matriz de distancias: {e}")
+
+
+def _actualizar_vecinas():
+    """Sin vecinas la búsqueda no pasa de la ciudad del cliente."""
+    try:
+        vecinas.actualizar(engine)
+    except Exception as e:
+        print(f"⚠️  No se pudieron calcular las ciudades vecinas: {e}")
+
+
+def _al_cambiar_barrio(aviso: dict):
+    with _lock:
+        _generacion["barrios"] += 1
+    if aviso.get("op") not in ("RECARGA", "TRUNCATE"):
+        _actualizar_matriz()
+        _actualizar_vecinas()
+    _actualizar_indice(aviso, indice.actualizar_barrios, "id_barrio")
+
+
+def _al_recargar(aviso: dict):
+    if aviso.get("op") in ("RECARGA", "TRUNCATE"):
+        _invalidar_oficios()
+        _actualizar_matriz()
+        _actualizar_vecinas()
+        indice.invalidar()
+        indice.reconstruir()
+
+
+escucha.suscribir("oficios", _al_cambiar_oficio)
+escucha.suscribir(("trabajadores", "trabajador_oficio"), _al_cambiar_trabajador)
+escucha.suscribir("barrios", _al_cambiar_barrio)
+escucha.suscribir("ciudades", lambda aviso: _actualizar_indice(aviso, indice.actualizar_ciudades, "id_ciudad"))
+escucha.suscribir("*", _al_recargar)
+
+
+def metricas() -> dict:
+    with _lock:
+        return {
+            **_contadores,
+            "ttl_segundos": TTL_SEGUNDOS,
+            "catalogo_oficios_en_cache": "catalogo" in _oficios,
+            "indice_candidatos": indice.metricas(),
+            "matriz_distancias": matriz.metricas(),
+            "ciudades_vecinas": vecinas.metricas(),
+            "recomendaciones": recomendaciones.metricas(),
+            "escucha": escucha.metricas(),
+        }
@@ -0,0 +1,56 @@
+"""
+campos.py - Selección de campos (?fields=) en los endpoints de listado
+
+`fields` es una lista separada por comas de campos del schema de respuesta. Los objetos
+anidados se piden completos ("barrio") o por subcampo ("barrio.nombre_barrio",
+"oficios.nombre_oficio"). Los endpoints usan la selección para pedir a la base solo las
+columnas y joins necesarios y para devolver solo esos campos.
+"""
+
+from pydantic import BaseModel
+
+
+def esquema_campos(modelo: type[BaseModel], anidados: dict = None) -> dict:
+    """{campo: None} para campos simples y {campo: {subcampos}} para los anidados."""
+    anidados = anidados or {}
+    return {
+        campo: (set(anidados[campo].model_fields) if campo in anidados else None)
+        for campo in modelo.model_fields
+    }
+
+
+def parsear_campos(fields: str, esquema: dict, obligatorios: tuple = ()) -> dict:
+    """Interpreta `fields` según `esquema`. Devuelve None si no se pidió selección.
+
+    El resultado tiene la forma del esquema, restringido a lo pedido (más `obligatorios`).
+    Lanza ValueError con un campo desconocido.
+    """
+    if not fields or not fields.strip():
+        return None
+
+    seleccion = {campo: (None if esquema[campo] is None else set()) for campo in obligatorios}
+    for parte in fields.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        campo, _, subcampo = parte.partition(".")
+        if campo not in esquema:
+            raise ValueError(f"Campo desconocido: '{campo}'. Disponibles: {', '.join(esquema)}")
+        subcampos = esquema[campo]
+        if subcampos is None:
+            if subcampo:
+                raise ValueError(f"El campo '{campo}' no tiene subcampos")
+            seleccion[campo] = None
+        elif not subcampo:
+            seleccion[campo] = set(subcampos)
+        elif subcampo in subcampos:
+            seleccion.setdefault(campo, set()).add(subcampo)
+        else:
+            raise ValueError(
+                f"Subcampo desconocido: '{parte}'. Disponibles: {', '.join(sorted(subcampos))}"
+            )
+    return seleccion
+
+
+def todos_los_campos(esquema: dict) -> dict:
+    return {campo: (set(subcampos) if subcampos is not None else None) for campo, subcampos in esquema.items()}
@@ -0,0 +1,267 @@
+"""
+capacidad.py - Capacidad de cada trabajador en memoria, con reservas atómicas
+
+La disponibilidad de un trabajador es un texto fijo en su fila, así que nada impedía que el
+mismo trabajador mejor calificado saliera primero en muchas solicitudes urgentes a la vez.
+Aquí se lleva, por trabajador:
+
+- activos: su carga según la base (carga_trabajadores()): los servicios asignados o en
+  proceso (estadisticas_trabajador.servicios_en_proceso, que mantienen los triggers) más
+  las recomendaciones asignadas por lotes cuya solicitud sigue pendiente y sin servicio.
+  Se recargan con reconciliar() cada RECONCILIACION_SEGUNDOS.
+- reservas: cupos tomados en memoria al asignar (asignación por lotes, solicitud guardada)
+  que todavía no son un servicio en la base. Vencen a los RESERVA_SEGUNDOS, o antes con
+  liberar(). Si al reconciliar un trabajador tiene más servicios activos que antes, sus
+  reservas más antiguas se dan por concretadas y se liberan (ya cuentan como activos).
+  Una reserva puede ir a nombre de una solicitud: cada solicitud tiene a lo sumo una, y
+  reservar otra vez para ella reemplaza la anterior (la solicitud guardada reserva a su
+  primer recomendado y luego la asignación por lotes puede elegir a otro).
+
+Un trabajador tiene cupo si activos + reservas < MAX_CONCURRENCIA. reservar() comprueba y
+toma el cupo bajo un lock del proceso: en una ráfaga de solicitudes los cupos se reparten
+entre trabajadores sin bloquear filas en la base.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import Integer, and_, cast, exists, func, select, union_all
+
+from database import EstadisticaTrabajador, Recomendacion, Servicio, Solicitud
+
+
+# Servicios simultáneos (asignados, en proceso o reservados) que puede llevar un trabajador
+MAX_CONCURRENCIA = int(os.getenv("CAPACIDAD_MAX_CONCURRENCIA", "2"))
+
+# Vigencia de una reserva que no llega a convertirse en servicio
+RESERVA_SEGUNDOS = float(os.getenv("CAPACIDAD_RESERVA_SEGUNDOS", "900"))
+
+RECONCILIACION_SEGUNDOS = float(os.getenv("CAPACIDAD_RECONCILIACION_SEGUNDOS", "60"))
+
+
+def carga_trabajadores(conexion, ids_trabajador=None) -> dict:
+    """{id_trabajador: carga} de los trabajadores con carga (de `ids_trabajador` si se indica).
+
+    La asignación por lotes escribe una recomendación con es_asignado y deja la solicitud
+    pendiente, sin servicio: esas asignaciones cuentan como carga hasta que la solicitud
+    cambia de estado o tiene su servicio (que ya cuenta en servicios_en_proceso).
+    """
+    en_proceso = (
+        select(EstadisticaTrabajador.id_trabajador, EstadisticaTrabajador.servicios_en_proceso.label("n"))
+        .where(EstadisticaTrabajador.servicios_en_proceso > 0)
+    )
+    con_servicio = exists().where(Servicio.id_solicitud == Solicitud.id_solicitud)
+    asignadas = (
+        select(Recomendacion.id_trabajador, func.count().label("n"))
+        .join(Solicitud, Recomendacion.id_solicitud == Solicitud.id_solicitud)
+        .where(Recomendacion.es_asignado, Solicitud.estado == "pendiente", ~con_servicio)
+        .group_by(Recomendacion.id_trabajador)
+    )
+    if ids_trabajador is not None:
+        if not ids_trabajador:
+            return {}
+        en_proceso = en_proceso.where(EstadisticaTrabajador.id_trabajador.in_(ids_trabajador))
+        asignadas = asignadas.where(Recomendacion.id_trabajador.in_(ids_trabajador))
+    partes = union_all(en_proceso, asignadas).subquery()
+    return dict(conexion.execute(
+        select(partes.c.id_trabajador, cast(func.sum(partes.c.n), Integer)).group_by(partes.c.id_trabajador)
+    ).all())
+
+
+class CapacidadTrabajadores:
+    """Servicios activos y reservas por trabajador para todo el proceso."""
+
+    def __init__(self, maximo: int = MAX_CONCURRENCIA, duracion_reserva: float = RESERVA_SEGUNDOS):
+        self.maximo = maximo
+        self.duracion_reserva = duracion_reserva
+        self._lock = threading.Lock()
+        self._activos = {}
+        # id_trabajador -> (vencimiento en time.monotonic, id_solicitud o None) de sus reservas,
+        # de más antigua a más nueva
+        self._reservas = {}
+        # id_solicitud -> id_trabajador de las reservas hechas a nombre de una solicitud
+        self._solicitudes = {}
+        self._lista = False
+        # Sube cada vez que algún trabajador se queda sin cupo o lo recupera
+        self._version = 0
+        self._contadores = {
+            "reservas": 0, "rechazadas": 0, "liberadas": 0, "concretadas": 0, "vencidas": 0, "reconciliaciones": 0
+        }
+        self._ultima_reconciliacion = {"trabajadores_activos": 0, "cambios": 0, "ms": 0.0}
+
+    @property
+    def lista(self) -> bool:
+        return self._lista
+
+    @property
+    def version(self) -> int:
+        """Para cachear resultados que dependen de qué trabajadores tienen cupo."""
+        return self._version
+
+    def _ocupados(self, id_trabajador: int) -> int:
+        return self._activos.get(id_trabajador, 0) + len(self._reservas.get(id_trabajador, ()))
+
+    def _sin_cupo(self) -> set:
+        """Trabajadores sin cupo, sin descartar las reservas vencidas (con el lock tomado)."""
+        return {i for i in self._activos.keys() | self._reservas.keys() if self._ocupados(i) >= self.maximo}
+
+    def _vigentes(self, id_trabajador: int, ahora: float) -> list:
+        """Reservas vigentes del trabajador, descartando las vencidas (con el lock tomado)."""
+        reservas = self._reservas.get(id_trabajador)
+        if not reservas:
+            return []
+        vigentes = [reserva for reserva in reservas if reserva[0] > ahora]
+        if len(vigentes) < len(reservas):
+            self._contadores["vencidas"] += len(reservas) - len(vigentes)
+            for vence, id_solicitud in reservas:
+                if vence <= ahora:
+                    self._solicitudes.pop(id_solicitud, None)
+            if self._activos.get(id_trabajador, 0) + len(vigentes) < self.maximo <= self._ocupados(id_trabajador):
+                self._version += 1
+            if vigentes:
+                self._reservas[id_trabajador] = vigentes
+            else:
+                del self._reservas[id_trabajador]
+        return vigentes
+
+    def _libres(self, id_trabajador: int, ahora: float, maximo: int) -> int:
+        ocupados = self._activos.get(id_trabajador, 0) + len(self._vigentes(id_trabajador, ahora))
+        return max(0, maximo - ocupados)
+
+    def _quitar(self, id_trabajador: int, id_solicitud: int = None) -> bool:
+        """Quita la reserva de la solicitud, o la más antigua del trabajador (con el lock tomado)."""
+        reservas = self._reservas.get(id_trabajador)
+        if not reservas:
+            return False
+        posicion = 0
+        if id_solicitud is not None:
+            posicion = next((i for i, reserva in enumerate(reservas) if reserva[1] == id_solicitud), None)
+            if posicion is None:
+                return False
+        if self._ocupados(id_trabajador) == self.maximo:
+            self._version += 1
+        _, solicitud = reservas.pop(posicion)
+        self._solicitudes.pop(solicitud, None)
+        if not reservas:
+            del self._reservas[id_trabajador]
+        return True
+
+    # =========================
+    # CONSULTA
+    # =========================
+
+    def disponibles(self, ids_trabajador, maximo: int = None) -> np.ndarray:
+        """Cupos libres de cada trabajador (con otro `maximo` si se indica)."""
+        maximo = self.maximo if maximo is None else maximo
+        ahora = time.monotonic()
+        with self._lock:
+            return np.array([self._libres(i, ahora, maximo) for i in ids_trabajador], dtype=np.int64)
+
+    def filtrar(self, candidatos: list) -> list:
+        """Candidatos con cupo, en el mismo orden. Si ninguno tiene, se devuelven todos:
+        mejor recomendar a alguien ocupado que no recomendar."""
+        if not candidatos:
+            return candidatos
+        libres = self.disponibles([c["id_trabajador"] for c in candidatos])
+        con_cupo = [c for c, n in zip(candidatos, libres.tolist()) if n > 0]
+        return con_cupo or candidatos
+
+    def saturados(self) -> set:
+        """Ids de los trabajadores sin cupo libre."""
+        ahora = time.monotonic()
+        with self._lock:
+            ids = self._activos.keys() | self._reservas.keys()
+            return {i for i in ids if self._libres(i, ahora, self.maximo) <= 0}
+
+    # =========================
+    # RESERVAS
+    # =========================
+
+    def reservar(self, id_trabajador: int, maximo: int = None, id_solicitud: int = None) -> bool:
+        """Toma un cupo del trabajador si le queda alguno. Comprobar y tomar es atómico.
+
+        Con `id_solicitud` la reserva queda a nombre de la solicitud y reemplaza la que ya
+        tuviera; si no hay cupo, la anterior se conserva.
+        """
+        maximo = self.maximo if maximo is None else maximo
+        ahora = time.monotonic()
+        with self._lock:
+            libres = self._libres(id_trabajador, ahora, maximo)
+            anterior = self._solicitudes.get(id_solicitud) if id_solicitud is not None else None
+            # Renovar la reserva de la solicitud con el mismo trabajador no ocupa otro cupo
+            if libres + (anterior == id_trabajador) <= 0:
+                self._contadores["rechazadas"] += 1
+                return False
+            if anterior is not None:
+                self._quitar(anterior, id_solicitud)
+            self._reservas.setdefault(id_trabajador, []).append((ahora + self.duracion_reserva, id_solicitud))
+            if id_solicitud is not None:
+                self._solicitudes[id_solicitud] = id_trabajador
+            self._contadores["reservas"] += 1
+            if self._ocupados(id_trabajador) == self.maximo:
+                self._version += 1
+            return True
+
+    def reservar_primero(self, ids_trabajador, id_solicitud: int = None) -> int:
+        """Reserva al primero de la lista (en orden de preferencia) con cupo; None si ninguno."""
+        for id_trabajador in ids_trabajador:
+            if self.reservar(id_trabajador, id_solicitud=id_solicitud):
+                return id_trabajador
+        return None
+
+    def liberar(self, id_trabajador: int = None, id_solicitud: int = None):
+        """Devuelve una reserva (se concretó o se descartó): la de la solicitud si se indica,
+        si no la más antigua del trabajador."""
+        with self._lock:
+            if id_solicitud is not None:
+                id_trabajador = self._solicitudes.get(id_solicitud)
+            if id_trabajador is not None and self._quitar(id_trabajador, id_solicitud):
+                self._contadores["liberadas"] += 1
+
+    # =========================
+    # RECONCILIACIÓN
+    # =========================
+
+    def reconciliar(self, engine):
+        """Reemplaza la carga por la de la base y libera las reservas concretadas."""
+        inicio = time.perf_counter()
+        with engine.connect() as conexion:
+            activos = carga_trabajadores(conexion)
+        ahora = time.monotonic()
+        with self._lock:
+            sin_cupo = self._sin_cupo()
+            cambios = 0
+            for id_trabajador in activos.keys() | self._activos.keys():
+                nuevos = activos.get(id_trabajador, 0) - self._activos.get(id_trabajador, 0)
+                cambios += nuevos != 0
+                reservas = self._reservas.get(id_trabajador)
+                if nuevos > 0 and reservas and self._lista:
+                    concretadas = min(nuevos, len(reservas))
+                    for _, id_solicitud in reservas[:concretadas]:
+                        self._solicitudes.pop(id_solicitud, None)
+                    del reservas[:concretadas]
+                    if not reservas:
+                        del self._reservas[id_trabajador]
+                    self._contadores["concretadas"] += concretadas
+            self._activos = activos
+            for id_trabajador in list(self._reservas):
+                self._vigentes(id_trabajador, ahora)
+            if self._sin_cupo() != sin_cupo:
+                self._version += 1
+            self._lista = True
+            self._contadores["reconciliaciones"] += 1
+        ms = (time.perf_counter() - inicio) * 1000
+        self._ultima_reconciliacion = {"trabajadores_activos": len(activos), "cambios": cambios, "ms": round(ms, 1)}
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                **self._contadores,
+                "lista": self._lista,
+                "max_concurrencia": self.maximo,
+                "version": self._version,
+                "reservas_vigentes": sum(len(r) for r in self._reservas.values()),
+                "ultima_reconciliacion": self._ultima_reconciliacion,
+            }
@@ -0,0 +1,296 @@
+"""
+cargador_masivo.py - Carga masiva de datos vía PostgreSQL COPY
+
+Lee un directorio con un archivo por tabla (<tabla>.csv o <tabla>.jsonl, opcionalmente
+comprimidos con .gz) y los envía con COPY en orden de claves foráneas. Los archivos se
+procesan en lotes de tamaño fijo, así que la memoria no depende del tamaño del archivo.
+
+Al terminar reparte por mes las filas de las tablas particionadas, reinicia las
+secuencias de las claves primarias (ya no hace falta arreglar_autoincrement.py) y
+recalcula las tablas agregadas.
+
+Formato:
+- CSV: primera fila con los nombres de columna (subconjunto de la tabla, en cualquier orden).
+  Un campo vacío se carga como NULL.
+- JSONL: un objeto JSON por línea; las claves son los nombres de columna.
+
+Uso:
+    python cargador_masivo.py DIRECTORIO [--truncar] [--lote 50000] [--tablas ciudades barrios ...]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+from database import (
+    engine, Base, Ciudad, Barrio, Oficio, Solicitante, Trabajador, TrabajadorOficio,
+    TarifaMercado, Solicitud, Recomendacion, Servicio, Calificacion, Alerta,
+    ClasificacionLog, recalcular_conteos_catalogo, recalcular_estadisticas_trabajador,
+    recalcular_busqueda_trabajadores, notificar_recarga
+)
+from particiones import TABLAS_PARTICIONADAS, preparar_particiones
+
+
+# Las 13 tablas del esquema en orden de dependencias (padres antes que hijos)
+TABLAS_CARGA = [
+    Ciudad.__table__,
+    Barrio.__table__,
+    Oficio.__table__,
+    Solicitante.__table__,
+    Trabajador.__table__,
+    TrabajadorOficio.__table__,
+    TarifaMercado.__table__,
+    Solicitud.__table__,
+    Recomendacion.__table__,
+    Servicio.__table__,
+    Calificacion.__table__,
+    Alerta.__table__,
+    ClasificacionLog.__table__,
+]
+
+TAMANO_LOTE = 50_000
+
+EXTENSIONES = (".csv", ".csv.gz", ".jsonl", ".jsonl.gz")
+
+
+def _buscar_archivo(directorio: Path, tabla: str):
+    """Devuelve el archivo de datos de una tabla, o None si no hay."""
+    for extension in EXTENSIONES:
+        ruta = directorio / f"{tabla}{extension}"
+        if ruta.exists():
+            return ruta
+    return None
+
+
+def _abrir(ruta: Path):
+    if ruta.name.endswith(".gz"):
+        return gzip.open(ruta, "rt", encoding="utf-8", newline="")
+    return open(ruta, "r", encoding="utf-8", newline="")
+
+
+def _filas_csv(archivo):
+    """Devuelve (columnas, iterador de filas) para un CSV con encabezado."""
+    lector = csv.reader(archivo)
+    columnas = next(lector)
+    return columnas, lector
+
+
+def _filas_jsonl(archivo, columnas_tabla):
+    """Devuelve (columnas, iterador de filas) para un JSONL.
+
+    Las columnas se toman de la primera línea; las claves ausentes en otras líneas van como NULL.
+    """
+    lineas = (linea for linea in archivo if linea.strip())
+    try:
+        primero = json.loads(next(lineas))
+    except StopIteration:
+        return [], iter(())
+    columnas = [c for c in columnas_tabla if c in primero]
+
+    def filas():
+        registro = primero
+        while True:
+            yield [registro.get(c) for c in columnas]
+            try:
+                registro = json.loads(next(lineas))
+            except StopIteration:
+                return
+
+    return columnas, filas()
+
+
+def _lotes(filas, tamano: int):
+    """Agrupa las filas en buffers CSV de a lo sumo `tamano` filas."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    n = 0
+    for fila in filas:
+        escritor.writerow(["" if v is None else v for v in fila])
+        n += 1
+        if n == tamano:
+            buffer.seek(0)
+            yield buffer, n
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            n = 0
+    if n:
+        buffer.seek(0)
+        yield buffer, n
+
+
+def cargar_tabla(conexion, tabla, ruta: Path, tamano_lote: int = TAMANO_LOTE) -> int:
+    """Carga un archivo en una tabla con COPY por lotes. Hace commit tras cada lote.
+
+    COPY va por la conexión DBAPI, fuera de las transacciones de SQLAlchemy: el commit
+    de cada lote se hace ahí, porque conexion.commit() no vería nada que confirmar.
+    """
+    columnas_tabla = [c.name for c in tabla.columns]
+    dbapi = conexion.connection.dbapi_connection
+    total = 0
+    inicio = time.perf_counter()
+
+    with _abrir(ruta) as archivo:
+        if ".jsonl" in ruta.name:
+            columnas, filas = _filas_jsonl(archivo, columnas_tabla)
+        else:
+            columnas, filas = _filas_csv(archivo)
+
+        desconocidas = set(columnas) - set(columnas_tabla)
+        if desconocidas:
+            raise ValueError(f"{ruta.name}: columnas que no existen en {tabla.name}: {sorted(desconocidas)}")
+        if not columnas:
+            return 0
+
+        sentencia = (
+            f"COPY {tabla.schema}.{tabla.name} ({', '.join(columnas)}) "
+            f"FROM STDIN WITH (FORMAT csv)"
+        )
+        with dbapi.cursor() as cursor:
+            for buffer, n in _lotes(filas, tamano_lote):
+                cursor.copy_expert(sentencia, buffer)
+                dbapi.commit()
+                total += n
+                segundos = time.perf_counter() - inicio
+                print(f"   ↳ {tabla.name}: {total:,} filas ({total / max(segundos, 1e-9):,.0f} filas/s)", flush=True)
+
+    return total
+
+
+def reiniciar_secuencias(db, tablas=None):
+    """Ajusta la secuencia de cada clave primaria serial a MAX(pk) + 1.
+
+    Acepta una Session o una Connection de SQLAlchemy. Las tablas sin secuencia se ignoran.
+    En claves compuestas (tablas particionadas) solo cuenta la columna marcada autoincrement=True.
+    """
+    for tabla in tablas or TABLAS_CARGA:
+        columnas_pk = list(tabla.primary_key.columns)
+        if len(columnas_pk) == 1:
+            pk = [c for c in columnas_pk if c.autoincrement is not False]
+        else:
+            pk = [c for c in columnas_pk if c.autoincrement is True]
+        if len(pk) != 1:
+            continue
+        nombre_tabla = f"{tabla.schema}.{tabla.name}"
+        columna = pk[0].name
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence(:tabla, :columna), "
+            f"COALESCE(MAX({columna}), 0) + 1, false) FROM {nombre_tabla}"
+        ), {"tabla": nombre_tabla, "columna": columna})
+
+
+def dependientes(tablas) -> list:
+    """Tablas de TABLAS_CARGA que dependen por FK (directa o indirectamente) de `tablas`:
+    las que TRUNCATE ... CASCADE vaciaría junto con ellas."""
+    vaciadas = set(tablas)
+    for tabla in TABLAS_CARGA:  # padres antes que hijos: basta una pasada
+        if tabla not in vaciadas and any(fk.column.table in vaciadas for fk in tabla.foreign_keys):
+            vaciadas.add(tabla)
+    return [t for t in TABLAS_CARGA if t in vaciadas and t not in tablas]
+
+
+def cargar_directorio(directorio: Path, tablas=None, truncar: bool = False,
+                      mantener_triggers: bool = False, tamano_lote: int = TAMANO_LOTE) -> dict:
+    """Carga todas las tablas que tengan archivo en `directorio`, en orden de FK.
+
+    Con `truncar`, las tablas que se cargan se vacían antes. Si otra tabla que no se carga
+    depende de ellas, el CASCADE también la vaciaría: en ese caso no se toca nada y se
+    lanza ValueError con las tablas que faltan.
+    """
+    seleccion = [t for t in TABLAS_CARGA if not tablas or t.name in tablas]
+    archivos = [(t, _buscar_archivo(directorio, t.name)) for t in seleccion]
+    archivos = [(t, ruta) for t, ruta in archivos if ruta is not None]
+    if not archivos:
+        raise FileNotFoundError(f"No hay archivos de datos en {directorio} ({', '.join(EXTENSIONES)})")
+    if truncar:
+        faltantes = dependientes([t for t, _ in archivos])
+        if faltantes:
+            raise ValueError(
+                "--truncar vaciaría en cascada tablas que no se cargan: "
+                f"{', '.join(t.name for t in faltantes)}. Inclúyelas en la carga (con su archivo) "
+                "o carga sin --truncar."
+            )
+
+    Base.metadata.create_all(bind=engine)
+    resumen = {}
+
+    with engine.connect() as conexion:
+        if truncar:
+            nombres = ", ".join(f"{t.schema}.{t.name}" for t, _ in archivos)
+            print(f"🧹 Truncando: {nombres}")
+            conexion.execute(text(f"TRUNCATE TABLE {nombres} RESTART IDENTITY CASCADE"))
+            conexion.commit()
+
+        # Los triggers de agregados se recalculan una sola vez al final
+        if not mantener_triggers:
+            for tabla, _ in archivos:
+                conexion.execute(text(f"ALTER TABLE {tabla.schema}.{tabla.name} DISABLE TRIGGER USER"))
+            conexion.commit()
+
+        try:
+            for tabla, ruta in archivos:
+                print(f"📥 {tabla.name} ← {ruta.name}")
+                resumen[tabla.name] = cargar_tabla(conexion, tabla, ruta, tamano_lote)
+        finally:
+            # Un COPY fallido deja abortada la transacción DBAPI, que SQLAlchemy no conoce:
+            # se deshace ahí para que los triggers se reactiven en una transacción limpia
+            conexion.connection.dbapi_connection.rollback()
+            conexion.rollback()
+            if not mantener_triggers:
+                for tabla, _ in archivos:
+                    conexion.execute(text(f"ALTER TABLE {tabla.schema}.{tabla.name} ENABLE TRIGGER USER"))
+                conexion.commit()
+
+        # Las filas históricas caen en la partición DEFAULT; se reparten por mes
+        for tabla, _ in archivos:
+            if tabla.name in TABLAS_PARTICIONADAS:
+                creadas = preparar_particiones(conexion, tabla.name)
+                print(f"🗂️  {tabla.name}: {len(creadas)} particiones mensuales creadas")
+        conexion.commit()
+
+        print("🔢 Reiniciando secuencias...")
+        reiniciar_secuencias(conexion)
+        if not mantener_triggers:
+            print("📊 Recalculando tablas agregadas...")
+            recalcular_conteos_catalogo(conexion)
+            recalcular_estadisticas_trabajador(conexion)
+            recalcular_busqueda_trabajadores(conexion)
+        # Las cachés de la API no vieron los cambios fila a fila: que las descarten todas
+        notificar_recarga(conexion)
+        conexion.commit()
+
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de datos TaskPro vía COPY")
+    parser.add_argument("directorio", type=Path, help="Directorio con <tabla>.csv / <tabla>.jsonl")
+    parser.add_argument("--tablas", nargs="*", help="Cargar solo estas tablas")
+    parser.add_argument("--truncar", action="store_true", help="Vaciar las tablas antes de cargar (exige cargar también las que dependen de ellas)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Filas por COPY/commit")
+    parser.add_argument("--mantener-triggers", action="store_true",
+                        help="No desactivar los triggers de agregados durante la carga")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resumen = cargar_directorio(
+        args.directorio,
+        tablas=args.tablas,
+        truncar=args.truncar,
+        mantener_triggers=args.mantener_triggers,
+        tamano_lote=args.lote
+    )
+    segundos = time.perf_counter() - inicio
+
+    print(f"✅ Carga completada en {segundos:,.1f}s")
+    for tabla, filas in resumen.items():
+        print(f"   - {tabla}: {filas:,} filas")
+
+
+if __name__ == "__main__":
+    main()
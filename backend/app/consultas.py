@@ -0,0 +1,331 @@
+"""
+consultas.py - Sentencias calientes definidas una sola vez
+
+La búsqueda de candidatos (Trabajador ⋈ TrabajadorOficio ⋈ Oficio ⋈ Barrio ⋈ Ciudad) se
+ejecuta en cada petición del pipeline. Aquí se define una sola vez como sentencia Core
+con parámetros enlazados (SQLAlchemy la compila una vez y la reutiliza desde su caché)
+y, en PostgreSQL, se prepara en el servidor (PREPARE) la primera vez que cada conexión
+del pool la usa; a partir de ahí cada petición solo envía EXECUTE con los parámetros.
+
+Con SENTENCIAS_PREPARADAS=false (p. ej. detrás de PgBouncer en modo transacción, que
+no conserva sentencias preparadas entre transacciones) se ejecuta la sentencia Core.
+
+Si se conoce la ubicación del cliente, la variante "candidatos_cercanos" cambia el filtro
+por ciudad por una caja envolvente alrededor del cliente y geo.py deja solo a quienes
+lo alcanzan según su cobertura_km, con la distancia real.
+
+También vive aquí la búsqueda de texto libre de trabajadores sobre busqueda_trabajadores
+(índice GIN de trigramas), con paginación por cursor (keyset).
+"""
+
+import base64
+import json
+import os
+from decimal import Decimal
+
+from sqlalchemy import select, bindparam, text, func, literal, cast, or_, and_, Integer, Float, Numeric, String
+from sqlalchemy.dialects import postgresql
+
+from database import Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad, BusquedaTrabajador
+from geo import caja_envolvente, filtrar_por_cobertura, COBERTURA_MAX_KM, MARGEN_BARRIO_KM
+
+
+USAR_PREPARADAS = os.getenv("SENTENCIAS_PREPARADAS", "true").lower() == "true"
+
+DISPONIBILIDADES_ACTIVAS = ["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA"]
+
+# Máximo de trabajadores que se envían al LLM
+LIMITE_CANDIDATOS = 15
+
+
+# Columnas de cada candidato (también las del índice en memoria, indice_candidatos.py)
+COLUMNAS_CANDIDATO = (
+    Trabajador.id_trabajador,
+    Trabajador.nombre_completo,
+    Trabajador.anos_experiencia,
+    Trabajador.calificacion_promedio,
+    Trabajador.cobertura_km,
+    Trabajador.disponibilidad,
+    Trabajador.tiene_arl,
+    Oficio.id_oficio,
+    Oficio.nombre_oficio,
+    TrabajadorOficio.tarifa_hora_promedio,
+    TrabajadorOficio.tarifa_visita,
+    Barrio.nombre_barrio,
+    Ciudad.nombre_ciudad
+)
+
+
+def unir_candidatos(sentencia):
+    """Joins Trabajador ⋈ TrabajadorOficio ⋈ Oficio ⋈ Barrio ⋈ Ciudad de la búsqueda de candidatos."""
+    return (
+        sentencia
+        .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
+        .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
+        .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+        .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
+    )
+
+
+# Candidatos con su ciudad, barrio y ubicación (propia o del barrio), sin límite ni orden:
+# la base de los índices y cálculos en memoria (indice_candidatos.py, asignacion.py)
+SENTENCIA_CANDIDATOS_UBICADOS = (
+    unir_candidatos(select(
+        *COLUMNAS_CANDIDATO,
+        Ciudad.id_ciudad,
+        Trabajador.id_barrio,
+        Trabajador.latitud.isnot(None).label("ubicacion_propia"),
+        func.coalesce(Trabajador.latitud, Barrio.latitud).label("latitud"),
+        func.coalesce(Trabajador.longitud, Barrio.longitud).label("longitud")
+    ))
+    .where(Trabajador.disponibilidad.in_(DISPONIBILIDADES_ACTIVAS))
+)
+
+
+def _sentencia_candidatos(filtrar_ciudad: bool, cercanos: bool = False):
+    sentencia = (
+        unir_candidatos(select(*COLUMNAS_CANDIDATO))
+        .where(
+            Oficio.id_oficio == bindparam("id_oficio", type_=Integer, required=False),
+            # Lista fija: se escribe como literal para que el plan preparado la incluya
+            Trabajador.disponibilidad.in_(bindparam("disponibilidades", DISPONIBILIDADES_ACTIVAS, literal_execute=True))
+        )
+        .order_by(
+            Trabajador.calificacion_promedio.desc(),
+            Trabajador.anos_experiencia.desc(),
+            Trabajador.id_trabajador
+        )
+        # LIMIT NULL = sin límite
+        .limit(bindparam("limite", type_=Integer, required=False))
+    )
+    if filtrar_ciudad:
+        sentencia = sentencia.where(Ciudad.id_ciudad == bindparam("id_ciudad", type_=Integer, required=False))
+    if cercanos:
+        # Caja envolvente sobre el centroide del barrio (índice ix_barrios_latitud_longitud);
+        # la distancia exacta y la cobertura se filtran después en geo.py
+        sentencia = sentencia.add_columns(
+            func.coalesce(Trabajador.latitud, Barrio.latitud).label("latitud"),
+            func.coalesce(Trabajador.longitud, Barrio.longitud).label("longitud")
+        ).where(
+            Barrio.latitud.between(
+                bindparam("latitud_min", type_=Float, required=False),
+                bindparam("latitud_max", type_=Float, required=False)
+            ),
+            Barrio.longitud.between(
+                bindparam("longitud_min", type_=Float, required=False),
+                bindparam("longitud_max", type_=Float, required=False)
+            )
+        )
+    return sentencia
+
+
+SENTENCIAS_CANDIDATOS = {
+    "candidatos_ciudad": _sentencia_candidatos(filtrar_ciudad=True),
+    "candidatos_oficio": _sentencia_candidatos(filtrar_ciudad=False),
+    "candidatos_cercanos": _sentencia_candidatos(filtrar_ciudad=False, cercanos=True),
+}
+
+
+def _sql_preparada(nombre: str, sentencia):
+    """Devuelve (PREPARE ..., EXECUTE ...) a partir de la sentencia Core."""
+    compilada = sentencia.compile(
+        dialect=postgresql.psycopg2.dialect(paramstyle="numeric_dollar"),
+        compile_kwargs={"render_postcompile": True}
+    )
+    argumentos = ", ".join(f":{parametro}" for parametro in compilada.positiontup)
+    return f"PREPARE {nombre} AS {compilada}", text(f"EXECUTE {nombre}({argumentos})")
+
+
+SQL_PREPARADAS = {nombre: _sql_preparada(nombre, s) for nombre, s in SENTENCIAS_CANDIDATOS.items()}
+
+
+def buscar_candidatos(db, id_oficio: int, id_ciudad: int = None, limite: int = LIMITE_CANDIDATOS,
+                      ubicacion: tuple = None):
+    """Trabajadores disponibles de un oficio (y ciudad, si se indica), mejor calificados primero.
+
+    Con `ubicacion` = (latitud, longitud) del cliente se ignora la ciudad: solo vuelven los
+    trabajadores que lo alcanzan según su cobertura_km, cada uno con su distancia_km.
+
+    Devuelve filas con acceso por nombre de columna (RowMapping o dict).
+    """
+    if ubicacion is not None:
+        latitud, longitud = ubicacion
+        parametros = {
+            "id_oficio": id_oficio, "limite": None,
+            **caja_envolvente(latitud, longitud, COBERTURA_MAX_KM + MARGEN_BARRIO_KM)
+        }
+        cercanos = _ejecutar_candidatos(db, "candidatos_cercanos", parametros)
+        return filtrar_por_cobertura(cercanos, latitud, longitud, limite)
+
+    nombre = "candidatos_ciudad" if id_ciudad is not None else "candidatos_oficio"
+    parametros = {"id_oficio": id_oficio, "id_ciudad": id_ciudad, "limite": limite}
+    if id_ciudad is None:
+        del parametros["id_ciudad"]
+    return _ejecutar_candidatos(db, nombre, parametros)
+
+
+def _ejecutar_candidatos(db, nombre: str, parametros: dict):
+    conexion = db.connection()
+    if not USAR_PREPARADAS or conexion.dialect.name != "postgresql":
+        return conexion.execute(SENTENCIAS_CANDIDATOS[nombre], parametros).mappings().all()
+
+    # Connection.info vive mientras viva la conexión DBAPI del pool, igual que el PREPARE
+    preparadas = conexion.info.setdefault("sentencias_preparadas", set())
+    sql_prepare, sql_execute = SQL_PREPARADAS[nombre]
+    if nombre not in preparadas:
+        conexion.exec_driver_sql(sql_prepare)
+        preparadas.add(nombre)
+    return conexion.execute(sql_execute, parametros).mappings().all()
+
+
+def ubicacion_barrio(db, id_barrio: int):
+    """(latitud, longitud) del barrio, o None si no existe o no está georreferenciado."""
+    if not id_barrio:
+        return None
+    fila = db.execute(
+        select(Barrio.latitud, Barrio.longitud).where(Barrio.id_barrio == id_barrio)
+    ).first()
+    if fila is None or fila.latitud is None or fila.longitud is None:
+        return None
+    return float(fila.latitud), float(fila.longitud)
+
+
+def formatear_candidatos(candidatos) -> str:
+    """Una línea por trabajador, en el formato que reciben los agentes LLM."""
+    return "\n".join(
+        f"ID: {c['id_trabajador']}, "
+        f"Nombre: {c['nombre_completo']}, "
+        f"Oficio: {c['nombre_oficio']} (ID: {c['id_oficio']}), "
+        f"Experiencia: {c['anos_experiencia']} años, "
+        f"Calificación: {c['calificacion_promedio']}/5, "
+        f"Ubicación: {c['nombre_barrio']}, {c['nombre_ciudad']}, "
+        f"Cobertura: {c['cobertura_km']} km, "
+        + (f"Distancia al cliente: {c['distancia_km']} km, " if c.get("distancia_km") is not None else "")
+        + f"Tarifa hora: ${c['tarifa_hora_promedio']}, "
+        f"Tarifa visita: ${c['tarifa_visita']}, "
+        f"Disponibilidad: {c['disponibilidad']}, "
+        f"ARL: {'Sí' if c['tiene_arl'] else 'No'}"
+        for c in candidatos
+    )
+
+
+# =========================
+# BÚSQUEDA DE TEXTO LIBRE
+# =========================
+
+LIMITE_BUSQUEDA = 20
+LIMITE_BUSQUEDA_MAX = 100
+
+
+def _sentencia_busqueda(trigramas: bool, con_cursor: bool):
+    """Página de (id_trabajador, relevancia, calificacion_promedio) para una consulta.
+
+    Con pg_trgm: coincidencia por subcadena (LIKE) o por similitud de palabra (<%),
+    ambas resueltas con el índice GIN, y relevancia = word_similarity. Sin pg_trgm solo
+    queda la subcadena y todas las filas tienen la misma relevancia.
+
+    La relevancia se redondea a NUMERIC para que el cursor la compare de forma exacta
+    (un real que va y vuelve como texto no siempre es igual a sí mismo).
+    """
+    tipo_relevancia = Numeric(5, 4)
+    consulta = func.fn_normalizar_busqueda(bindparam("q", type_=String))
+    patron = func.fn_normalizar_busqueda(bindparam("patron", type_=String))
+    documento = BusquedaTrabajador.documento
+    if trigramas:
+        relevancia = cast(func.word_similarity(consulta, documento), tipo_relevancia)
+        coincide = or_(documento.like(patron, escape="\\"), consulta.op("<%")(documento))
+    else:
+        relevancia = literal(Decimal(1), type_=tipo_relevancia)
+        coincide = documento.like(patron, escape="\\")
+
+    sentencia = (
+        select(
+            BusquedaTrabajador.id_trabajador,
+            relevancia.label("relevancia"),
+            Trabajador.calificacion_promedio
+        )
+        .join(Trabajador, Trabajador.id_trabajador == BusquedaTrabajador.id_trabajador)
+        .where(coincide)
+        .order_by(Trabajador.calificacion_promedio.desc(), BusquedaTrabajador.id_trabajador)
+        .limit(bindparam("limite", type_=Integer))
+    )
+    if trigramas:
+        # Sin pg_trgm la relevancia es constante (y un ORDER BY 1 ordenaría por la primera columna)
+        sentencia = sentencia.order_by(None).order_by(
+            relevancia.desc(), Trabajador.calificacion_promedio.desc(), BusquedaTrabajador.id_trabajador
+        )
+    if con_cursor:
+        # Fila siguiente a (relevancia, calificación, id) en el orden de arriba
+        cursor_relevancia = bindparam("cursor_relevancia", type_=tipo_relevancia)
+        cursor_calificacion = bindparam("cursor_calificacion", type_=Numeric(3, 2))
+        sentencia = sentencia.where(or_(
+            relevancia < cursor_relevancia,
+            and_(relevancia == cursor_relevancia, Trabajador.calificacion_promedio < cursor_calificacion),
+            and_(
+                relevancia == cursor_relevancia,
+                Trabajador.calificacion_promedio == cursor_calificacion,
+                BusquedaTrabajador.id_trabajador > bindparam("cursor_id", type_=Integer)
+            )
+        ))
+    return sentencia
+
+
+SENTENCIAS_BUSQUEDA = {
+    (trigramas, con_cursor): _sentencia_busqueda(trigramas, con_cursor)
+    for trigramas in (True, False)
+    for con_cursor in (True, False)
+}
+
+_trigramas_disponibles = None
+
+
+def trigramas_disponibles(db) -> bool:
+    """True si pg_trgm está instalado (se consulta una vez por proceso)."""
+    global _trigramas_disponibles
+    if _trigramas_disponibles is None:
+        conexion = db.connection()
+        _trigramas_disponibles = conexion.dialect.name == "postgresql" and bool(conexion.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        ).scalar())
+        if not _trigramas_disponibles:
+            print("⚠️ pg_trgm no está instalado: la búsqueda de trabajadores usa solo LIKE y sin índice")
+    return _trigramas_disponibles
+
+
+def codificar_cursor(relevancia, calificacion, id_trabajador: int) -> str:
+    crudo = json.dumps([str(relevancia), str(calificacion), id_trabajador], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> tuple:
+    """Inverso de codificar_cursor. Lanza ValueError si el cursor no es válido."""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        relevancia, calificacion, id_trabajador = json.loads(crudo)
+        return Decimal(relevancia), Decimal(calificacion), int(id_trabajador)
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+
+def buscar_trabajadores_texto(db, q: str, limite: int = LIMITE_BUSQUEDA, cursor: str = None):
+    """Busca trabajadores por nombre, oficio, descripción del oficio o certificaciones.
+
+    Devuelve (filas, siguiente): filas con id_trabajador, relevancia y calificacion_promedio
+    en orden de relevancia, y el cursor de la página siguiente (None si no hay más).
+    """
+    q = q.strip()
+    escapada = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    parametros = {"q": q, "patron": f"%{escapada}%", "limite": limite + 1}
+    if cursor:
+        relevancia, calificacion, id_trabajador = decodificar_cursor(cursor)
+        parametros.update(cursor_relevancia=relevancia, cursor_calificacion=calificacion, cursor_id=id_trabajador)
+
+    sentencia = SENTENCIAS_BUSQUEDA[(trigramas_disponibles(db), bool(cursor))]
+    filas = db.execute(sentencia, parametros).mappings().all()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima["relevancia"], ultima["calificacion_promedio"], ultima["id_trabajador"])
+    return filas, siguiente
@@ -0,0 +1,113 @@
+"""
+cotizador.py - Cotización determinista del precio propuesto por cada trabajador
+
+El precio propuesto de cada trabajador recomendado lo escribía el LLM, aunque
+trabajador_oficio ya guarda la tarifa por hora y la de visita. Aquí se calcula, con NumPy
+para todos los candidatos a la vez:
+
+    mano de obra = tarifa_hora_promedio × horas estimadas (oficio, urgencia)
+    precio       = máx(tarifa_visita, mano de obra) × (1 + recargo de la urgencia)
+
+La visita actúa como cobro mínimo. Las horas salen de HORAS_POR_OFICIO (por nombre del
+oficio, HORAS_DEFECTO si no está) ajustadas por FACTOR_HORAS_URGENCIA: una urgencia alta
+suele ser atender la falla inmediata, una baja un trabajo más completo. Sin ninguna tarifa
+se propone la mediana de mercado de la zona (precios_mercado.py), si se conoce.
+
+Mismas tarifas, mismo precio: no hace falta pedírselo al LLM.
+"""
+
+import unicodedata
+
+import numpy as np
+
+
+# Horas de trabajo típicas de un servicio de cada oficio (urgencia media)
+HORAS_POR_OFICIO = {
+    "plomero": 2,
+    "electricista": 2,
+    "cerrajero": 1,
+    "tecnico de aires acondicionados": 2.5,
+    "tecnico de refrigeracion": 2,
+    "tecnico de lavadoras": 1.5,
+    "gasfitero": 2,
+    "pintor": 8,
+    "albanil": 8,
+    "carpintero": 6,
+    "tecnico de computadoras": 2,
+    "instalador de redes": 3,
+    "tecnico de celulares": 1,
+    "instalador de antenas": 2,
+    "soporte it": 2,
+    "servicio de limpieza": 4,
+    "jardinero": 3,
+    "lavador de fachadas": 6,
+    "fumigador": 2,
+    "servicio de mudanzas": 6,
+    "mecanico automotriz": 3,
+    "electricista automotriz": 2,
+    "tecnico de latoneria y pintura": 8,
+    "profesor particular": 2,
+    "entrenador personal": 1,
+}
+HORAS_DEFECTO = 2
+
+FACTOR_HORAS_URGENCIA = {"alta": 0.75, "media": 1.0, "baja": 1.25}
+
+# Recargo sobre el precio por atender con urgencia
+RECARGO_URGENCIA = {"alta": 0.20, "media": 0.0, "baja": 0.0}
+
+# Los precios se redondean a miles de pesos
+REDONDEO_COP = 1000
+
+
+def _clave_oficio(nombre: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", nombre or "").encode("ascii", "ignore").decode()
+    return " ".join(sin_tildes.lower().split())
+
+
+def horas_estimadas(nombre_oficio: str, urgencia: str) -> float:
+    """Horas estimadas de un servicio del oficio con esa urgencia (desconocida = media)."""
+    factor = FACTOR_HORAS_URGENCIA.get((urgencia or "").lower(), 1.0)
+    return HORAS_POR_OFICIO.get(_clave_oficio(nombre_oficio), HORAS_DEFECTO) * factor
+
+
+def _columna(candidatos, clave: str) -> np.ndarray:
+    return np.array(
+        [np.nan if c.get(clave) is None else float(c[clave]) for c in candidatos],
+        dtype=np.float64
+    )
+
+
+def cotizar(candidatos, urgencia: str, rango_precios: dict = None) -> np.ndarray:
+    """Precio propuesto (COP, enteros) de cada candidato; 0 si no hay con qué cotizar.
+
+    `candidatos` son filas de consultas.buscar_candidatos; `rango_precios`, el rango de
+    mercado del oficio en la zona (PreciosMercado.rango), si se conoce.
+    """
+    candidatos = list(candidatos)
+    if not candidatos:
+        return np.zeros(0, dtype=np.int64)
+    urgencia = (urgencia or "media").lower()
+
+    # Casi siempre es un solo oficio: el nombre se normaliza y se busca una vez por oficio distinto
+    horas_por_nombre = {}
+    for c in candidatos:
+        nombre = c.get("nombre_oficio")
+        if nombre not in horas_por_nombre:
+            horas_por_nombre[nombre] = horas_estimadas(nombre, urgencia)
+    horas = np.array([horas_por_nombre[c.get("nombre_oficio")] for c in candidatos])
+    mano_obra = _columna(candidatos, "tarifa_hora_promedio") * horas
+    precio = np.fmax(_columna(candidatos, "tarifa_visita"), mano_obra) * (1 + RECARGO_URGENCIA.get(urgencia, 0.0))
+
+    mediana = float(rango_precios["p50"]) if rango_precios else 0.0
+    precio = np.where(np.isnan(precio), mediana, precio)
+    return (np.round(precio / REDONDEO_COP) * REDONDEO_COP).astype(np.int64)
+
+
+def cotizaciones(candidatos, urgencia: str, rango_precios: dict = None) -> dict:
+    """{id_trabajador: precio propuesto} de los candidatos."""
+    candidatos = list(candidatos)
+    return dict(zip(
+        (c["id_trabajador"] for c in candidatos),
+        cotizar(candidatos, urgencia, rango_precios).tolist()
+    ))
@@ -9,6 +9,8 @@ Basado en el esquema TaskPro para PostgreSQL/MySQL/SQL Server.
 """
 
 import os
+import threading
+import time
 from datetime import datetime, date
 from pathlib import Path
 from sqlalchemy import (
@@ -21,12 +23,19 @@ from sqlalchemy import (
     Date,
     ForeignKey,
     Numeric,
+    BigInteger,
     create_engine,
+    event,
     CheckConstraint,
-    UniqueConstraint
+    UniqueConstraint,
+    Index,
+    DDL,
+    text
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, Session
+
+from particiones import particiones_iniciales
 
 # Cargar variables de entorno desde .env
 try:
@@ -54,6 +63,114 @@ engine = create_engine(DATABASE_URL, echo=True)
 # Crear la SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de solo lectura (opcional). Sin DATABASE_REPLICA_URL todo va al primario.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith("postgresql+asyncpg://"):
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace("postgresql+asyncpg://", "postgresql+psycopg2://", 1)
+
+# Si la réplica va más atrasada que esto, las lecturas vuelven al primario
+REPLICA_MAX_RETRASO_SEGUNDOS = float(os.getenv("REPLICA_MAX_RETRASO_SEGUNDOS", "5"))
+# El retraso lo mide una tarea en segundo plano cada intervalo (main._tarea_replica); las
+# sesiones solo leen la última medición
+REPLICA_INTERVALO_CHEQUEO_SEGUNDOS = float(os.getenv("REPLICA_INTERVALO_CHEQUEO_SEGUNDOS", "2"))
+REPLICA_TIMEOUT_CONEXION_SEGUNDOS = 2
+# Una medición más vieja que esto (la tarea se detuvo o no arrancó) ya no cuenta
+REPLICA_VIGENCIA_SEGUNDOS = 3 * REPLICA_INTERVALO_CHEQUEO_SEGUNDOS + REPLICA_TIMEOUT_CONEXION_SEGUNDOS
+
+replica_engine = (
+    create_engine(
+        DATABASE_REPLICA_URL, echo=True, pool_pre_ping=True,
+        connect_args={"connect_timeout": REPLICA_TIMEOUT_CONEXION_SEGUNDOS}
+    )
+    if DATABASE_REPLICA_URL else None
+)
+
+# En una réplica en streaming: si ya aplicó todo lo recibido no hay retraso; si no,
+# el retraso es el tiempo desde la última transacción aplicada. Un servidor que no
+# está en recuperación (p. ej. una segunda instancia local) cuenta como al día.
+SQL_RETRASO_REPLICA = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_estado_replica = {"disponible": False, "retraso_segundos": None, "medido_en": None}
+_lock_replica = threading.Lock()
+
+
+def medir_retraso_replica():
+    """Segundos de retraso de la réplica, o None si no responde."""
+    try:
+        with replica_engine.connect() as conexion:
+            return float(conexion.execute(SQL_RETRASO_REPLICA).scalar())
+    except Exception as e:
+        print(f"⚠️  Réplica no disponible, leyendo del primario: {e}")
+        return None
+
+
+def actualizar_estado_replica() -> bool:
+    """Mide el retraso de la réplica y guarda el resultado para replica_disponible().
+
+    Puede bloquear hasta REPLICA_TIMEOUT_CONEXION_SEGUNDOS: se llama desde una tarea en
+    segundo plano, nunca en el camino de una petición.
+    """
+    if replica_engine is None:
+        return False
+    retraso = medir_retraso_replica()
+    with _lock_replica:
+        _estado_replica.update(
+            disponible=retraso is not None and retraso <= REPLICA_MAX_RETRASO_SEGUNDOS,
+            retraso_segundos=retraso,
+            medido_en=time.monotonic()
+        )
+        return _estado_replica["disponible"]
+
+
+def replica_disponible() -> bool:
+    """True si la última medición vigente dice que la réplica responde y está al día.
+
+    No consulta la réplica: sin medición (o con una vencida) las lecturas van al primario.
+    """
+    if replica_engine is None:
+        return False
+    with _lock_replica:
+        medido_en = _estado_replica["medido_en"]
+        if medido_en is None or time.monotonic() - medido_en > REPLICA_VIGENCIA_SEGUNDOS:
+            return False
+        return _estado_replica["disponible"]
+
+
+def estado_replica() -> dict:
+    """Resumen para diagnóstico: configurada, disponible y último retraso medido."""
+    return {
+        "configurada": replica_engine is not None,
+        "disponible": replica_disponible(),
+        "retraso_segundos": _estado_replica["retraso_segundos"],
+        "max_retraso_segundos": REPLICA_MAX_RETRASO_SEGUNDOS
+    }
+
+
+class SesionEnrutada(Session):
+    """Sesión que envía las lecturas a la réplica y las escrituras al primario.
+
+    La réplica se elige una vez por sesión (si está disponible y al día). En cuanto la
+    sesión escribe algo, todo lo que sigue va al primario para leer lo recién escrito.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["usar_primario"] = True
+        if self.info.get("usar_primario"):
+            return engine
+        if "usar_replica" not in self.info:
+            self.info["usar_replica"] = replica_disponible()
+        return replica_engine if self.info["usar_replica"] else engine
+
+
+SessionLectura = sessionmaker(class_=SesionEnrutada, autocommit=False, autoflush=False, bind=engine)
+
 # Crear la Base
 Base = declarative_base()
 
@@ -86,6 +203,9 @@ class Barrio(Base):
     id_ciudad = Column(Integer, ForeignKey("public.ciudades.id_ciudad"), nullable=False)
     nombre_barrio = Column(String(100), nullable=False)
     estrato = Column(Integer, nullable=False)
+    # Centroide aproximado del barrio (WGS84); NULL si aún no se ha georreferenciado
+    latitud = Column(Numeric(9, 6), nullable=True)
+    longitud = Column(Numeric(9, 6), nullable=True)
     
     # Relaciones
     ciudad = relationship("Ciudad", back_populates="barrios")
@@ -156,6 +276,9 @@ class Trabajador(Base):
     cobertura_km = Column(Integer, nullable=False)
     tiene_arl = Column(Boolean, nullable=False, default=False)
     fecha_registro = Column(Date, nullable=False)
+    # Ubicación propia (opcional); si es NULL se usa la del barrio
+    latitud = Column(Numeric(9, 6), nullable=True)
+    longitud = Column(Numeric(9, 6), nullable=True)
     
     # Relaciones
     barrio = relationship("Barrio", back_populates="trabajadores")
@@ -294,17 +417,21 @@ class Calificacion(Base):
 
 
 class Alerta(Base):
-    """Alertas generadas por el sistema (precios anómalos, riesgos, etc.)."""
+    """Alertas generadas por el sistema (precios anómalos, riesgos, etc.).
+
+    Particionada por mes sobre `fecha` (ver particiones.py); por eso la fecha forma
+    parte de la clave primaria.
+    """
     __tablename__ = "alertas"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = {'schema': 'public', 'postgresql_partition_by': 'RANGE (fecha)'}
     
-    id_alerta = Column(Integer, primary_key=True)
+    id_alerta = Column(Integer, primary_key=True, autoincrement=True)
     id_solicitud = Column(Integer, ForeignKey("public.solicitudes.id_solicitud"), nullable=True)
     id_recomendacion = Column(Integer, ForeignKey("public.recomendaciones.id_recomendacion"), nullable=True)
     tipo_alerta = Column(String(30), nullable=False)
     severidad = Column(String(10), nullable=False)
     detalle = Column(String(400), nullable=False)
-    fecha = Column(Date, nullable=False)
+    fecha = Column(Date, primary_key=True, nullable=False, default=date.today, server_default=text("CURRENT_DATE"))
     
     # Relaciones
     solicitud = relationship("Solicitud", back_populates="alertas")
@@ -312,22 +439,611 @@ class Alerta(Base):
 
 
 class ClasificacionLog(Base):
-    """Logs de clasificación de solicitudes por el modelo IA."""
+    """Logs de clasificación de solicitudes por el modelo IA.
+
+    Particionada por mes sobre `fecha` (ver particiones.py).
+    """
     __tablename__ = "clasificacion_logs"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = {'schema': 'public', 'postgresql_partition_by': 'RANGE (fecha)'}
     
-    id_log = Column(Integer, primary_key=True)
+    id_log = Column(Integer, primary_key=True, autoincrement=True)
     id_solicitud = Column(Integer, ForeignKey("public.solicitudes.id_solicitud"), nullable=False)
     texto_original = Column(String(500), nullable=False)
     id_oficio_predicho = Column(Integer, ForeignKey("public.oficios.id_oficio"), nullable=False)
     confianza = Column(Numeric(4, 3), nullable=False)
     modelo_version = Column(String(40), nullable=False)
+    fecha = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow, server_default=text("now()"))
     
     # Relaciones
     solicitud = relationship("Solicitud", back_populates="logs_clasificacion")
     oficio_predicho = relationship("Oficio")
 
 
+event.listen(Alerta.__table__, "after_create", particiones_iniciales)
+event.listen(ClasificacionLog.__table__, "after_create", particiones_iniciales)
+
+
+# solicitudes y servicios no se particionan: son destino de claves foráneas y en
+# PostgreSQL eso obligaría a incluir la fecha en todas las FK que las referencian.
+# Como se insertan en orden cronológico, un índice BRIN sobre la fecha da la poda
+# por rango de fechas a una fracción del tamaño de un B-tree.
+DDL_INDICES_BRIN = DDL("""
+CREATE INDEX IF NOT EXISTS brin_solicitudes_fecha_creacion
+ON public.solicitudes USING brin (fecha_creacion);
+
+CREATE INDEX IF NOT EXISTS brin_servicios_fecha_asignacion
+ON public.servicios USING brin (fecha_asignacion);
+""")
+
+event.listen(Base.metadata, "after_create", DDL_INDICES_BRIN.execute_if(dialect="postgresql"))
+
+
+# Coordenadas añadidas después de la creación inicial del esquema: create_all no altera
+# tablas existentes, así que las columnas se agregan aquí. El índice de barrios sirve
+# al prefiltro por caja envolvente de la búsqueda de candidatos cercanos (geo.py).
+DDL_COORDENADAS = DDL("""
+ALTER TABLE public.barrios ADD COLUMN IF NOT EXISTS latitud numeric(9, 6);
+ALTER TABLE public.barrios ADD COLUMN IF NOT EXISTS longitud numeric(9, 6);
+ALTER TABLE public.trabajadores ADD COLUMN IF NOT EXISTS latitud numeric(9, 6);
+ALTER TABLE public.trabajadores ADD COLUMN IF NOT EXISTS longitud numeric(9, 6);
+
+CREATE INDEX IF NOT EXISTS ix_barrios_latitud_longitud
+ON public.barrios (latitud, longitud);
+
+CREATE INDEX IF NOT EXISTS ix_trabajadores_id_barrio
+ON public.trabajadores (id_barrio);
+""")
+
+event.listen(Base.metadata, "after_create", DDL_COORDENADAS.execute_if(dialect="postgresql"))
+
+
+# Pocas recomendaciones son asignaciones por lotes; el índice parcial sirve para saltarse
+# las solicitudes ya asignadas (asignacion.py) y para contar la carga de cada trabajador
+# (capacidad.carga_trabajadores) sin recorrer toda la tabla.
+DDL_INDICE_ASIGNADAS = DDL("""
+CREATE INDEX IF NOT EXISTS ix_recomendaciones_asignadas
+ON public.recomendaciones (id_solicitud, id_trabajador) WHERE es_asignado;
+""")
+
+event.listen(Base.metadata, "after_create", DDL_INDICE_ASIGNADAS.execute_if(dialect="postgresql"))
+
+
+# =========================
+# AGREGADOS
+# =========================
+
+class ConteoCatalogo(Base):
+    """Conteo de trabajadores por ciudad, por oficio y por (ciudad, oficio).
+
+    Alimenta los selects del frontend sin recalcular group-bys sobre el join completo.
+    Se mantiene de forma incremental con triggers sobre trabajadores y trabajador_oficio.
+    El valor 0 en id_ciudad o id_oficio significa "todas" (conteo por una sola dimensión).
+    """
+    __tablename__ = "conteos_catalogo"
+    __table_args__ = (
+        Index('ix_conteos_catalogo_oficio', 'id_oficio', 'id_ciudad'),
+        {'schema': 'public'}
+    )
+    
+    id_ciudad = Column(Integer, primary_key=True, autoincrement=False)
+    id_oficio = Column(Integer, primary_key=True, autoincrement=False)
+    total_trabajadores = Column(Integer, nullable=False, default=0)
+
+
+# Funciones y triggers que mantienen conteos_catalogo. Son idempotentes, así que se
+# ejecutan en cada create_all (después de crear todas las tablas).
+DDL_CONTEOS_CATALOGO = DDL("""
+CREATE OR REPLACE FUNCTION public.fn_conteo_catalogo_sumar(p_ciudad integer, p_oficio integer, p_delta integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO public.conteos_catalogo AS c (id_ciudad, id_oficio, total_trabajadores)
+    VALUES (p_ciudad, p_oficio, p_delta)
+    ON CONFLICT (id_ciudad, id_oficio)
+    DO UPDATE SET total_trabajadores = c.total_trabajadores + EXCLUDED.total_trabajadores;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_conteo_catalogo_recalcular()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM public.conteos_catalogo;
+    INSERT INTO public.conteos_catalogo (id_ciudad, id_oficio, total_trabajadores)
+    SELECT b.id_ciudad, 0, count(*)
+    FROM public.trabajadores t
+    JOIN public.barrios b ON b.id_barrio = t.id_barrio
+    GROUP BY b.id_ciudad
+    UNION ALL
+    SELECT 0, tof.id_oficio, count(*)
+    FROM public.trabajador_oficio tof
+    GROUP BY tof.id_oficio
+    UNION ALL
+    SELECT b.id_ciudad, tof.id_oficio, count(*)
+    FROM public.trabajador_oficio tof
+    JOIN public.trabajadores t ON t.id_trabajador = tof.id_trabajador
+    JOIN public.barrios b ON b.id_barrio = t.id_barrio
+    GROUP BY b.id_ciudad, tof.id_oficio;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_conteo_catalogo_trabajador()
+RETURNS trigger AS $$
+DECLARE
+    ciudad_old integer;
+    ciudad_new integer;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT id_ciudad INTO ciudad_old FROM public.barrios WHERE id_barrio = OLD.id_barrio;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT id_ciudad INTO ciudad_new FROM public.barrios WHERE id_barrio = NEW.id_barrio;
+    END IF;
+    IF TG_OP = 'UPDATE' AND ciudad_old IS NOT DISTINCT FROM ciudad_new THEN
+        RETURN NULL;
+    END IF;
+    IF ciudad_old IS NOT NULL THEN
+        PERFORM public.fn_conteo_catalogo_sumar(ciudad_old, 0, -1);
+        PERFORM public.fn_conteo_catalogo_sumar(ciudad_old, tof.id_oficio, -1)
+        FROM public.trabajador_oficio tof WHERE tof.id_trabajador = OLD.id_trabajador;
+    END IF;
+    IF ciudad_new IS NOT NULL THEN
+        PERFORM public.fn_conteo_catalogo_sumar(ciudad_new, 0, 1);
+        PERFORM public.fn_conteo_catalogo_sumar(ciudad_new, tof.id_oficio, 1)
+        FROM public.trabajador_oficio tof WHERE tof.id_trabajador = NEW.id_trabajador;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_conteo_catalogo_trabajador_oficio()
+RETURNS trigger AS $$
+DECLARE
+    ciudad integer;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT b.id_ciudad INTO ciudad
+        FROM public.trabajadores t JOIN public.barrios b ON b.id_barrio = t.id_barrio
+        WHERE t.id_trabajador = OLD.id_trabajador;
+        PERFORM public.fn_conteo_catalogo_sumar(0, OLD.id_oficio, -1);
+        IF ciudad IS NOT NULL THEN
+            PERFORM public.fn_conteo_catalogo_sumar(ciudad, OLD.id_oficio, -1);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT b.id_ciudad INTO ciudad
+        FROM public.trabajadores t JOIN public.barrios b ON b.id_barrio = t.id_barrio
+        WHERE t.id_trabajador = NEW.id_trabajador;
+        PERFORM public.fn_conteo_catalogo_sumar(0, NEW.id_oficio, 1);
+        IF ciudad IS NOT NULL THEN
+            PERFORM public.fn_conteo_catalogo_sumar(ciudad, NEW.id_oficio, 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TRUNCATE y el cambio de ciudad de un barrio no pasan por los triggers de fila:
+-- en esos casos (poco frecuentes) se recalcula todo.
+CREATE OR REPLACE FUNCTION public.fn_conteo_catalogo_recalcular_trg()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM public.fn_conteo_catalogo_recalcular();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_conteo_catalogo_trabajador ON public.trabajadores;
+CREATE TRIGGER trg_conteo_catalogo_trabajador
+AFTER INSERT OR DELETE OR UPDATE OF id_barrio ON public.trabajadores
+FOR EACH ROW EXECUTE FUNCTION public.fn_conteo_catalogo_trabajador();
+
+DROP TRIGGER IF EXISTS trg_conteo_catalogo_trabajador_oficio ON public.trabajador_oficio;
+CREATE TRIGGER trg_conteo_catalogo_trabajador_oficio
+AFTER INSERT OR DELETE OR UPDATE OF id_trabajador, id_oficio ON public.trabajador_oficio
+FOR EACH ROW EXECUTE FUNCTION public.fn_conteo_catalogo_trabajador_oficio();
+
+DROP TRIGGER IF EXISTS trg_conteo_catalogo_truncate_trabajadores ON public.trabajadores;
+CREATE TRIGGER trg_conteo_catalogo_truncate_trabajadores
+AFTER TRUNCATE ON public.trabajadores
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_conteo_catalogo_recalcular_trg();
+
+DROP TRIGGER IF EXISTS trg_conteo_catalogo_truncate_trabajador_oficio ON public.trabajador_oficio;
+CREATE TRIGGER trg_conteo_catalogo_truncate_trabajador_oficio
+AFTER TRUNCATE ON public.trabajador_oficio
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_conteo_catalogo_recalcular_trg();
+
+DROP TRIGGER IF EXISTS trg_conteo_catalogo_barrio ON public.barrios;
+CREATE TRIGGER trg_conteo_catalogo_barrio
+AFTER UPDATE OF id_ciudad ON public.barrios
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_conteo_catalogo_recalcular_trg();
+
+SELECT public.fn_conteo_catalogo_recalcular();
+""")
+
+event.listen(Base.metadata, "after_create", DDL_CONTEOS_CATALOGO.execute_if(dialect="postgresql"))
+
+
+def recalcular_conteos_catalogo(db):
+    """Reconstruye conteos_catalogo desde cero (p. ej. tras una carga masiva sin triggers)."""
+    db.execute(text("SELECT public.fn_conteo_catalogo_recalcular()"))
+
+
+class EstadisticaTrabajador(Base):
+    """Estadísticas acumuladas por trabajador (una fila por trabajador con historial).
+
+    Se actualiza en la misma transacción en que se escribe un servicio o una
+    calificación, mediante triggers sobre servicios y calificaciones.
+    """
+    __tablename__ = "estadisticas_trabajador"
+    __table_args__ = {'schema': 'public'}
+    
+    id_trabajador = Column(
+        Integer,
+        ForeignKey("public.trabajadores.id_trabajador", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False
+    )
+    total_servicios = Column(Integer, nullable=False, default=0)
+    servicios_completados = Column(Integer, nullable=False, default=0)
+    servicios_en_proceso = Column(Integer, nullable=False, default=0)
+    total_ingresos = Column(BigInteger, nullable=False, default=0)
+    total_calificaciones = Column(Integer, nullable=False, default=0)
+
+
+DDL_ESTADISTICAS_TRABAJADOR = DDL("""
+CREATE OR REPLACE FUNCTION public.fn_estadistica_trabajador_sumar(
+    p_trabajador integer, p_servicios integer, p_completados integer,
+    p_en_proceso integer, p_ingresos bigint, p_calificaciones integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO public.estadisticas_trabajador AS e (
+        id_trabajador, total_servicios, servicios_completados,
+        servicios_en_proceso, total_ingresos, total_calificaciones)
+    VALUES (p_trabajador, p_servicios, p_completados, p_en_proceso, p_ingresos, p_calificaciones)
+    ON CONFLICT (id_trabajador) DO UPDATE SET
+        total_servicios = e.total_servicios + EXCLUDED.total_servicios,
+        servicios_completados = e.servicios_completados + EXCLUDED.servicios_completados,
+        servicios_en_proceso = e.servicios_en_proceso + EXCLUDED.servicios_en_proceso,
+        total_ingresos = e.total_ingresos + EXCLUDED.total_ingresos,
+        total_calificaciones = e.total_calificaciones + EXCLUDED.total_calificaciones;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_estadistica_trabajador_recalcular()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM public.estadisticas_trabajador;
+    INSERT INTO public.estadisticas_trabajador (
+        id_trabajador, total_servicios, servicios_completados,
+        servicios_en_proceso, total_ingresos, total_calificaciones)
+    SELECT s.id_trabajador,
+           count(*),
+           count(*) FILTER (WHERE s.estado = 'completado'),
+           count(*) FILTER (WHERE s.estado IN ('asignado', 'en_proceso')),
+           coalesce(sum(s.costo_final_cop) FILTER (WHERE s.estado = 'completado'), 0),
+           coalesce(sum(c.total), 0)
+    FROM public.servicios s
+    LEFT JOIN (
+        SELECT id_servicio, count(*) AS total
+        FROM public.calificaciones
+        WHERE quien_califica = 'solicitante'
+        GROUP BY id_servicio
+    ) c ON c.id_servicio = s.id_servicio
+    GROUP BY s.id_trabajador;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_estadistica_trabajador_servicio()
+RETURNS trigger AS $$
+DECLARE
+    calificaciones integer := 0;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- Si el servicio cambia de trabajador, sus calificaciones se mueven con él
+        IF OLD.id_trabajador IS DISTINCT FROM NEW.id_trabajador THEN
+            SELECT count(*) INTO calificaciones FROM public.calificaciones
+            WHERE id_servicio = OLD.id_servicio AND quien_califica = 'solicitante';
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.fn_estadistica_trabajador_sumar(
+            OLD.id_trabajador, -1,
+            -(OLD.estado = 'completado')::integer,
+            -(OLD.estado IN ('asignado', 'en_proceso'))::integer,
+            -(CASE WHEN OLD.estado = 'completado' THEN OLD.costo_final_cop ELSE 0 END)::bigint,
+            -calificaciones);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.fn_estadistica_trabajador_sumar(
+            NEW.id_trabajador, 1,
+            (NEW.estado = 'completado')::integer,
+            (NEW.estado IN ('asignado', 'en_proceso'))::integer,
+            (CASE WHEN NEW.estado = 'completado' THEN NEW.costo_final_cop ELSE 0 END)::bigint,
+            calificaciones);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_estadistica_trabajador_calificacion()
+RETURNS trigger AS $$
+DECLARE
+    trabajador integer;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.quien_califica = 'solicitante' THEN
+        SELECT id_trabajador INTO trabajador FROM public.servicios WHERE id_servicio = OLD.id_servicio;
+        IF trabajador IS NOT NULL THEN
+            PERFORM public.fn_estadistica_trabajador_sumar(trabajador, 0, 0, 0, 0, -1);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.quien_califica = 'solicitante' THEN
+        SELECT id_trabajador INTO trabajador FROM public.servicios WHERE id_servicio = NEW.id_servicio;
+        IF trabajador IS NOT NULL THEN
+            PERFORM public.fn_estadistica_trabajador_sumar(trabajador, 0, 0, 0, 0, 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_estadistica_trabajador_recalcular_trg()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM public.fn_estadistica_trabajador_recalcular();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_estadistica_trabajador_servicio ON public.servicios;
+CREATE TRIGGER trg_estadistica_trabajador_servicio
+AFTER INSERT OR DELETE OR UPDATE OF id_trabajador, estado, costo_final_cop ON public.servicios
+FOR EACH ROW EXECUTE FUNCTION public.fn_estadistica_trabajador_servicio();
+
+DROP TRIGGER IF EXISTS trg_estadistica_trabajador_calificacion ON public.calificaciones;
+CREATE TRIGGER trg_estadistica_trabajador_calificacion
+AFTER INSERT OR DELETE OR UPDATE OF id_servicio, quien_califica ON public.calificaciones
+FOR EACH ROW EXECUTE FUNCTION public.fn_estadistica_trabajador_calificacion();
+
+DROP TRIGGER IF EXISTS trg_estadistica_trabajador_truncate_servicios ON public.servicios;
+CREATE TRIGGER trg_estadistica_trabajador_truncate_servicios
+AFTER TRUNCATE ON public.servicios
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_estadistica_trabajador_recalcular_trg();
+
+DROP TRIGGER IF EXISTS trg_estadistica_trabajador_truncate_calificaciones ON public.calificaciones;
+CREATE TRIGGER trg_estadistica_trabajador_truncate_calificaciones
+AFTER TRUNCATE ON public.calificaciones
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_estadistica_trabajador_recalcular_trg();
+
+SELECT public.fn_estadistica_trabajador_recalcular();
+""")
+
+event.listen(Base.metadata, "after_create", DDL_ESTADISTICAS_TRABAJADOR.execute_if(dialect="postgresql"))
+
+
+def recalcular_estadisticas_trabajador(db):
+    """Reconstruye estadisticas_trabajador desde servicios y calificaciones."""
+    db.execute(text("SELECT public.fn_estadistica_trabajador_recalcular()"))
+
+
+class BusquedaTrabajador(Base):
+    """Documento de búsqueda de texto libre por trabajador.
+
+    Concatena nombre, oficios (nombre y descripción) y certificaciones ya normalizados
+    (minúsculas, sin tildes). Lo mantienen triggers sobre trabajadores, trabajador_oficio
+    y oficios; con pg_trgm instalado tiene un índice GIN de trigramas.
+    """
+    __tablename__ = "busqueda_trabajadores"
+    __table_args__ = {'schema': 'public'}
+    
+    id_trabajador = Column(
+        Integer,
+        ForeignKey("public.trabajadores.id_trabajador", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False
+    )
+    documento = Column(String, nullable=False)
+
+
+DDL_BUSQUEDA_TRABAJADORES = DDL("""
+-- pg_trgm es opcional: sin la extensión la búsqueda funciona, pero sin índice
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm no disponible: la búsqueda de trabajadores no tendrá índice de trigramas';
+END;
+$$;
+
+-- Inmutable (a diferencia de unaccent) para poder usarla en índices y plegarla en el plan
+CREATE OR REPLACE FUNCTION public.fn_normalizar_busqueda(texto text)
+RETURNS text AS $$
+    SELECT lower(translate(texto, 'ÁÉÍÓÚÜÑáéíóúüñ', 'AEIOUUNaeiouun'));
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_documentos(p_trabajadores integer[])
+RETURNS void AS $$
+BEGIN
+    INSERT INTO public.busqueda_trabajadores AS b (id_trabajador, documento)
+    SELECT t.id_trabajador,
+           public.fn_normalizar_busqueda(concat_ws(' ',
+               t.nombre_completo,
+               string_agg(concat_ws(' ', o.nombre_oficio, tof.certificaciones, o.descripcion), ' ')))
+    FROM public.trabajadores t
+    LEFT JOIN public.trabajador_oficio tof ON tof.id_trabajador = t.id_trabajador
+    LEFT JOIN public.oficios o ON o.id_oficio = tof.id_oficio
+    WHERE p_trabajadores IS NULL OR t.id_trabajador = ANY (p_trabajadores)
+    GROUP BY t.id_trabajador
+    ON CONFLICT (id_trabajador) DO UPDATE SET documento = EXCLUDED.documento
+    WHERE b.documento IS DISTINCT FROM EXCLUDED.documento;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_recalcular()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM public.busqueda_trabajadores;
+    PERFORM public.fn_busqueda_trabajador_documentos(NULL);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_trabajador()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM public.fn_busqueda_trabajador_documentos(ARRAY[NEW.id_trabajador]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_trabajador_oficio()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.fn_busqueda_trabajador_documentos(ARRAY[OLD.id_trabajador]);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.fn_busqueda_trabajador_documentos(ARRAY[NEW.id_trabajador]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_oficio()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM public.fn_busqueda_trabajador_documentos(ARRAY(
+        SELECT id_trabajador FROM public.trabajador_oficio WHERE id_oficio = NEW.id_oficio));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.fn_busqueda_trabajador_recalcular_trg()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM public.fn_busqueda_trabajador_recalcular();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_busqueda_trabajador ON public.trabajadores;
+CREATE TRIGGER trg_busqueda_trabajador
+AFTER INSERT OR UPDATE OF nombre_completo ON public.trabajadores
+FOR EACH ROW EXECUTE FUNCTION public.fn_busqueda_trabajador_trabajador();
+
+DROP TRIGGER IF EXISTS trg_busqueda_trabajador_oficio ON public.trabajador_oficio;
+CREATE TRIGGER trg_busqueda_trabajador_oficio
+AFTER INSERT OR UPDATE OR DELETE ON public.trabajador_oficio
+FOR EACH ROW EXECUTE FUNCTION public.fn_busqueda_trabajador_trabajador_oficio();
+
+DROP TRIGGER IF EXISTS trg_busqueda_oficio ON public.oficios;
+CREATE TRIGGER trg_busqueda_oficio
+AFTER UPDATE OF nombre_oficio, descripcion ON public.oficios
+FOR EACH ROW EXECUTE FUNCTION public.fn_busqueda_trabajador_oficio();
+
+DROP TRIGGER IF EXISTS trg_busqueda_trabajador_truncate_oficio ON public.trabajador_oficio;
+CREATE TRIGGER trg_busqueda_trabajador_truncate_oficio
+AFTER TRUNCATE ON public.trabajador_oficio
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_busqueda_trabajador_recalcular_trg();
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS ix_busqueda_trabajadores_documento_trgm
+        ON public.busqueda_trabajadores USING gin (documento gin_trgm_ops);
+    END IF;
+END;
+$$;
+
+SELECT public.fn_busqueda_trabajador_recalcular();
+""")
+
+event.listen(Base.metadata, "after_create", DDL_BUSQUEDA_TRABAJADORES.execute_if(dialect="postgresql"))
+
+
+def recalcular_busqueda_trabajadores(db):
+    """Reconstruye busqueda_trabajadores (p. ej. tras una carga masiva sin triggers)."""
+    db.execute(text("SELECT public.fn_busqueda_trabajador_recalcular()"))
+
+
+# =========================
+# NOTIFICACIONES DE CAMBIOS
+# =========================
+
+# Canal de LISTEN/NOTIFY por el que se publican los cambios de las tablas que cachean
+# los procesos de la API (ver notificaciones.py). Carga útil JSON:
+#   {"tabla": ..., "op": "INSERT|UPDATE|DELETE|TRUNCATE|RECARGA", "claves": {...}, "anteriores": {...}}
+CANAL_CAMBIOS = "cambios_datos"
+
+# tabla -> columnas que viajan en "claves" (y en "anteriores" si es un UPDATE)
+TABLAS_NOTIFICADAS = {
+    "ciudades": ("id_ciudad",),
+    "barrios": ("id_barrio", "id_ciudad"),
+    "oficios": ("id_oficio",),
+    "trabajadores": ("id_trabajador", "id_barrio"),
+    "trabajador_oficio": ("id_trabajador", "id_oficio"),
+}
+
+DDL_NOTIFICACIONES = DDL(f"""
+CREATE OR REPLACE FUNCTION public.fn_notificar_cambio()
+RETURNS trigger AS $$
+DECLARE
+    columna text;
+    nueva jsonb;
+    anterior jsonb;
+    claves jsonb := '{{}}'::jsonb;
+    anteriores jsonb := '{{}}'::jsonb;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('{CANAL_CAMBIOS}', jsonb_build_object('tabla', TG_TABLE_NAME, 'op', TG_OP)::text);
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        nueva := to_jsonb(NEW);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        anterior := to_jsonb(OLD);
+    END IF;
+    FOREACH columna IN ARRAY TG_ARGV LOOP
+        claves := claves || jsonb_build_object(columna, COALESCE(nueva, anterior) -> columna);
+        IF TG_OP = 'UPDATE' THEN
+            anteriores := anteriores || jsonb_build_object(columna, anterior -> columna);
+        END IF;
+    END LOOP;
+
+    PERFORM pg_notify('{CANAL_CAMBIOS}', jsonb_build_object(
+        'tabla', TG_TABLE_NAME, 'op', TG_OP, 'claves', claves, 'anteriores', anteriores
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+""" + "".join(f"""
+DROP TRIGGER IF EXISTS trg_notificar_{tabla} ON public.{tabla};
+CREATE TRIGGER trg_notificar_{tabla}
+AFTER INSERT OR DELETE ON public.{tabla}
+FOR EACH ROW EXECUTE FUNCTION public.fn_notificar_cambio({", ".join(f"'{c}'" for c in columnas)});
+
+DROP TRIGGER IF EXISTS trg_notificar_{tabla}_update ON public.{tabla};
+CREATE TRIGGER trg_notificar_{tabla}_update
+AFTER UPDATE ON public.{tabla}
+FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION public.fn_notificar_cambio({", ".join(f"'{c}'" for c in columnas)});
+
+DROP TRIGGER IF EXISTS trg_notificar_{tabla}_truncate ON public.{tabla};
+CREATE TRIGGER trg_notificar_{tabla}_truncate
+AFTER TRUNCATE ON public.{tabla}
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_notificar_cambio();
+""" for tabla, columnas in TABLAS_NOTIFICADAS.items()))
+
+event.listen(Base.metadata, "after_create", DDL_NOTIFICACIONES.execute_if(dialect="postgresql"))
+
+
+def notificar_recarga(db):
+    """Avisa a todos los procesos que descarten sus cachés (p. ej. tras una carga con triggers desactivados)."""
+    db.execute(
+        text("SELECT pg_notify(:canal, :carga)"),
+        {"canal": CANAL_CAMBIOS, "carga": '{"tabla": "*", "op": "RECARGA"}'}
+    )
+
+
 # Función de utilidad para obtener una sesión de base de datos
 def get_db():
     """Dependencia FastAPI para obtener sesiones de base de datos."""
@@ -336,3 +1052,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_db_lectura():
+    """Dependencia FastAPI para endpoints de solo lectura (réplica si está al día)."""
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,327 @@
+"""
+entrenar_pesos.py - Ajuste offline de los pesos del score a partir de los resultados
+
+Los pesos por urgencia de puntuacion.py estaban escritos a mano (los del prompt). El
+historial ya dice qué recomendaciones funcionaron, así que aquí se ajustan a partir de él:
+
+1. Cada solicitud con recomendaciones es una lista de candidatos. La ganancia de cada uno
+   es 0 si no se eligió (o el servicio se canceló), 1 si se le asignó (es_asignado o un
+   servicio asignado/en proceso), 2 si completó el servicio, más (puntaje - 3) / 2 con la
+   calificación del solicitante.
+2. Las componentes de cada candidato son las de puntuacion.matriz_componentes, con el
+   precio relativo a su lista y la distancia guardada en la recomendación. Salen de los
+   datos actuales del trabajador: el historial no guarda cómo estaban al recomendar.
+3. Para cada urgencia, cada par de la misma lista con ganancias distintas aporta la
+   diferencia de sus componentes. Los pesos se ajustan con regresión logística por pares
+   (descenso de gradiente en NumPy sobre todos los pares a la vez), sobre el símplex
+   (no negativos y suman 1, así el score sigue en [0, 1]) y regularizados hacia los
+   manuales. Cada urgencia se ajusta en un proceso aparte.
+4. Los pesos ajustados solo se adoptan si ordenan mejor que los manuales los pares de las
+   solicitudes reservadas para validación (FRACCION_VALIDACION) y hay al menos MIN_PARES.
+
+El resultado se escribe en puntuacion.ARCHIVO_PESOS con un número de versión; la API lo
+recarga sola (ver puntuacion.cargar_pesos).
+
+Uso:
+    python entrenar_pesos.py [--dias 180] [--procesos 3] [--simular]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, and_, func
+
+from database import (
+    Solicitud, Recomendacion, Servicio, Calificacion, Trabajador, TrabajadorOficio
+)
+from geo import COBERTURA_MAX_KM
+from puntuacion import (
+    COMPONENTES, PESOS_MANUALES, VALOR_DISPONIBILIDAD, VALOR_NEUTRO, ANOS_EXPERIENCIA_PLENA,
+    ARCHIVO_PESOS
+)
+
+
+DIAS_HISTORIAL = int(os.getenv("ENTRENAMIENTO_DIAS_HISTORIAL", "180"))
+
+# Pares mínimos de entrenamiento para reemplazar los pesos manuales de una urgencia
+MIN_PARES = int(os.getenv("ENTRENAMIENTO_MIN_PARES", "200"))
+
+# Cuánto se penaliza alejarse de los pesos manuales
+REGULARIZACION = float(os.getenv("ENTRENAMIENTO_REGULARIZACION", "0.05"))
+
+FRACCION_VALIDACION = 0.2
+ITERACIONES = 500
+TASA_APRENDIZAJE = 0.5
+
+URGENCIAS = tuple(PESOS_MANUALES)
+
+
+# =========================
+# HISTORIAL
+# =========================
+
+def _historial(conexion, desde: datetime) -> dict:
+    """Columnas (arreglos NumPy) de cada recomendación del periodo, ordenadas por solicitud."""
+    puntaje_solicitante = (
+        select(Calificacion.id_servicio, func.avg(Calificacion.puntaje).label("puntaje"))
+        .where(Calificacion.quien_califica == "solicitante")
+        .group_by(Calificacion.id_servicio)
+        .subquery()
+    )
+    filas = conexion.execute(
+        select(
+            Recomendacion.id_solicitud, Solicitud.urgencia, Recomendacion.es_asignado, Recomendacion.distancia_km,
+            Trabajador.disponibilidad, Trabajador.cobertura_km, Trabajador.anos_experiencia,
+            Trabajador.calificacion_promedio, TrabajadorOficio.tarifa_visita, TrabajadorOficio.tarifa_hora_promedio,
+            Servicio.estado, puntaje_solicitante.c.puntaje
+        )
+        .join(Solicitud, Recomendacion.id_solicitud == Solicitud.id_solicitud)
+        .join(Trabajador, Recomendacion.id_trabajador == Trabajador.id_trabajador)
+        .outerjoin(TrabajadorOficio, and_(
+            TrabajadorOficio.id_trabajador == Recomendacion.id_trabajador,
+            TrabajadorOficio.id_oficio == Solicitud.id_oficio
+        ))
+        .outerjoin(Servicio, and_(
+            Servicio.id_solicitud == Recomendacion.id_solicitud,
+            Servicio.id_trabajador == Recomendacion.id_trabajador
+        ))
+        .outerjoin(puntaje_solicitante, puntaje_solicitante.c.id_servicio == Servicio.id_servicio)
+        .where(Solicitud.fecha_creacion >= desde)
+        .order_by(Recomendacion.id_solicitud, Recomendacion.id_trabajador)
+    ).all()
+
+    def columna(i):
+        return np.array([np.nan if fila[i] is None else float(fila[i]) for fila in filas], dtype=np.float64)
+
+    return {
+        "id_solicitud": np.array([fila[0] for fila in filas], dtype=np.int64),
+        "urgencia": np.array([(fila[1] or "media").lower() for fila in filas], dtype=object),
+        "es_asignado": np.array([bool(fila[2]) for fila in filas]),
+        "distancia_km": columna(3),
+        "disponibilidad": np.array([VALOR_DISPONIBILIDAD.get(fila[4], 0.0) for fila in filas]),
+        "cobertura_km": columna(5),
+        "anos_experiencia": columna(6),
+        "calificacion_promedio": columna(7),
+        "tarifa_visita": columna(8),
+        "tarifa_hora": columna(9),
+        "estado_servicio": np.array([fila[10] or "" for fila in filas], dtype=object),
+        "puntaje": columna(11),
+    }
+
+
+def ganancias(historial: dict) -> np.ndarray:
+    """Ganancia de cada recomendación según lo que pasó después (ver el docstring del módulo)."""
+    estado = historial["estado_servicio"]
+    asignado = (historial["es_asignado"] | np.isin(estado, ["asignado", "en_proceso", "completado"])) \
+        & (estado != "cancelado")
+    ganancia = asignado.astype(np.float64) + (estado == "completado")
+    calificado = (estado == "completado") & ~np.isnan(historial["puntaje"])
+    ganancia[calificado] += (historial["puntaje"][calificado] - 3) / 2
+    return ganancia
+
+
+def componentes(historial: dict, inicios: np.ndarray) -> np.ndarray:
+    """Matriz (recomendaciones × COMPONENTES) como puntuacion.matriz_componentes, con el
+    precio normalizado dentro de cada solicitud (`inicios`: primera fila de cada una)."""
+    n = len(historial["id_solicitud"])
+    matriz = np.full((n, len(COMPONENTES)), VALOR_NEUTRO)
+    if n == 0:
+        return matriz
+    matriz[:, 0] = historial["disponibilidad"]
+
+    distancia = historial["distancia_km"]
+    cobertura = np.fmin(historial["cobertura_km"], COBERTURA_MAX_KM)
+    cobertura = np.where(np.isnan(cobertura) | (cobertura <= 0), COBERTURA_MAX_KM, cobertura)
+    matriz[:, 1] = np.where(np.isnan(distancia), VALOR_NEUTRO, np.clip(1 - distancia / cobertura, 0, 1))
+
+    experiencia = historial["anos_experiencia"]
+    matriz[:, 2] = np.where(np.isnan(experiencia), 0, np.clip(experiencia / ANOS_EXPERIENCIA_PLENA, 0, 1))
+    calificacion = historial["calificacion_promedio"]
+    matriz[:, 3] = np.where(np.isnan(calificacion), 0, np.clip(calificacion / 5, 0, 1))
+
+    precio = np.where(np.isnan(historial["tarifa_visita"]), historial["tarifa_hora"], historial["tarifa_visita"])
+    con_precio = ~np.isnan(precio)
+    minimo = np.minimum.reduceat(np.where(con_precio, precio, np.inf), inicios)
+    maximo = np.maximum.reduceat(np.where(con_precio, precio, -np.inf), inicios)
+    tamanos = np.diff(np.append(inicios, n))
+    minimo, maximo = np.repeat(minimo, tamanos), np.repeat(maximo, tamanos)
+    ancho = maximo - minimo
+    relativo = np.divide(maximo - precio, ancho, out=np.ones(n), where=con_precio & (ancho > 0))
+    matriz[:, 4] = np.where(con_precio, relativo, VALOR_NEUTRO)
+    return matriz
+
+
+def pares(inicios: np.ndarray, n: int, ganancia: np.ndarray) -> tuple:
+    """(mejor, peor) de cada par de la misma solicitud con ganancias distintas.
+
+    Las solicitudes se agrupan por tamaño de lista, así cada tamaño se resuelve con una
+    sola operación sobre todas sus solicitudes.
+    """
+    tamanos = np.diff(np.append(inicios, n))
+    mejores, peores = [], []
+    for tamano in np.unique(tamanos[tamanos > 1]).tolist():
+        filas = inicios[tamanos == tamano][:, None] + np.arange(tamano)[None, :]
+        a, b = np.triu_indices(tamano, 1)
+        i, j = filas[:, a].ravel(), filas[:, b].ravel()
+        distintas = ganancia[i] != ganancia[j]
+        i, j = i[distintas], j[distintas]
+        primero = ganancia[i] > ganancia[j]
+        mejores.append(np.where(primero, i, j))
+        peores.append(np.where(primero, j, i))
+    if not mejores:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(mejores), np.concatenate(peores)
+
+
+# =========================
+# AJUSTE
+# =========================
+
+def _exactitud(diferencias: np.ndarray, importancia: np.ndarray, pesos: np.ndarray) -> float:
+    """Fracción (ponderada) de pares que los pesos ordenan bien; los empates cuentan medio."""
+    if len(diferencias) == 0:
+        return None
+    margen = diferencias @ pesos
+    aciertos = (margen > 0) + 0.5 * (margen == 0)
+    return round(float((aciertos * importancia).sum() / importancia.sum()), 4)
+
+
+def ajustar(diferencias: np.ndarray, importancia: np.ndarray, manuales: np.ndarray,
+            regularizacion: float = REGULARIZACION, iteraciones: int = ITERACIONES) -> np.ndarray:
+    """Pesos en el símplex que minimizan la pérdida logística por pares más
+    regularizacion · ||pesos - manuales||².
+
+    `diferencias` son componentes del mejor menos las del peor de cada par e `importancia`,
+    el peso de cada par. Se parametriza pesos = softmax(theta).
+    """
+    theta = np.log(manuales + 1e-3)
+    total = importancia.sum()
+    for _ in range(iteraciones):
+        pesos = np.exp(theta - theta.max())
+        pesos /= pesos.sum()
+        margen = diferencias @ pesos
+        # d/dmargen de log(1 + e^-margen) = -sigmoide(-margen)
+        gradiente = -(diferencias * (importancia / (1 + np.exp(margen)))[:, None]).sum(axis=0) / total
+        gradiente += 2 * regularizacion * (pesos - manuales)
+        theta -= TASA_APRENDIZAJE * pesos * (gradiente - pesos @ gradiente)
+    pesos = np.exp(theta - theta.max())
+    return pesos / pesos.sum()
+
+
+def _entrenar_urgencia(urgencia: str, diferencias: np.ndarray, importancia: np.ndarray,
+                       validacion: np.ndarray, regularizacion: float) -> tuple:
+    """Ajusta una urgencia (corre en un proceso aparte). Devuelve (urgencia, pesos, resumen)."""
+    manuales = np.array([PESOS_MANUALES[urgencia].get(c, 0.0) for c in COMPONENTES])
+    entrenamiento = ~validacion
+    resumen = {
+        "pares_entrenamiento": int(entrenamiento.sum()),
+        "pares_validacion": int(validacion.sum()),
+        "fuente": "manual",
+    }
+    if resumen["pares_entrenamiento"] < MIN_PARES:
+        return urgencia, manuales, resumen
+
+    pesos = ajustar(diferencias[entrenamiento], importancia[entrenamiento], manuales, regularizacion)
+    resumen["exactitud_entrenamiento"] = _exactitud(diferencias[entrenamiento], importancia[entrenamiento], pesos)
+    resumen["exactitud_validacion"] = _exactitud(diferencias[validacion], importancia[validacion], pesos)
+    resumen["exactitud_validacion_manual"] = _exactitud(diferencias[validacion], importancia[validacion], manuales)
+    # Sin pares de validación no hay con qué comparar: se quedan los manuales
+    if resumen["exactitud_validacion"] is not None \
+            and resumen["exactitud_validacion"] > resumen["exactitud_validacion_manual"]:
+        resumen["fuente"] = "entrenado"
+        return urgencia, pesos, resumen
+    return urgencia, manuales, resumen
+
+
+def entrenar(conexion, dias: int = DIAS_HISTORIAL, procesos: int = None,
+             regularizacion: float = REGULARIZACION) -> dict:
+    """Pesos por urgencia ajustados con el historial de los últimos `dias`, con un resumen."""
+    inicio = time.perf_counter()
+    historial = _historial(conexion, datetime.utcnow() - timedelta(days=dias))
+    n = len(historial["id_solicitud"])
+    inicios = np.flatnonzero(np.r_[True, historial["id_solicitud"][1:] != historial["id_solicitud"][:-1]]) \
+        if n else np.zeros(0, dtype=np.int64)
+
+    ganancia = ganancias(historial)
+    matriz = componentes(historial, inicios)
+    mejor, peor = pares(inicios, n, ganancia)
+    diferencias = matriz[mejor] - matriz[peor]
+    importancia = ganancia[mejor] - ganancia[peor]
+    urgencia_par = historial["urgencia"][mejor]
+    # La validación se separa por solicitud, no por par
+    validacion = (historial["id_solicitud"][mejor] * 2654435761 % 1000) < FRACCION_VALIDACION * 1000
+
+    tareas = [
+        (u, diferencias[urgencia_par == u], importancia[urgencia_par == u], validacion[urgencia_par == u], regularizacion)
+        for u in URGENCIAS
+    ]
+    with ProcessPoolExecutor(max_workers=procesos or min(len(tareas), os.cpu_count() or 1)) as pool:
+        resultados = list(pool.map(_entrenar_urgencia, *zip(*tareas)))
+
+    pesos = {
+        urgencia: {c: round(float(p), 4) for c, p in zip(COMPONENTES, vector) if round(float(p), 4) > 0}
+        for urgencia, vector, _ in resultados
+    }
+    return {
+        "pesos": pesos,
+        "entrenamiento": {urgencia: resumen for urgencia, _, resumen in resultados},
+        "recomendaciones": n,
+        "solicitudes": len(inicios),
+        "pares": len(mejor),
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def escribir(resultado: dict, archivo: str = ARCHIVO_PESOS) -> int:
+    """Escribe los pesos con la versión siguiente a la del archivo actual. Devuelve la versión."""
+    try:
+        with open(archivo, encoding="utf-8") as f:
+            version = int(json.load(f).get("version", 0)) + 1
+    except (OSError, ValueError):
+        version = 1
+    contenido = {
+        "version": version,
+        "creado": datetime.utcnow().isoformat(timespec="seconds"),
+        "pesos": resultado["pesos"],
+        "entrenamiento": resultado["entrenamiento"],
+    }
+    # La API puede estar leyéndolo: se escribe aparte y se reemplaza de una vez
+    temporal = f"{archivo}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, archivo)
+    return version
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Ajusta los pesos del score con el historial de resultados")
+    parser.add_argument("--dias", type=int, default=DIAS_HISTORIAL, help="Antigüedad máxima de las solicitudes")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para ajustar las urgencias")
+    parser.add_argument("--regularizacion", type=float, default=REGULARIZACION,
+                        help="Penalización por alejarse de los pesos manuales")
+    parser.add_argument("--archivo", default=ARCHIVO_PESOS, help="Archivo de pesos a escribir")
+    parser.add_argument("--simular", action="store_true", help="Mostrar los pesos sin escribir el archivo")
+    args = parser.parse_args()
+
+    with engine.connect() as conexion:
+        resultado = entrenar(conexion, args.dias, args.procesos, args.regularizacion)
+    print(f"🧠 {resultado['pares']:,} pares de {resultado['solicitudes']:,} solicitudes "
+          f"({resultado['recomendaciones']:,} recomendaciones) en {resultado['ms']:.0f} ms")
+    for urgencia in URGENCIAS:
+        resumen = resultado["entrenamiento"][urgencia]
+        print(f"   {urgencia:6} {resumen['fuente']:10} {resultado['pesos'][urgencia]} "
+              f"(validación {resumen.get('exactitud_validacion')} vs manual {resumen.get('exactitud_validacion_manual')})")
+    if not args.simular:
+        version = escribir(resultado, args.archivo)
+        print(f"✅ Pesos v{version} escritos en {args.archivo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+escritor_diferido.py - Escritura diferida (write-behind) de datos de auditoría
+
+El pipeline A2A calcula recomendaciones, alertas y la clasificación del oficio en cada
+solicitud. Guardarlas en la misma petición añadiría latencia, así que se encolan en
+memoria y una tarea de fondo las escribe por lotes con INSERT multi-fila, cuando el
+lote se llena o cuando pasa el intervalo máximo (lo que ocurra primero).
+
+- Contrapresión: la cola tiene capacidad fija; si está llena, quien encola espera
+  como mucho ESCRITOR_ESPERA_MAX_SEGUNDOS y después la fila se descarta y se cuenta.
+- Al apagar la API se vacía la cola antes de salir.
+- Cada tabla del lote se escribe en su propia transacción. Si el INSERT multi-fila choca
+  con una fila inválida (FK, rango de partición...), esa tabla se reintenta fila a fila y
+  solo las filas rechazadas se descartan, con su contenido en el log.
+- metricas() expone contadores para /admin/metricas.
+"""
+
+import asyncio
+import os
+import time
+from datetime import date
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import Recomendacion, Alerta, ClasificacionLog
+
+
+CAPACIDAD = int(os.getenv("ESCRITOR_CAPACIDAD", "10000"))
+TAMANO_LOTE = int(os.getenv("ESCRITOR_TAMANO_LOTE", "500"))
+INTERVALO_SEGUNDOS = float(os.getenv("ESCRITOR_INTERVALO_SEGUNDOS", "1.0"))
+ESPERA_MAX_SEGUNDOS = float(os.getenv("ESCRITOR_ESPERA_MAX_SEGUNDOS", "0.05"))
+
+MODELO_CLASIFICACION = "gemini-2.5-flash"
+
+# Orden de escritura dentro de un lote (alertas puede referenciar recomendaciones)
+TABLAS = {
+    "recomendaciones": Recomendacion.__table__,
+    "alertas": Alerta.__table__,
+    "clasificacion_logs": ClasificacionLog.__table__,
+}
+
+
+def _motivo(error: Exception) -> str:
+    """Primera línea del error de la base, sin la sentencia ni los parámetros."""
+    return str(getattr(error, "orig", error)).strip().splitlines()[0]
+
+
+class EscritorDiferido:
+    """Cola asíncrona con vaciado por lotes hacia PostgreSQL."""
+
+    def __init__(self, engine, capacidad: int = CAPACIDAD, tamano_lote: int = TAMANO_LOTE,
+                 intervalo_segundos: float = INTERVALO_SEGUNDOS, espera_max_segundos: float = ESPERA_MAX_SEGUNDOS):
+        self.engine = engine
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.intervalo_segundos = intervalo_segundos
+        self.espera_max_segundos = espera_max_segundos
+        self._cola = None
+        self._tarea = None
+        self._contadores = {
+            "encoladas": 0, "escritas": 0, "descartadas": 0, "fallidas": 0, "rechazadas": 0,
+            "lotes": 0, "escritas_directo": 0
+        }
+        self._ultimo_lote = {"filas": 0, "ms": 0.0}
+        self._max_lote_ms = 0.0
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    async def iniciar(self):
+        if self.activo:
+            return
+        self._cola = asyncio.Queue(maxsize=self.capacidad)
+        self._tarea = asyncio.create_task(self._bucle())
+        print(f"✍️  Escritor diferido iniciado (lote {self.tamano_lote}, cada {self.intervalo_segundos}s)")
+
+    async def detener(self):
+        """Vacía la cola y termina la tarea de fondo."""
+        if not self.activo:
+            return
+        await self._cola.join()
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        print(f"✍️  Escritor diferido detenido: {self._contadores['escritas']} filas escritas")
+
+    async def encolar(self, tabla: str, filas: list) -> int:
+        """Encola filas (dicts de columnas) para `tabla`. Devuelve cuántas se aceptaron.
+
+        Si el escritor no está corriendo (p. ej. scripts o pruebas sin lifespan),
+        las filas se escriben directamente en un hilo.
+        """
+        if not filas:
+            return 0
+        if not self.activo:
+            escritas, rechazadas, fallidas = await asyncio.to_thread(self._insertar, {tabla: filas})
+            self._contar(escritas_directo=escritas, rechazadas=rechazadas, fallidas=fallidas)
+            return len(filas)
+
+        aceptadas = 0
+        for fila in filas:
+            try:
+                self._cola.put_nowait((tabla, fila))
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self._cola.put((tabla, fila)), self.espera_max_segundos)
+                except asyncio.TimeoutError:
+                    self._contadores["descartadas"] += 1
+                    continue
+            aceptadas += 1
+        self._contadores["encoladas"] += aceptadas
+        return aceptadas
+
+    async def _bucle(self):
+        while True:
+            tabla, fila = await self._cola.get()
+            lote = [(tabla, fila)]
+            limite = time.monotonic() + self.intervalo_segundos
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            grupos = {}
+            for tabla, fila in lote:
+                grupos.setdefault(tabla, []).append(fila)
+            try:
+                inicio = time.perf_counter()
+                escritas, rechazadas, fallidas = await asyncio.to_thread(self._insertar, grupos)
+                ms = (time.perf_counter() - inicio) * 1000
+                self._contar(escritas=escritas, rechazadas=rechazadas, fallidas=fallidas, lotes=1)
+                self._ultimo_lote = {"filas": len(lote), "ms": round(ms, 2)}
+                self._max_lote_ms = max(self._max_lote_ms, ms)
+            except Exception as e:
+                self._contadores["fallidas"] += len(lote)
+                print(f"❌ Escritor diferido: error escribiendo {len(lote)} filas: {e}")
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def _contar(self, **cantidades):
+        for contador, cantidad in cantidades.items():
+            self._contadores[contador] += cantidad
+
+    def _insertar(self, grupos: dict) -> tuple:
+        """Un INSERT multi-fila por tabla, cada tabla en su transacción.
+
+        Devuelve (escritas, rechazadas, fallidas). Un error que no es de datos (p. ej. la
+        base no responde) hace fallar solo las filas de esa tabla.
+        """
+        escritas = rechazadas = fallidas = 0
+        for tabla, tabla_sa in TABLAS.items():
+            filas = grupos.get(tabla)
+            if not filas:
+                continue
+            try:
+                rechazadas_tabla = self._insertar_tabla(tabla, tabla_sa, filas)
+            except Exception as e:
+                fallidas += len(filas)
+                print(f"❌ Escritor diferido: error escribiendo {len(filas)} filas de {tabla}: {e}")
+                continue
+            rechazadas += rechazadas_tabla
+            escritas += len(filas) - rechazadas_tabla
+        return escritas, rechazadas, fallidas
+
+    def _insertar_tabla(self, tabla: str, tabla_sa, filas: list) -> int:
+        """Escribe las filas de una tabla; si alguna es inválida, fila a fila con un
+        SAVEPOINT por fila. Devuelve cuántas se rechazaron."""
+        try:
+            with self.engine.begin() as conexion:
+                conexion.execute(tabla_sa.insert(), filas)
+            return 0
+        except (IntegrityError, DataError) as e:
+            print(f"⚠️  Escritor diferido: lote de {len(filas)} filas de {tabla} rechazado "
+                  f"({_motivo(e)}); reintentando fila a fila")
+
+        rechazadas = 0
+        with self.engine.begin() as conexion:
+            for fila in filas:
+                try:
+                    with conexion.begin_nested():
+                        conexion.execute(tabla_sa.insert(), [fila])
+                except (IntegrityError, DataError) as e:
+                    rechazadas += 1
+                    print(f"❌ Escritor diferido: fila de {tabla} descartada ({_motivo(e)}): {fila}")
+        return rechazadas
+
+    def metricas(self) -> dict:
+        return {
+            **self._contadores,
+            "activo": self.activo,
+            "pendientes": self._cola.qsize() if self._cola is not None else 0,
+            "capacidad": self.capacidad,
+            "tamano_lote": self.tamano_lote,
+            "intervalo_segundos": self.intervalo_segundos,
+            "ultimo_lote": self._ultimo_lote,
+            "max_lote_ms": round(self._max_lote_ms, 2),
+        }
+
+
+# =========================
+# FILAS A PARTIR DEL PIPELINE
+# =========================
+
+def filas_recomendaciones(id_solicitud: int, resultado) -> list:
+    """Filas de recomendaciones a partir de un ProcesamientoCompletoOutput."""
+    if resultado.recomendaciones is None:
+        return []
+    precio_estimado = int(resultado.analisis.precio_mercado_estimado or 0)
+    return [
+        {
+            "id_solicitud": id_solicitud,
+            "id_trabajador": r.id_trabajador,
+            "score_relevancia": round(min(max(r.score_relevancia, 0.0), 1.0), 3),
+            "distancia_km": round(min(max(r.distancia_km or 0.0, 0.0), 999.99), 2),
+            "motivo_top": r.motivo_top[:20],
+            "precio_estimado": precio_estimado,
+            "precio_propuesto": int(r.precio_propuesto),
+            "explicacion": r.explicacion[:500],
+            "es_asignado": False,
+        }
+        for r in resultado.recomendaciones.trabajadores_recomendados
+    ]
+
+
+def filas_alertas(id_solicitud, resultado) -> list:
+    """Filas de alertas; id_solicitud puede ser None si la solicitud no se guardó."""
+    hoy = date.today()
+    return [
+        {
+            "id_solicitud": id_solicitud,
+            "tipo_alerta": a.tipo_alerta[:30],
+            "severidad": a.severidad[:10],
+            "detalle": a.detalle[:400],
+            "fecha": hoy,
+        }
+        for a in resultado.alertas.alertas_detectadas
+    ]
+
+
+def filas_clasificacion(id_solicitud: int, resultado) -> list:
+    analisis = resultado.analisis
+    if analisis.id_oficio_sugerido is None:
+        return []
+    return [{
+        "id_solicitud": id_solicitud,
+        "texto_original": analisis.texto_usuario_original[:500],
+        "id_oficio_predicho": analisis.id_oficio_sugerido,
+        "confianza": round(min(max(analisis.confianza or 0.0, 0.0), 1.0), 3),
+        "modelo_version": MODELO_CLASIFICACION,
+    }]
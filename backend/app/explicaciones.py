@@ -0,0 +1,119 @@
+"""
+explicaciones.py - Explicaciones en español a partir de las contribuciones del score
+
+La mayor parte de los tokens de salida del recomendador se iba en la `explicacion` de cada
+trabajador y en `explicacion_algoritmo`, aunque puntuacion.py ya sabe cuánto aportó cada
+componente. Aquí se redactan con plantillas y los datos reales del candidato:
+
+    "Recomendado por experiencia y calificación (72% de su score): tiene 12 años de
+     experiencia y calificación 4.8/5. Cotiza $120,000, dentro del rango de la zona.
+     Cuenta con ARL."
+
+Se nombran los componentes que más aportaron (como mucho COMPONENTES_EXPLICADOS), el
+precio propuesto frente al rango de mercado si se conoce y si el trabajador tiene ARL.
+
+Con MODO_RECOMENDADOR=plantillas estas explicaciones son las definitivas, sin llamadas al
+LLM; con PULIR_PRIMERO el LLM solo reescribe la del primer recomendado.
+"""
+
+import os
+
+import numpy as np
+
+
+# Componentes que se nombran en cada explicación (los de mayor aporte)
+COMPONENTES_EXPLICADOS = 2
+
+# En modo plantillas, el LLM reescribe solo la explicación del primer recomendado
+PULIR_PRIMERO = os.getenv("EXPLICACIONES_PULIR_PRIMERO", "false").lower() == "true"
+
+NOMBRES = {
+    "disponibilidad": "disponibilidad",
+    "proximidad": "cercanía",
+    "experiencia": "experiencia",
+    "calificacion": "calificación",
+    "precio": "precio",
+}
+
+DISPONIBILIDAD = {
+    "HOY": "puede atender hoy",
+    "INMEDIATA": "atiende de inmediato",
+    "disponible": "está disponible",
+    "parcial": "tiene disponibilidad parcial",
+    "PROGRAMADA": "atiende con cita programada",
+}
+
+
+def _unir(partes: list) -> str:
+    return partes[0] if len(partes) == 1 else ", ".join(partes[:-1]) + " y " + partes[-1]
+
+
+def _precio_frente_a_mercado(precio: int, rango_precios: dict) -> str:
+    if rango_precios is None:
+        return ""
+    if precio < rango_precios["p10"]:
+        return ", por debajo del rango habitual de la zona"
+    if precio <= rango_precios["p50"]:
+        return ", por debajo de la mediana de la zona"
+    if precio <= rango_precios["p90"]:
+        return ", dentro del rango de la zona"
+    return ", por encima del rango habitual de la zona"
+
+
+def _detalle(componente: str, candidato, valor: float) -> str:
+    """Dato concreto del candidato que justifica el componente."""
+    if componente == "disponibilidad":
+        return DISPONIBILIDAD.get(candidato.get("disponibilidad"), "está disponible")
+    if componente == "proximidad":
+        distancia = candidato.get("distancia_km")
+        return f"está a {float(distancia):.1f} km" if distancia is not None else "trabaja en tu zona"
+    if componente == "experiencia":
+        return f"tiene {candidato.get('anos_experiencia') or 0} años de experiencia"
+    if componente == "calificacion":
+        return f"tiene calificación {float(candidato.get('calificacion_promedio') or 0):.1f}/5"
+    # El componente de precio es relativo a los demás candidatos; el mercado va aparte
+    return "tiene de las tarifas más económicas entre los candidatos" if valor >= 0.5 else "tiene tarifa intermedia"
+
+
+def explicar(candidato, contribuciones: np.ndarray, pesos: np.ndarray, componentes: tuple,
+             precio: int = 0, rango_precios: dict = None) -> str:
+    """Explicación del candidato a partir del aporte ponderado de cada componente.
+
+    `contribuciones` y `pesos` van en el orden de `componentes` (puntuacion.COMPONENTES);
+    `precio` es el propuesto por cotizador.py.
+    """
+    total = float(contribuciones.sum())
+    orden = np.argsort(-contribuciones, kind="stable")[:COMPONENTES_EXPLICADOS]
+    principales = [i for i in orden.tolist() if contribuciones[i] > 0] or [int(orden[0])]
+    valores = np.divide(contribuciones, pesos, out=np.zeros_like(contribuciones), where=pesos > 0)
+
+    motivos = _unir([NOMBRES[componentes[i]] for i in principales])
+    participacion = f" ({float(contribuciones[principales].sum()) / total:.0%} de su score)" if total > 0 else ""
+    detalles = [_detalle(componentes[i], candidato, float(valores[i])) for i in principales]
+    # "tiene calificación 4.8/5 y 12 años de experiencia", sin repetir el verbo
+    detalles = _unir(detalles[:1] + [
+        d.removeprefix("tiene ") if d.startswith("tiene ") and detalles[0].startswith("tiene ") else d
+        for d in detalles[1:]
+    ])
+    frases = [f"Recomendado por {motivos}{participacion}: {detalles}."]
+    if precio:
+        frases.append(f"Cotiza ${precio:,}{_precio_frente_a_mercado(precio, rango_precios)}.")
+    frases.append("Cuenta con ARL." if candidato.get("tiene_arl") else "No reporta ARL.")
+    return " ".join(frases)
+
+
+def explicar_algoritmo(urgencia: str, pesos: dict, total: int, recomendados: list) -> str:
+    """explicacion_algoritmo: la fórmula aplicada y por qué lidera el primero."""
+    formula = ", ".join(
+        f"{NOMBRES.get(componente, componente)} {peso:.0%}"
+        for componente, peso in sorted(pesos.items(), key=lambda p: -p[1])
+    )
+    texto = f"Puntuación determinista para urgencia {urgencia}: {formula}. Se evaluaron {total} candidatos"
+    if not recomendados:
+        return texto + "."
+    primero = recomendados[0]
+    texto += (f"; lidera {primero.nombre_completo} (score {primero.score_relevancia:.3f}) "
+              f"por {NOMBRES.get(primero.motivo_top, primero.motivo_top)}")
+    if len(recomendados) > 1:
+        texto += f", {primero.score_relevancia - recomendados[1].score_relevancia:.3f} por encima del segundo"
+    return texto + "."
@@ -0,0 +1,83 @@
+"""
+geo.py - Distancias geográficas y cobertura de trabajadores
+
+La ubicación de un trabajador es la suya propia si la tiene (trabajadores.latitud/longitud)
+o, si no, el centroide de su barrio. La búsqueda de candidatos cercanos funciona en dos pasos:
+
+1. En SQL, una caja envolvente (rango de latitud/longitud) alrededor del cliente, resuelta
+   con el índice de barrios, descarta todo lo que está claramente lejos.
+2. Aquí, con NumPy, la distancia haversine exacta de todos los candidatos de una vez y el
+   filtro por la cobertura_km declarada por cada trabajador.
+"""
+
+import math
+import os
+
+import numpy as np
+
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Radio de la caja envolvente: ningún trabajador se desplaza más allá de esto
+COBERTURA_MAX_KM = float(os.getenv("COBERTURA_MAX_KM", "50"))
+
+# Holgura por trabajadores con ubicación propia algo alejada del centroide de su barrio
+MARGEN_BARRIO_KM = float(os.getenv("MARGEN_BARRIO_KM", "3"))
+
+
+def caja_envolvente(latitud: float, longitud: float, radio_km: float) -> dict:
+    """Rango de latitud/longitud que contiene el círculo de `radio_km` alrededor del punto."""
+    delta_latitud = math.degrees(radio_km / RADIO_TIERRA_KM)
+    # Cerca de los polos la caja cubriría todas las longitudes
+    coseno = max(math.cos(math.radians(latitud)), 1e-6)
+    delta_longitud = min(180.0, math.degrees(radio_km / (RADIO_TIERRA_KM * coseno)))
+    return {
+        "latitud_min": latitud - delta_latitud,
+        "latitud_max": latitud + delta_latitud,
+        "longitud_min": longitud - delta_longitud,
+        "longitud_max": longitud + delta_longitud,
+    }
+
+
+def distancias_km(latitud: float, longitud: float, latitudes, longitudes) -> np.ndarray:
+    """Distancia haversine (km) desde un punto a un arreglo de puntos."""
+    lat1 = math.radians(latitud)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64) - longitud)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def matriz_distancias_km(latitudes_a, longitudes_a, latitudes_b, longitudes_b) -> np.ndarray:
+    """Distancias haversine (km) entre cada punto de `a` (filas) y cada punto de `b` (columnas)."""
+    lat1 = np.radians(np.asarray(latitudes_a, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(latitudes_b, dtype=np.float64))[None, :]
+    dlon = np.radians(
+        np.asarray(longitudes_b, dtype=np.float64)[None, :] - np.asarray(longitudes_a, dtype=np.float64)[:, None]
+    )
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def filtrar_por_cobertura(candidatos, latitud: float, longitud: float, limite: int = None,
+                          distancias: np.ndarray = None) -> list:
+    """Candidatos que alcanzan el punto según su cobertura_km, con distancia_km.
+
+    `candidatos` son filas con latitud, longitud y cobertura_km; se conserva su orden.
+    `distancias`, si ya se conocen (matriz_distancias.py), evita recalcularlas.
+    Devuelve dicts (las filas de SQLAlchemy son inmutables) con distancia_km redondeada.
+    """
+    if not candidatos:
+        return []
+    if distancias is None:
+        distancias = distancias_km(
+            latitud, longitud,
+            [c["latitud"] for c in candidatos],
+            [c["longitud"] for c in candidatos]
+        )
+    cobertura = np.array([c["cobertura_km"] for c in candidatos], dtype=np.float64)
+    indices = np.flatnonzero(distancias <= np.minimum(cobertura, COBERTURA_MAX_KM))
+    if limite is not None:
+        indices = indices[:limite]
+    return [{**candidatos[i], "distancia_km": round(float(distancias[i]), 2)} for i in indices]
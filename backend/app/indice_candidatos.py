@@ -0,0 +1,334 @@
+"""
+indice_candidatos.py - Índice en memoria de candidatos por (ciudad, oficio)
+
+Cada petición del pipeline repetía el join de cinco tablas para sacar como mucho 15
+trabajadores de un par (ciudad, oficio). Este índice guarda, por cada par, las filas de
+candidatos ya ordenadas como la consulta SQL (calificación y experiencia descendentes,
+luego id) junto con sus columnas numéricas en arreglos NumPy. Buscar es un acceso al
+diccionario más un slice; con la ubicación del cliente, una máscara de caja envolvente
+sobre los arreglos de latitud/longitud de las cubetas del oficio. Si se conoce el barrio
+del cliente, las distancias salen de la matriz barrio × barrio (matriz_distancias.py) y
+solo se calcula la haversine de los trabajadores con ubicación propia. Para el top-k por
+score compuesto, cada cubeta se parte en fragmentos con cotas (topk.py).
+
+Se construye completo con reconstruir() (al arrancar y en cada RECARGA de la escucha de
+cambios) y se actualiza por partes con actualizar_*(), que recargan de la base solo los
+trabajadores, oficios o ciudades de cada aviso. Un aviso de trabajador no reordena su
+cubeta: sus filas se quitan y se insertan en su lugar del orden por bisección, y de los
+fragmentos de top-k solo se recalculan los que tocan (Cubeta.actualizada).
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import select
+
+from database import Trabajador, Ciudad, Oficio
+from consultas import SENTENCIA_CANDIDATOS_UBICADOS, LIMITE_CANDIDATOS
+from geo import caja_envolvente, distancias_km, filtrar_por_cobertura, COBERTURA_MAX_KM
+from topk import Fragmentos, mejores
+
+
+def _clave(fila) -> tuple:
+    return fila["id_ciudad"], fila["id_oficio"]
+
+
+def _orden(fila) -> tuple:
+    """Mismo orden que la consulta de candidatos."""
+    return -fila["calificacion_promedio"], -fila["anos_experiencia"], fila["id_trabajador"]
+
+
+def _arreglo(filas, columna: str) -> np.ndarray:
+    return np.array(
+        [np.nan if fila[columna] is None else float(fila[columna]) for fila in filas],
+        dtype=np.float64
+    )
+
+
+def _columnas(filas: list) -> dict:
+    """Arreglos de una cubeta (atributo -> arreglo) para esas filas, en su orden."""
+    return {
+        "ids": np.array([fila["id_trabajador"] for fila in filas], dtype=np.int64),
+        "calificacion": _arreglo(filas, "calificacion_promedio"),
+        "experiencia": _arreglo(filas, "anos_experiencia"),
+        "tarifa_hora": _arreglo(filas, "tarifa_hora_promedio"),
+        "tarifa_visita": _arreglo(filas, "tarifa_visita"),
+        "cobertura": _arreglo(filas, "cobertura_km"),
+        "latitud": _arreglo(filas, "latitud"),
+        "longitud": _arreglo(filas, "longitud"),
+        "disponibilidad": np.array([fila["disponibilidad"] for fila in filas], dtype=object),
+    }
+
+
+class Cubeta:
+    """Candidatos de un (id_ciudad, id_oficio), ordenados, con columnas en arreglos.
+
+    `filas` conserva los valores tal como los devuelve la base (los agentes reciben el mismo
+    texto que con la consulta SQL); los arreglos (ids, calificacion, experiencia, tarifa_hora,
+    tarifa_visita, cobertura, latitud, longitud, disponibilidad) sirven para filtrar y
+    puntuar sin recorrerlas. Una cubeta no cambia después de creada: las actualizaciones
+    crean otra.
+    """
+
+    def __init__(self, filas: list, columnas: dict = None):
+        # Con `columnas` las filas ya vienen ordenadas (Cubeta.actualizada)
+        self.filas = filas if columnas is not None else sorted(filas, key=_orden)
+        for atributo, arreglo in (columnas if columnas is not None else _columnas(self.filas)).items():
+            setattr(self, atributo, arreglo)
+        self._fragmentos = None
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def fragmentos(self) -> Fragmentos:
+        """Fragmentos con cotas para el top-k por score (topk.py), construidos al primer uso."""
+        if self._fragmentos is None:
+            self._fragmentos = Fragmentos(self)
+        return self._fragmentos
+
+    def actualizada(self, ids_quitar: set, nuevas: list) -> "Cubeta":
+        """Otra cubeta sin las filas de `ids_quitar` y con `nuevas` en su lugar del orden.
+
+        Las posiciones salen por bisección y los arreglos se copian con np.delete/np.insert:
+        nada se reordena ni se convierte fila por fila salvo las nuevas. Si los fragmentos de
+        top-k ya existían se actualizan igual, recalculando solo los fragmentos tocados.
+        """
+        quitar = np.flatnonzero(np.isin(self.ids, np.fromiter(ids_quitar, dtype=np.int64)))
+        filas = self.filas.copy()
+        for i in reversed(quitar.tolist()):
+            del filas[i]
+
+        nuevas = sorted(nuevas, key=_orden)
+        # Posiciones en la cubeta ya sin las quitadas, como las espera np.insert
+        posiciones = np.array([bisect.bisect_left(filas, _orden(fila), key=_orden) for fila in nuevas], dtype=np.int64)
+        agregadas = _columnas(nuevas)
+        columnas = {
+            atributo: np.insert(np.delete(getattr(self, atributo), quitar), posiciones, arreglo)
+            for atributo, arreglo in agregadas.items()
+        }
+        for posicion, fila in zip(reversed(posiciones.tolist()), reversed(nuevas)):
+            filas.insert(posicion, fila)
+
+        cubeta = Cubeta(filas, columnas)
+        if self._fragmentos is not None:
+            cubeta._fragmentos = self._fragmentos.actualizados(cubeta, quitar, posiciones)
+        return cubeta
+
+    def en_caja(self, caja: dict) -> list:
+        """Filas con ubicación dentro de la caja envolvente, en orden."""
+        mascara = (
+            (self.latitud >= caja["latitud_min"]) & (self.latitud <= caja["latitud_max"])
+            & (self.longitud >= caja["longitud_min"]) & (self.longitud <= caja["longitud_max"])
+        )
+        return [self.filas[i] for i in np.flatnonzero(mascara)]
+
+
+class IndiceCandidatos:
+    """Cubetas de candidatos por (id_ciudad, id_oficio) para todo el proceso."""
+
+    def __init__(self, engine, matriz=None):
+        self.engine = engine
+        self.matriz = matriz
+        self._lock = threading.RLock()
+        self._cubetas = {}
+        self._ciudades_por_oficio = defaultdict(set)
+        self._claves_por_trabajador = defaultdict(set)
+        # Versiones para cachear resultados: suben con cada cambio de la cubeta o del oficio
+        self._epoca = 0
+        self._versiones = defaultdict(int)
+        self._versiones_oficio = defaultdict(int)
+        self._listo = False
+        self._contadores = {"reconstrucciones": 0, "actualizaciones": 0, "busquedas": 0}
+        self._ultima_reconstruccion = {"filas": 0, "ms": 0.0}
+
+    @property
+    def listo(self) -> bool:
+        return self._listo
+
+    # =========================
+    # BÚSQUEDA
+    # =========================
+
+    def buscar(self, id_oficio: int, id_ciudad: int = None, limite: int = LIMITE_CANDIDATOS,
+               ubicacion: tuple = None, id_barrio: int = None) -> list:
+        """Mismo contrato que consultas.buscar_candidatos. Las filas son compartidas: no modificarlas.
+
+        `id_barrio` es el barrio del cliente cuya ubicación es `ubicacion`, para usar la matriz.
+        """
+        self._contadores["busquedas"] += 1
+        if ubicacion is None and id_ciudad is not None:
+            cubeta = self._cubetas.get((id_ciudad, id_oficio))
+            return cubeta.filas[:limite] if cubeta else []
+
+        with self._lock:
+            cubetas = [self._cubetas[(ciudad, id_oficio)] for ciudad in self._ciudades_por_oficio.get(id_oficio, ())]
+
+        if ubicacion is None:
+            return list(itertools.islice(heapq.merge(*(c.filas for c in cubetas), key=_orden), limite))
+
+        latitud, longitud = ubicacion
+        caja = caja_envolvente(latitud, longitud, COBERTURA_MAX_KM)
+        cercanos = list(heapq.merge(*(c.en_caja(caja) for c in cubetas), key=_orden))
+        return filtrar_por_cobertura(
+            cercanos, latitud, longitud, limite, self._distancias(cercanos, ubicacion, id_barrio)
+        )
+
+    def mejores(self, id_oficio: int, urgencia: str, k: int, id_ciudad: int = None, excluir=None) -> tuple:
+        """Top-k por score compuesto del oficio (o de una ciudad) sin puntuar todas las filas,
+        dejando fuera a los trabajadores de `excluir`.
+
+        Devuelve lo mismo que topk.mejores.
+        """
+        self._contadores["busquedas"] += 1
+        with self._lock:
+            ciudades = [id_ciudad] if id_ciudad is not None else self._ciudades_por_oficio.get(id_oficio, ())
+            cubetas = [self._cubetas[(c, id_oficio)] for c in ciudades if (c, id_oficio) in self._cubetas]
+        return mejores([cubeta.fragmentos for cubeta in cubetas], urgencia, k, excluir)
+
+    def _distancias(self, filas: list, ubicacion: tuple, id_barrio: int):
+        """Distancias desde el cliente: de la matriz si se puede, haversine para el resto."""
+        if not filas or id_barrio is None or self.matriz is None or not self.matriz.lista:
+            return None
+        distancias = self.matriz.distancias(id_barrio, [fila["id_barrio"] for fila in filas])
+        faltan = np.isnan(distancias) | np.array([fila["ubicacion_propia"] for fila in filas], dtype=bool)
+        if faltan.any():
+            indices = np.flatnonzero(faltan)
+            distancias[indices] = distancias_km(
+                ubicacion[0], ubicacion[1],
+                [filas[i]["latitud"] for i in indices],
+                [filas[i]["longitud"] for i in indices]
+            )
+        return distancias
+
+    def cubeta(self, id_ciudad: int, id_oficio: int) -> Cubeta:
+        return self._cubetas.get((id_ciudad, id_oficio))
+
+    def version(self, id_oficio: int, ciudades: tuple = None) -> tuple:
+        """Versión de las cubetas del oficio en esas ciudades (todas si es None).
+
+        Cambia cada vez que cambia alguna de ellas o se reconstruye el índice.
+        """
+        with self._lock:
+            if ciudades is None:
+                return self._epoca, self._versiones_oficio[id_oficio]
+            return self._epoca, tuple(self._versiones[(ciudad, id_oficio)] for ciudad in ciudades)
+
+    # =========================
+    # CONSTRUCCIÓN Y ACTUALIZACIÓN
+    # =========================
+
+    def _filas(self, *condiciones) -> list:
+        with self.engine.connect() as conexion:
+            return [dict(fila) for fila in conexion.execute(SENTENCIA_CANDIDATOS_UBICADOS.where(*condiciones)).mappings()]
+
+    def reconstruir(self):
+        """Carga todos los candidatos y reemplaza el índice de una vez."""
+        inicio = time.perf_counter()
+        filas = self._filas()
+        por_clave = defaultdict(list)
+        for fila in filas:
+            por_clave[_clave(fila)].append(fila)
+
+        cubetas = {clave: Cubeta(grupo) for clave, grupo in por_clave.items()}
+        ciudades_por_oficio = defaultdict(set)
+        claves_por_trabajador = defaultdict(set)
+        for clave, cubeta in cubetas.items():
+            ciudades_por_oficio[clave[1]].add(clave[0])
+            for id_trabajador in cubeta.ids.tolist():
+                claves_por_trabajador[id_trabajador].add(clave)
+
+        with self._lock:
+            self._cubetas = cubetas
+            self._ciudades_por_oficio = ciudades_por_oficio
+            self._claves_por_trabajador = claves_por_trabajador
+            self._epoca += 1
+            self._listo = True
+        ms = (time.perf_counter() - inicio) * 1000
+        self._contadores["reconstrucciones"] += 1
+        self._ultima_reconstruccion = {"filas": len(filas), "ms": round(ms, 1)}
+        print(f"🗂️  Índice de candidatos: {len(filas)} filas en {len(cubetas)} cubetas ({ms:.0f} ms)")
+
+    def actualizar_trabajadores(self, ids_trabajador: set):
+        """Recarga esos trabajadores: pueden entrar, salir o moverse entre cubetas."""
+        ids_trabajador = set(ids_trabajador)
+        with self._lock:
+            claves = set().union(*(self._claves_por_trabajador.get(i, ()) for i in ids_trabajador))
+        nuevas = self._filas(Trabajador.id_trabajador.in_(ids_trabajador))
+        self._reemplazar(claves, nuevas, ids_trabajador)
+
+    def actualizar_oficios(self, ids_oficio: set):
+        """Recarga las cubetas de esos oficios (p. ej. cambió el nombre del oficio)."""
+        ids_oficio = set(ids_oficio)
+        with self._lock:
+            claves = {(ciudad, oficio) for oficio in ids_oficio for ciudad in self._ciudades_por_oficio.get(oficio, ())}
+        nuevas = self._filas(Oficio.id_oficio.in_(ids_oficio))
+        self._reemplazar(claves, nuevas)
+
+    def actualizar_ciudades(self, ids_ciudad: set):
+        """Recarga las cubetas de esas ciudades."""
+        ids_ciudad = set(ids_ciudad)
+        with self._lock:
+            claves = {clave for clave in self._cubetas if clave[0] in ids_ciudad}
+        nuevas = self._filas(Ciudad.id_ciudad.in_(ids_ciudad))
+        self._reemplazar(claves, nuevas)
+
+    def actualizar_barrios(self, ids_barrio: set):
+        """Recarga los trabajadores de esos barrios (nombre, ciudad o coordenadas)."""
+        with self.engine.connect() as conexion:
+            ids_trabajador = set(conexion.execute(
+                select(Trabajador.id_trabajador).where(Trabajador.id_barrio.in_(ids_barrio))
+            ).scalars())
+        if ids_trabajador:
+            self.actualizar_trabajadores(ids_trabajador)
+
+    def _reemplazar(self, claves: set, nuevas: list, ids_trabajador: set = None):
+        """Agrega `nuevas` a sus cubetas y quita de las cubetas `claves` las filas de
+        `ids_trabajador`, o todas si es None (la cubeta se reconstruye)."""
+        por_clave = defaultdict(list)
+        for fila in nuevas:
+            por_clave[_clave(fila)].append(fila)
+
+        with self._lock:
+            for clave in claves | set(por_clave):
+                actual = self._cubetas.get(clave)
+                agregadas = por_clave.get(clave, [])
+                if actual is not None:
+                    quitadas = actual.ids.tolist() if ids_trabajador is None else ids_trabajador
+                    for id_trabajador in quitadas:
+                        self._claves_por_trabajador.get(id_trabajador, set()).discard(clave)
+                for fila in agregadas:
+                    self._claves_por_trabajador[fila["id_trabajador"]].add(clave)
+                self._versiones[clave] += 1
+                self._versiones_oficio[clave[1]] += 1
+
+                if actual is not None and ids_trabajador is not None:
+                    cubeta = actual.actualizada(ids_trabajador, agregadas)
+                else:
+                    cubeta = Cubeta(agregadas)
+                if len(cubeta):
+                    self._cubetas[clave] = cubeta
+                    self._ciudades_por_oficio[clave[1]].add(clave[0])
+                else:
+                    self._cubetas.pop(clave, None)
+                    self._ciudades_por_oficio[clave[1]].discard(clave[0])
+            self._contadores["actualizaciones"] += 1
+
+    def invalidar(self):
+        """Deja de usarse hasta la próxima reconstrucción."""
+        self._listo = False
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                **self._contadores,
+                "listo": self._listo,
+                "cubetas": len(self._cubetas),
+                "filas": sum(len(cubeta) for cubeta in self._cubetas.values()),
+                "ultima_reconstruccion": self._ultima_reconstruccion,
+            }
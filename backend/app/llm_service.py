@@ -9,6 +9,10 @@ from models import (
     AnalisisOutput, RecomendacionOutput, AlertaOutput, 
     ProcesamientoCompletoOutput, SolicitudOutput
 )  # Importación absoluta para ejecución dentro de /app
+from puntuacion import MODO_RECOMENDADOR, recomendar as recomendar_por_puntuacion
+from explicaciones import PULIR_PRIMERO
+from caches import recomendaciones as cache_recomendaciones
+from cotizador import cotizaciones as cotizar_candidatos
 
 # Cargar variables de entorno desde .env
 try:
@@ -321,7 +325,8 @@ async def recomendar_trabajadores(
     urgencia: str, 
     descripcion_normalizada: str,
     trabajadores_disponibles: str,
-    criterios_ubicacion: str = ""
+    criterios_ubicacion: str = "",
+    cotizaciones: dict = None
 ) -> RecomendacionOutput:
     """
     Agente Recomendador: encuentra y prioriza trabajadores para una solicitud específica.
@@ -332,10 +337,14 @@ async def recomendar_trabajadores(
         descripcion_normalizada: Descripción limpia del servicio requerido
         trabajadores_disponibles: String con datos de trabajadores formateados
         criterios_ubicacion: Información adicional de ubicación/distancia
+        cotizaciones: {id_trabajador: precio} de cotizador.py; con ellas el modelo no
+            calcula precio_propuesto y se completa después
     
     Returns:
         RecomendacionOutput: Lista priorizada de trabajadores recomendados con explicaciones
     """
+    campo_precio = "" if cotizaciones else """
+      "precio_propuesto": <int en COP>,"""
 
     system_instruction = f"""Eres 'TaskPro Matcher', un agente especializado en conectar solicitudes con los trabajadores más apropiados.
 
@@ -371,8 +380,7 @@ FORMATO JSON REQUERIDO (debes devolver EXACTAMENTE esta estructura):
       "nombre_completo": "<string>",
       "score_relevancia": <float entre 0.0 y 1.0>,
       "distancia_km": <float>,
-      "motivo_top": "<disponibilidad|experiencia|precio|calificacion|proximidad>",
-      "precio_propuesto": <int en COP>,
+      "motivo_top": "<disponibilidad|experiencia|precio|calificacion|proximidad>",{campo_precio}
       "anos_experiencia": <int>,
       "calificacion_promedio": <float entre 0 y 5>,
       "explicacion": "<razón específica de esta recomendación>",
@@ -453,12 +461,105 @@ RESPONDE SOLO CON JSON VÁLIDO según el formato especificado."""
             raise ValueError(f"Recomendador: no se encontró JSON. Texto: {text[:500]}...")
 
     try:
+        if cotizaciones:
+            for trabajador in parsed.get("trabajadores_recomendados", []):
+                id_trabajador = int(trabajador.get("id_trabajador", 0))
+                trabajador["precio_propuesto"] = cotizaciones.get(id_trabajador, trabajador.get("precio_propuesto", 0))
         recomendacion = RecomendacionOutput(**parsed)
         return recomendacion
     except Exception as e:
         raise ValueError(f"Recomendador: error creando RecomendacionOutput: {str(e)} | parsed={parsed}")
 
 
+async def redactar_explicaciones(
+    recomendacion: RecomendacionOutput,
+    urgencia: str,
+    descripcion_normalizada: str
+) -> RecomendacionOutput:
+    """
+    Redacta con el LLM la explicación de cada trabajador ya puntuado por puntuacion.py.
+
+    El orden, los scores y los datos no se tocan: el modelo solo reescribe las explicaciones
+    de plantilla (explicaciones.py) que trae la recomendación, y si la llamada falla se
+    conservan. Con MODO_RECOMENDADOR=plantillas no se llama al LLM, salvo para pulir la
+    del primer recomendado si EXPLICACIONES_PULIR_PRIMERO está activo.
+
+    Args:
+        recomendacion: Recomendación determinista (puntuacion.recomendar)
+        urgencia: Nivel de urgencia ('baja', 'media', 'alta')
+        descripcion_normalizada: Descripción limpia del servicio requerido
+
+    Returns:
+        RecomendacionOutput: La misma recomendación con las explicaciones redactadas
+    """
+    a_redactar = recomendacion.trabajadores_recomendados
+    if MODO_RECOMENDADOR == "plantillas":
+        a_redactar = a_redactar[:1] if PULIR_PRIMERO else []
+    if not a_redactar:
+        return recomendacion
+
+    trabajadores = "\n".join(
+        f"ID: {t.id_trabajador}, Nombre: {t.nombre_completo}, Score: {t.score_relevancia}, "
+        f"Motivo principal: {t.motivo_top}, Experiencia: {t.anos_experiencia} años, "
+        f"Calificación: {t.calificacion_promedio}/5, Distancia: {t.distancia_km} km, "
+        f"Precio: ${t.precio_propuesto}, ARL: {'Sí' if t.tiene_arl else 'No'}, "
+        f"Explicación base: {t.explicacion}"
+        for t in a_redactar
+    )
+
+    system_instruction = f"""Eres 'TaskPro Matcher'. Los trabajadores ya fueron priorizados; NO cambies el orden ni los datos.
+
+Contexto de la solicitud:
+- Urgencia: {urgencia}
+- Descripción: {descripcion_normalizada}
+- Criterio aplicado: {recomendacion.explicacion_algoritmo}
+
+[INICIO DE TRABAJADORES RECOMENDADOS]
+{trabajadores}
+[FIN DE TRABAJADORES RECOMENDADOS]
+
+FORMATO JSON REQUERIDO:
+{{
+  "explicaciones": [
+    {{ "id_trabajador": <int>, "explicacion": "<razón específica y accionable, máximo 2 frases>" }}
+  ]
+}}
+
+REGLAS CRÍTICAS:
+- DEBES devolver SOLO JSON puro, sin markdown ni texto adicional
+- Una explicación por cada trabajador de la lista, basada solo en sus datos
+- Parte de la explicación base: mejora la redacción sin contradecir sus datos
+"""
+
+    try:
+        response = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents="Redacta la explicación de cada trabajador recomendado. RESPONDE SOLO CON JSON VÁLIDO.",
+            config={
+                "system_instruction": system_instruction,
+                "response_modalities": ["TEXT"],
+                "temperature": 0.3,
+                "max_output_tokens": 2048,
+            }
+        )
+        text = (response.text or "").strip()
+        import json
+        import re
+        parsed = json.loads(re.sub(r'```(?:json)?\s*', '', text).strip())
+        explicaciones = {
+            int(e["id_trabajador"]): str(e["explicacion"]).strip()
+            for e in parsed.get("explicaciones", [])
+            if e.get("id_trabajador") is not None and e.get("explicacion")
+        }
+    except Exception as e:
+        print(f"⚠️  No se pudieron redactar las explicaciones con el LLM: {e}")
+        return recomendacion
+
+    for trabajador in a_redactar:
+        trabajador.explicacion = explicaciones.get(trabajador.id_trabajador, trabajador.explicacion)
+    return recomendacion
+
+
 async def detectar_alertas(
     analisis: "AnalisisOutput",
     recomendaciones: "RecomendacionOutput" = None,
@@ -598,7 +699,10 @@ async def procesar_solicitud_completa(
     texto_usuario: str,
     oficios_disponibles: str,
     trabajadores_disponibles: str,
-    id_barrio_usuario: int = None
+    id_barrio_usuario: int = None,
+    candidatos: list = None,
+    rango_precios: dict = None,
+    clave_cache: tuple = None
 ) -> ProcesamientoCompletoOutput:
     """
     Agente Orquestador Principal: ejecuta el pipeline completo A2A.
@@ -615,6 +719,13 @@ async def procesar_solicitud_completa(
         oficios_disponibles: Catálogo de oficios formateado
         trabajadores_disponibles: Base de trabajadores formateada
         id_barrio_usuario: Ubicación del usuario (opcional)
+        candidatos: Filas de los trabajadores formateados; con ellas el recomendador
+            puntúa con puntuacion.py y el LLM solo redacta (salvo MODO_RECOMENDADOR=llm)
+        rango_precios: Rango de mercado del oficio en la zona (precios_mercado.py); si es
+            del oficio detectado reemplaza el precio estimado por el LLM y marca precios anómalos
+        clave_cache: Clave versionada de los candidatos (main._clave_recomendacion); con ella
+            el orden y los scores de puntuacion.py para cada oficio y urgencia se reutilizan de
+            cache_recomendaciones (las explicaciones se redactan siempre con esta solicitud)
     
     Returns:
         ProcesamientoCompletoOutput: Resultado completo del pipeline A2A
@@ -631,6 +742,12 @@ async def procesar_solicitud_completa(
         
         analisis = await analizar_solicitud(texto_usuario, oficios_disponibles)
         
+        # El precio de mercado sale de los servicios reales cuando los hay, no de la estimación del LLM
+        if rango_precios and rango_precios.get("id_oficio") != analisis.id_oficio_sugerido:
+            rango_precios = None
+        if rango_precios:
+            analisis.precio_mercado_estimado = float(rango_precios["p50"])
+        
         # PASO 2: Evaluación temprana de viabilidad y datos faltantes
         alertas_tempranas = []
         
@@ -724,14 +841,57 @@ async def procesar_solicitud_completa(
             agentes_ejecutados.append("recomendador")
             
             criterios_ubicacion = f"Barrio usuario: {id_barrio_usuario}" if id_barrio_usuario else ""
+            urgencia = analisis.urgencia_inferida or "media"
+            descripcion = analisis.descripcion_normalizada or texto_usuario
             
-            recomendaciones = await recomendar_trabajadores(
-                id_oficio=analisis.id_oficio_sugerido,
-                urgencia=analisis.urgencia_inferida or "media",
-                descripcion_normalizada=analisis.descripcion_normalizada or texto_usuario,
-                trabajadores_disponibles=trabajadores_disponibles,
-                criterios_ubicacion=criterios_ubicacion
+            if candidatos is not None and MODO_RECOMENDADOR != "llm":
+                # Solo se cachea el orden determinista: las explicaciones dependen de la descripción
+                clave = None if clave_cache is None else (*clave_cache, analisis.id_oficio_sugerido, urgencia.lower())
+                puntuadas = cache_recomendaciones.obtener(clave) if clave is not None else None
+                if puntuadas is not None:
+                    print("♻️  Puntuación reutilizada de la caché")
+                else:
+                    puntuadas = recomendar_por_puntuacion(
+                        candidatos, analisis.id_oficio_sugerido, urgencia, rango_precios=rango_precios
+                    )
+                    if clave is not None and puntuadas.trabajadores_recomendados:
+                        cache_recomendaciones.guardar(clave, puntuadas)
+                recomendaciones = await redactar_explicaciones(
+                    puntuadas,
+                    urgencia=urgencia,
+                    descripcion_normalizada=descripcion
+                )
+            else:
+                recomendaciones = await recomendar_trabajadores(
+                    id_oficio=analisis.id_oficio_sugerido,
+                    urgencia=urgencia,
+                    descripcion_normalizada=descripcion,
+                    trabajadores_disponibles=trabajadores_disponibles,
+                    criterios_ubicacion=criterios_ubicacion,
+                    cotizaciones=(
+                        cotizar_candidatos(candidatos, urgencia, rango_precios) if candidatos is not None else None
+                    )
+                )
+        
+        # Precios propuestos fuera de los umbrales del rango de mercado
+        contexto_precios = ""
+        if rango_precios:
+            contexto_precios = (
+                f" Rango de mercado ({rango_precios['fuente']}, {rango_precios['muestras']} muestras): "
+                f"p10 {rango_precios['p10']}, p50 {rango_precios['p50']}, p90 {rango_precios['p90']}."
             )
+            for trabajador in (recomendaciones.trabajadores_recomendados if recomendaciones else []):
+                precio = trabajador.precio_propuesto
+                if precio and not rango_precios["umbral_bajo"] <= precio <= rango_precios["umbral_alto"]:
+                    alertas_tempranas.append({
+                        "tipo_alerta": "PRECIO_ANOMALO",
+                        "severidad": "baja",
+                        "detalle": f"Precio propuesto ${precio:,} fuera del rango de mercado "
+                                   f"${rango_precios['p10']:,}-${rango_precios['p90']:,}",
+                        "entidad_afectada": "trabajador",
+                        "id_entidad": trabajador.id_trabajador,
+                        "accion_recomendada": "Confirmar la tarifa con el trabajador antes de aceptar"
+                    })
         
         # PASO 4: Detectar alertas (Agente Guardian)
         print("🛡️ Ejecutando Agente Guardian...")
@@ -740,7 +900,7 @@ async def procesar_solicitud_completa(
         alertas = await detectar_alertas(
             analisis=analisis,
             recomendaciones=recomendaciones,
-            contexto_adicional=f"Procesamiento A2A completo. Barrio: {id_barrio_usuario}"
+            contexto_adicional=f"Procesamiento A2A completo. Barrio: {id_barrio_usuario}.{contexto_precios}"
         )
         
         # PASO 5: Decidir acción final basándose en alertas
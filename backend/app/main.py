@@ -1,12 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func, and_, select, distinct, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
 # Importar modelos SQLAlchemy y función get_db desde database
 from database import (
     Oficio, Solicitud, Trabajador, TrabajadorOficio, Barrio, Ciudad, 
-    get_db, Base, engine, Solicitante, TarifaMercado,
-    get_db, Base, engine, Solicitante, TarifaMercado, Servicio, Calificacion
+    get_db, Base, engine, Solicitante, TarifaMercado, Servicio, Calificacion, get_db_lectura, estado_replica,
+    replica_engine, actualizar_estado_replica, REPLICA_INTERVALO_CHEQUEO_SEGUNDOS,
+    ConteoCatalogo, EstadisticaTrabajador, Alerta, ClasificacionLog
 )
 
 # Importar schemas Pydantic desde models
@@ -16,19 +23,194 @@ from models import (
     ProcesamientoCompletoOutput, TrabajadorListResponse, TrabajadorListItem,
     OficioInfo, BarrioInfo, CiudadOption, CiudadesResponse, OficioOption,
     OficiosResponse, FiltrosDisponibles, PerfilTrabajador, ServicioRealizado,
-    CalificacionRecibida, EstadisticasTrabajador
+    CalificacionRecibida, EstadisticasTrabajador, TrabajadorBusquedaItem,
+    BusquedaTrabajadoresResponse
+)
+
+from cargador_masivo import reiniciar_secuencias
+from campos import esquema_campos, parsear_campos, todos_los_campos
+from particiones import mantener_particiones, migrar_a_particionada
+from asignacion import asignar_pendientes, INTERVALO_MINUTOS as INTERVALO_ASIGNACION_MINUTOS
+from cotizador import cotizaciones as cotizar_candidatos
+from precios_mercado import PreciosMercado, INTERVALO_MINUTOS as INTERVALO_PRECIOS_MINUTOS
+from capacidad import CapacidadTrabajadores, RECONCILIACION_SEGUNDOS
+from consultas import (
+    formatear_candidatos, buscar_trabajadores_texto, ubicacion_barrio,
+    LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAX
+)
+from caches import (
+    buscar_candidatos, buscar_candidatos_cacheados, mejores_candidatos, version_candidatos, catalogo_oficios,
+    escucha, recomendaciones as cache_recomendaciones, metricas as metricas_caches
+)
+from escritor_diferido import (
+    EscritorDiferido, filas_recomendaciones, filas_alertas, filas_clasificacion
 )
 
 # Importar el servicio de LLM
 from llm_service import (
     generar_solicitud_estructurada, analizar_solicitud,
-    recomendar_trabajadores, detectar_alertas, procesar_solicitud_completa
+    recomendar_trabajadores, redactar_explicaciones, detectar_alertas, procesar_solicitud_completa
 )
+from puntuacion import (
+    MODO_RECOMENDADOR, TOP_RECOMENDADOS, armar_recomendacion, cargar_pesos, version_pesos,
+    recomendar as recomendar_por_puntuacion
+)
+
+# Cada cuántas horas se crean particiones por adelantado y se aplica la retención
+INTERVALO_PARTICIONES_HORAS = float(os.getenv("PARTICIONES_INTERVALO_HORAS", "24"))
+
+# Cada cuántos segundos se revisa si entrenar_pesos.py dejó pesos de puntuación nuevos
+RECARGA_PESOS_SEGUNDOS = float(os.getenv("PESOS_RECARGA_SEGUNDOS", "60"))
+
+
+def _mantener_particiones(eliminar: bool = False) -> dict:
+    with engine.begin() as conexion:
+        return mantener_particiones(conexion, eliminar=eliminar)
+
+
+async def _tarea_particiones():
+    """Mantiene las particiones mensuales al arrancar y luego cada INTERVALO_PARTICIONES_HORAS."""
+    while True:
+        try:
+            resumen = await asyncio.to_thread(_mantener_particiones)
+            for tabla, cambios in resumen.items():
+                if cambios["creadas"] or cambios["separadas"]:
+                    print(f"🗂️  {tabla}: creadas {cambios['creadas']}, separadas {cambios['separadas']}")
+        except Exception as e:
+            print(f"⚠️  Error manteniendo particiones: {e}")
+        await asyncio.sleep(INTERVALO_PARTICIONES_HORAS * 3600)
+
+
+def _asignar_pendientes(**kwargs) -> dict:
+    # asignar_pendientes confirma la escritura para poder liberar los cupos si falla
+    with engine.connect() as conexion:
+        return asignar_pendientes(conexion, capacidades=capacidad, **kwargs)
+
+
+async def _tarea_asignacion():
+    """Asigna por lotes las solicitudes pendientes cada INTERVALO_ASIGNACION_MINUTOS."""
+    while True:
+        await asyncio.sleep(INTERVALO_ASIGNACION_MINUTOS * 60)
+        try:
+            resumen = await asyncio.to_thread(_asignar_pendientes)
+            if resumen["solicitudes_pendientes"]:
+                print(f"🧮 Asignación por lotes: {resumen['asignadas']}/{resumen['solicitudes_pendientes']} "
+                      f"solicitudes en {resumen['ms']} ms")
+        except Exception as e:
+            print(f"⚠️  Error en la asignación por lotes: {e}")
+
+
+# Recomendaciones, alertas y logs de clasificación se guardan fuera del camino de la petición
+escritor = EscritorDiferido(engine)
+
+# Percentiles de precios por oficio × ciudad × estrato, recalculados periódicamente
+precios_mercado = PreciosMercado()
+
+
+async def _tarea_precios_mercado():
+    """Calcula los precios de mercado al arrancar y luego cada INTERVALO_PRECIOS_MINUTOS."""
+    while True:
+        try:
+            await asyncio.to_thread(precios_mercado.actualizar, engine)
+        except Exception as e:
+            print(f"⚠️  Error calculando precios de mercado: {e}")
+        await asyncio.sleep(INTERVALO_PRECIOS_MINUTOS * 60)
+
+
+# Servicios activos y reservas por trabajador, para no asignar de más al mismo
+capacidad = CapacidadTrabajadores()
+
+
+async def _tarea_capacidad():
+    """Reconcilia la capacidad con la base al arrancar y luego cada RECONCILIACION_SEGUNDOS."""
+    while True:
+        try:
+            await asyncio.to_thread(capacidad.reconciliar, engine)
+        except Exception as e:
+            print(f"⚠️  Error reconciliando la capacidad de trabajadores: {e}")
+        await asyncio.sleep(RECONCILIACION_SEGUNDOS)
+
+
+async def _tarea_replica():
+    """Mide el retraso de la réplica cada REPLICA_INTERVALO_CHEQUEO_SEGUNDOS, fuera del
+    camino de las peticiones (una réplica lenta tarda hasta el timeout de conexión)."""
+    while True:
+        try:
+            await asyncio.to_thread(actualizar_estado_replica)
+        except Exception as e:
+            print(f"⚠️  Error midiendo el retraso de la réplica: {e}")
+        await asyncio.sleep(REPLICA_INTERVALO_CHEQUEO_SEGUNDOS)
+
+
+async def _tarea_pesos():
+    """Recarga los pesos de puntuación cuando cambia el archivo que escribe entrenar_pesos.py."""
+    while True:
+        await asyncio.sleep(RECARGA_PESOS_SEGUNDOS)
+        try:
+            await asyncio.to_thread(cargar_pesos)
+        except Exception as e:
+            print(f"⚠️  Error recargando los pesos de puntuación: {e}")
+
+
+async def _registrar_auditoria(resultado, id_solicitud: int = None):
+    """Encola lo que calculó el pipeline. Sin solicitud guardada solo se registran las alertas."""
+    try:
+        await escritor.encolar("alertas", filas_alertas(id_solicitud, resultado))
+        if id_solicitud is not None:
+            await escritor.encolar("recomendaciones", filas_recomendaciones(id_solicitud, resultado))
+            await escritor.encolar("clasificacion_logs", filas_clasificacion(id_solicitud, resultado))
+    except Exception as e:
+        print(f"⚠️  No se pudo registrar la auditoría del pipeline: {e}")
+
+
+def _aplicar_distancias(recomendaciones, candidatos):
+    """Sustituye la distancia_km que estima el LLM por la calculada con coordenadas, si se conoce."""
+    distancias = {c["id_trabajador"]: c["distancia_km"] for c in candidatos if c.get("distancia_km") is not None}
+    if recomendaciones is None or not distancias:
+        return
+    for recomendado in recomendaciones.trabajadores_recomendados:
+        if recomendado.id_trabajador in distancias:
+            recomendado.distancia_km = distancias[recomendado.id_trabajador]
+
+
+def _clave_recomendacion(id_oficio: int, id_ciudad: int = None, id_barrio: int = None, urgencia: str = None) -> tuple:
+    """Clave de cache_recomendaciones con las versiones de lo que determina la
+    recomendación (candidatos, capacidad, precios de mercado, pesos); None si no se puede cachear."""
+    version = version_candidatos(id_oficio, id_ciudad)
+    if version is None:
+        return None
+    clave = ("recomendacion", id_oficio, id_ciudad, id_barrio, version, capacidad.version, precios_mercado.version,
+             version_pesos())
+    return clave if urgencia is None else (*clave, urgencia.lower())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tareas = [
+        asyncio.create_task(_tarea_particiones()),
+        asyncio.create_task(_tarea_precios_mercado()),
+        asyncio.create_task(_tarea_capacidad()),
+    ]
+    if RECARGA_PESOS_SEGUNDOS > 0:
+        tareas.append(asyncio.create_task(_tarea_pesos()))
+    if replica_engine is not None:
+        tareas.append(asyncio.create_task(_tarea_replica()))
+    if INTERVALO_ASIGNACION_MINUTOS > 0:
+        tareas.append(asyncio.create_task(_tarea_asignacion()))
+    await escritor.iniciar()
+    escucha.iniciar()
+    yield
+    escucha.detener()
+    await escritor.detener()
+    for tarea in tareas:
+        tarea.cancel()
+
 
 app = FastAPI(
     title="TaskPro Backend API",
     description="API para gestión de solicitudes de servicios profesionales con IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -56,7 +238,7 @@ def read_root():
 @app.get("/health")
 def health_check():
     """Endpoint para verificar que el servicio está funcionando"""
-    return {"status": "ok", "service": "TaskPro Backend"}
+    return {"status": "ok", "service": "TaskPro Backend", "replica": estado_replica()}
 
 
 @app.post("/solicitudes/analizar")
@@ -71,24 +253,15 @@ async def analizar_solicitud_desde_texto(
     preguntas aclaratorias. Útil para vista previa y transparencia antes de confirmar.
     """
 
-    # Paso 1: Consultar todos los oficios disponibles
-    oficios = db.query(Oficio).all()
-    if not oficios:
+    # Paso 1: Oficios disponibles, ya formateados para el LLM (en caché)
+    oficios_disponibles, oficio_ids_validos = catalogo_oficios(db)
+    if not oficio_ids_validos:
         raise HTTPException(
             status_code=500,
             detail="No hay oficios disponibles en la base de datos. Por favor, carga la tabla de oficios primero."
         )
 
-    # Paso 2: Formatear los oficios para el LLM
-    oficios_str_list = []
-    for oficio in oficios:
-        oficios_str_list.append(
-            f"ID: {oficio.id_oficio}, Nombre: {oficio.nombre_oficio}, "
-            f"Categoría: {oficio.categoria_servicio}, Descripción: {oficio.descripcion}"
-        )
-    oficios_disponibles = "\n".join(oficios_str_list)
-
-    # Paso 3: Llamar al agente Analista
+    # Paso 2: Llamar al agente Analista
     try:
         analisis = await analizar_solicitud(
             texto_usuario_original=solicitud_input.texto_usuario,
@@ -117,34 +290,22 @@ async def crear_solicitud_desde_texto(
     """
     
     try:
-        # Paso 1: Consultar todos los oficios disponibles
-        oficios = db.query(Oficio).all()
+        # Paso 1: Oficios disponibles, ya formateados para el LLM (en caché)
+        oficios_disponibles, oficio_ids_validos = catalogo_oficios(db)
         
-        if not oficios:
+        if not oficio_ids_validos:
             raise HTTPException(
                 status_code=500,
                 detail="No hay oficios disponibles en la base de datos. Por favor, carga la tabla de oficios primero."
             )
         
-        # Paso 2: Formatear los oficios en un string legible para el LLM
-        oficios_str_list = []
-        for oficio in oficios:
-            oficios_str_list.append(
-                f"ID: {oficio.id_oficio}, Nombre: {oficio.nombre_oficio}, "
-                f"Categoría: {oficio.categoria_servicio}, Descripción: {oficio.descripcion}"
-            )
-        
-        oficios_disponibles = "\n".join(oficios_str_list)
-        
-        # Paso 3: Llamar al servicio LLM para estructurar la solicitud
+        # Paso 2: Llamar al servicio LLM para estructurar la solicitud
         solicitud_estructurada = await generar_solicitud_estructurada(
             texto_usuario_original=solicitud_input.texto_usuario,
             oficios_disponibles=oficios_disponibles
         )
         
-        # Paso 4: Validar que el id_oficio devuelto por el LLM existe en la base de datos
-        oficio_ids_validos = {oficio.id_oficio for oficio in oficios}
-        
+        # Paso 3: Validar que el id_oficio devuelto por el LLM existe en la base de datos
         if solicitud_estructurada.id_oficio not in oficio_ids_validos:
             raise HTTPException(
                 status_code=400,
@@ -152,7 +313,7 @@ async def crear_solicitud_desde_texto(
                        f"El LLM devolvió un ID inválido."
             )
         
-        # Paso 5: Crear la nueva solicitud en la base de datos
+        # Paso 4: Crear la nueva solicitud en la base de datos
         nueva_solicitud = Solicitud(
             id_solicitante=0,  # Valor por defecto (TODO: implementar autenticación)
             id_oficio=solicitud_estructurada.id_oficio,
@@ -164,12 +325,12 @@ async def crear_solicitud_desde_texto(
             flag_alerta=False
         )
         
-        # Paso 6: Guardar en la base de datos
+        # Paso 5: Guardar en la base de datos
         db.add(nueva_solicitud)
         db.commit()
         db.refresh(nueva_solicitud)
         
-        # Paso 7: Retornar la solicitud creada
+        # Paso 6: Retornar la solicitud creada
         return nueva_solicitud
         
     except HTTPException:
@@ -205,22 +366,14 @@ async def procesar_solicitud_completa_endpoint(
     try:
         # ========== PASO 1: OBTENER TODOS LOS OFICIOS ==========
         print("🔍 [DEBUG] Consultando oficios disponibles...")
-        oficios = db.query(Oficio).all()
-        if not oficios:
+        oficios_disponibles, oficio_ids_validos = catalogo_oficios(db)
+        if not oficio_ids_validos:
             raise HTTPException(
                 status_code=500,
                 detail="No hay oficios disponibles en la base de datos."
             )
         
-        print(f"✅ [DEBUG] Oficios encontrados: {len(oficios)}")
-        
-        oficios_str_list = []
-        for oficio in oficios:
-            oficios_str_list.append(
-                f"ID: {oficio.id_oficio}, Nombre: {oficio.nombre_oficio}, "
-                f"Categoría: {oficio.categoria_servicio}, Descripción: {oficio.descripcion}"
-            )
-        oficios_disponibles = "\n".join(oficios_str_list)
+        print(f"✅ [DEBUG] Oficios encontrados: {len(oficio_ids_validos)}")
         
         # ========== PASO 2: ANÁLISIS RÁPIDO PARA DETECTAR OFICIO ==========
         print("🔍 [DEBUG] Analizando texto para detectar oficio...")
@@ -239,12 +392,15 @@ async def procesar_solicitud_completa_endpoint(
         print(f"🔍 [DEBUG] Detectando ciudad del texto: '{solicitud_input.texto_usuario}'")
         id_barrio_usuario = solicitud_input.id_barrio_usuario
         id_ciudad_usuario = None
+        ubicacion_cliente = None
         
-        # Si se proporciona barrio, obtener su ciudad
+        # Si se proporciona barrio, obtener su ciudad (y su ubicación, si está georreferenciado)
         if id_barrio_usuario and id_barrio_usuario > 0:
             barrio = db.query(Barrio).filter(Barrio.id_barrio == id_barrio_usuario).first()
             if barrio:
                 id_ciudad_usuario = barrio.id_ciudad
+                if barrio.latitud is not None and barrio.longitud is not None:
+                    ubicacion_cliente = (float(barrio.latitud), float(barrio.longitud))
         
         # Si no tenemos ciudad, intentar detectar del texto
         if not id_ciudad_usuario:
@@ -291,52 +447,23 @@ async def procesar_solicitud_completa_endpoint(
         print(f"   - Ciudad ID: {id_ciudad_usuario}")
         print(f"   - Oficio ID: {id_oficio_detectado} ({nombre_oficio_detectado})")
         
-        trabajadores_filtrados = (
-            db.query(Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad)
-            .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
-            .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
-            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-            .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
-            .filter(
-                Oficio.id_oficio == id_oficio_detectado,  # ✅ Solo el oficio necesario
-                Ciudad.id_ciudad == id_ciudad_usuario,     # ✅ Solo la ciudad del usuario
-                Trabajador.disponibilidad.in_(["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA"])
-            )
-            .order_by(
-                Trabajador.calificacion_promedio.desc(),
-                Trabajador.anos_experiencia.desc()
-            )
-            .limit(15)  # Máximo 15 trabajadores más relevantes
-            .all()
-        )
+        # Con la ubicación del barrio se filtra por cobertura real en vez de por ciudad;
+        # si salen muy pocos se amplía a la ciudad y a las ciudades vecinas
+        trabajadores_filtrados = capacidad.filtrar(buscar_candidatos_cacheados(
+            db, id_oficio_detectado, id_ciudad_usuario, ubicacion=ubicacion_cliente, id_barrio=id_barrio_usuario
+        ))
         
         print(f"✅ [DEBUG] Trabajadores encontrados: {len(trabajadores_filtrados)}")
         
         if not trabajadores_filtrados:
             raise HTTPException(
                 status_code=404,
-                detail=f"No se encontraron trabajadores de '{nombre_oficio_detectado}' disponibles en tu ciudad."
+                detail=f"No se encontraron trabajadores de '{nombre_oficio_detectado}' disponibles "
+                       "en tu zona ni en las ciudades cercanas."
             )
         
         # Formatear trabajadores filtrados
-        print("🔍 [DEBUG] Formateando trabajadores para el LLM...")
-        trabajadores_str_list = []
-        for trabajador, trab_oficio, oficio, barrio, ciudad in trabajadores_filtrados:
-            trabajadores_str_list.append(
-                f"ID: {trabajador.id_trabajador}, "
-                f"Nombre: {trabajador.nombre_completo}, "
-                f"Oficio: {oficio.nombre_oficio} (ID: {oficio.id_oficio}), "
-                f"Experiencia: {trabajador.anos_experiencia} años, "
-                f"Calificación: {trabajador.calificacion_promedio}/5, "
-                f"Ubicación: {barrio.nombre_barrio}, {ciudad.nombre_ciudad}, "
-                f"Cobertura: {trabajador.cobertura_km} km, "
-                f"Tarifa hora: ${trab_oficio.tarifa_hora_promedio}, "
-                f"Tarifa visita: ${trab_oficio.tarifa_visita}, "
-                f"Disponibilidad: {trabajador.disponibilidad}, "
-                f"ARL: {'Sí' if trabajador.tiene_arl else 'No'}"
-            )
-        
-        trabajadores_disponibles = "\n".join(trabajadores_str_list)
+        trabajadores_disponibles = formatear_candidatos(trabajadores_filtrados)
         
         # ========== PASO 5: EJECUTAR PIPELINE A2A CON TRABAJADORES ULTRA-FILTRADOS ==========
         print("🚀 [DEBUG] Ejecutando pipeline A2A completo...")
@@ -348,10 +475,15 @@ async def procesar_solicitud_completa_endpoint(
             texto_usuario=solicitud_input.texto_usuario,
             oficios_disponibles=oficios_disponibles,
             trabajadores_disponibles=trabajadores_disponibles,
-            id_barrio_usuario=id_barrio_usuario
+            id_barrio_usuario=id_barrio_usuario,
+            candidatos=trabajadores_filtrados,
+            rango_precios=precios_mercado.rango_barrio(id_oficio_detectado, id_barrio_usuario),
+            clave_cache=_clave_recomendacion(id_oficio_detectado, id_ciudad_usuario, id_barrio_usuario)
         )
         
         print("✅ [DEBUG] Pipeline A2A completado exitosamente")
+        _aplicar_distancias(resultado.recomendaciones, trabajadores_filtrados)
+        await _registrar_auditoria(resultado)
         return resultado
         
     except HTTPException:
@@ -363,67 +495,116 @@ async def procesar_solicitud_completa_endpoint(
         )
 
 
+def _puntuar_trabajadores(db: Session, id_oficio: int, urgencia: str, id_barrio: int = None) -> RecomendacionOutput:
+    """Orden y scores deterministas de /trabajadores/recomendar, con explicaciones de
+    plantilla y sin caché; None si no hay candidatos."""
+    ubicacion = ubicacion_barrio(db, id_barrio)
+    rango_precios = precios_mercado.rango_barrio(id_oficio, id_barrio)
+    if ubicacion is None:
+        # Sin ubicación no hace falta puntuar a todo el oficio: top-k por fragmentos del índice.
+        # Los que no tienen cupo quedan fuera también del rango de precios y del total, igual
+        # que con capacidad.filtrar en el camino de abajo
+        saturados = capacidad.saturados()
+        seleccion = mejores_candidatos(id_oficio, urgencia, TOP_RECOMENDADOS, excluir=saturados)
+        if seleccion is not None and not seleccion[3] and saturados:
+            # Nadie tiene cupo: mejor recomendar a alguien ocupado que no recomendar
+            seleccion = mejores_candidatos(id_oficio, urgencia, TOP_RECOMENDADOS)
+        if seleccion is not None and seleccion[3]:
+            filas, scores, contribuciones, total, _ = seleccion
+            return armar_recomendacion(filas, scores, contribuciones, id_oficio, urgencia, total, rango_precios)
+    
+    trabajadores_query = capacidad.filtrar(buscar_candidatos(
+        db, id_oficio, limite=None, ubicacion=ubicacion, id_barrio=id_barrio
+    ))
+    if not trabajadores_query:
+        return None
+    return recomendar_por_puntuacion(trabajadores_query, id_oficio, urgencia, rango_precios=rango_precios)
+
+
+async def _recomendar_con_llm(db: Session, texto_usuario: str, id_oficio: int, urgencia: str,
+                              id_barrio: int = None) -> RecomendacionOutput:
+    """Recomendación de /trabajadores/recomendar con MODO_RECOMENDADOR=llm; None si no hay candidatos."""
+    ubicacion = ubicacion_barrio(db, id_barrio)
+    rango_precios = precios_mercado.rango_barrio(id_oficio, id_barrio)
+    trabajadores_query = capacidad.filtrar(buscar_candidatos(
+        db, id_oficio, limite=None, ubicacion=ubicacion, id_barrio=id_barrio
+    ))
+    
+    if not trabajadores_query:
+        return None
+    
+    # Formatear trabajadores
+    trabajadores_disponibles = formatear_candidatos(trabajadores_query)
+    
+    # Llamar al agente recomendador
+    recomendaciones = await recomendar_trabajadores(
+        id_oficio=id_oficio,
+        urgencia=urgencia,
+        descripcion_normalizada=texto_usuario,
+        trabajadores_disponibles=trabajadores_disponibles,
+        cotizaciones=cotizar_candidatos(trabajadores_query, urgencia, rango_precios)
+    )
+    _aplicar_distancias(recomendaciones, trabajadores_query)
+    return recomendaciones
+
+
 @app.post("/trabajadores/recomendar", response_model=RecomendacionOutput)
 async def recomendar_trabajadores_endpoint(
     solicitud_input: SolicitudInput,
     id_oficio: int,
     urgencia: str = "media",
+    id_barrio: int = None,
     db: Session = Depends(get_db)
 ):
     """
     🎯 Endpoint específico para obtener recomendaciones de trabajadores.
     
     Úsalo cuando ya sepas el oficio requerido y solo necesites encontrar
-    los mejores candidatos disponibles.
+    los mejores candidatos disponibles. Con id_barrio (georreferenciado) solo
+    se consideran los trabajadores cuya cobertura alcanza ese barrio.
+    
+    Los candidatos se ordenan con la fórmula por urgencia de puntuacion.py, el precio
+    propuesto lo calcula cotizador.py y el LLM solo redacta las explicaciones
+    (MODO_RECOMENDADOR=plantillas las deja de plantilla, sin LLM;
+    MODO_RECOMENDADOR=llm usa el recomendador LLM completo).
+    Los trabajadores sin cupo (capacidad.py) se descartan mientras quede alguno con cupo.
+    
+    El orden y los scores se reutilizan para el mismo oficio, barrio y urgencia hasta que
+    cambian los datos que los determinan (cache_recomendaciones.py); las explicaciones se
+    redactan en cada solicitud, con su texto. Con MODO_RECOMENDADOR=llm no se cachea nada.
     """
     
     try:
-        # Obtener trabajadores para el oficio específico
-        trabajadores_query = (
-            db.query(Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad)
-            .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
-            .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
-            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-            .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
-            .filter(
-                Oficio.id_oficio == id_oficio,
-                Trabajador.disponibilidad.in_(["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA"])
+        if MODO_RECOMENDADOR == "llm":
+            recomendaciones = await _recomendar_con_llm(
+                db, solicitud_input.texto_usuario, id_oficio, urgencia, id_barrio
             )
-        ).all()
-        
-        if not trabajadores_query:
+        else:
+            clave = _clave_recomendacion(id_oficio, None, id_barrio, urgencia)
+            if clave is not None and cache_recomendaciones.es_vacio(clave):
+                puntuadas = None
+            else:
+                puntuadas = cache_recomendaciones.obtener(clave) if clave is not None else None
+                if puntuadas is None:
+                    puntuadas = _puntuar_trabajadores(db, id_oficio, urgencia, id_barrio)
+                    if clave is not None:
+                        if puntuadas is None:
+                            cache_recomendaciones.guardar_vacio(clave)
+                        else:
+                            cache_recomendaciones.guardar(clave, puntuadas)
+            recomendaciones = None if puntuadas is None else await redactar_explicaciones(
+                puntuadas,
+                urgencia=urgencia,
+                descripcion_normalizada=solicitud_input.texto_usuario
+            )
+
+        if recomendaciones is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"No se encontraron trabajadores disponibles para el oficio ID {id_oficio}"
             )
-        
-        # Formatear trabajadores
-        trabajadores_str_list = []
-        for trabajador, trab_oficio, oficio, barrio, ciudad in trabajadores_query:
-            trabajadores_str_list.append(
-                f"ID: {trabajador.id_trabajador}, "
-                f"Nombre: {trabajador.nombre_completo}, "
-                f"Experiencia: {trabajador.anos_experiencia} años, "
-                f"Calificación: {trabajador.calificacion_promedio}/5, "
-                f"Ubicación: {barrio.nombre_barrio}, {ciudad.nombre_ciudad}, "
-                f"Cobertura: {trabajador.cobertura_km} km, "
-                f"Tarifa hora: ${trab_oficio.tarifa_hora_promedio}, "
-                f"Tarifa visita: ${trab_oficio.tarifa_visita}, "
-                f"ARL: {'Sí' if trabajador.tiene_arl else 'No'}"
-            )
-        
-        trabajadores_disponibles = "\n".join(trabajadores_str_list)
-        
-        # Llamar al agente recomendador
-        recomendaciones = await recomendar_trabajadores(
-            id_oficio=id_oficio,
-            urgencia=urgencia,
-            descripcion_normalizada=solicitud_input.texto_usuario,
-            trabajadores_disponibles=trabajadores_disponibles
-        )
-        
         return recomendaciones
-        
+
     except HTTPException:
         raise
     except Exception as e:
@@ -432,6 +613,34 @@ async def recomendar_trabajadores_endpoint(
             detail=f"Error al recomendar trabajadores: {str(e)}"
         )
 
+# Columnas de cada subcampo de barrio y oficios para ?fields=
+COLUMNAS_BARRIO = {
+    "id_barrio": Barrio.id_barrio,
+    "nombre_barrio": Barrio.nombre_barrio,
+    "estrato": Barrio.estrato,
+    "ciudad": Ciudad.nombre_ciudad,
+    "departamento": Ciudad.departamento,
+    "region": Ciudad.region,
+}
+COLUMNAS_OFICIO = {
+    "id_oficio": TrabajadorOficio.id_oficio,
+    "nombre_oficio": Oficio.nombre_oficio,
+    "tarifa_hora_promedio": TrabajadorOficio.tarifa_hora_promedio,
+    "tarifa_visita": TrabajadorOficio.tarifa_visita,
+    "certificaciones": TrabajadorOficio.certificaciones,
+}
+ESQUEMA_TRABAJADOR = esquema_campos(TrabajadorListItem, {"barrio": BarrioInfo, "oficios": OficioInfo})
+ESQUEMA_CIUDAD = esquema_campos(CiudadOption)
+ESQUEMA_OFICIO = esquema_campos(OficioOption)
+
+
+def _campos_solicitados(fields: str, esquema: dict, obligatorios: tuple):
+    try:
+        return parsear_campos(fields, esquema, obligatorios)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/trabajadores", response_model=TrabajadorListResponse)
 async def listar_trabajadores(
     ciudad_id: int = None,
@@ -439,7 +648,8 @@ async def listar_trabajadores(
     calificacion_min: float = None,
     disponibilidad: str = None,
     tiene_arl: bool = None,
-    db: Session = Depends(get_db)
+    fields: str = None,
+    db: Session = Depends(get_db_lectura)
 ):
     """
     📋 Endpoint para listar trabajadores con filtros opcionales.
@@ -450,35 +660,48 @@ async def listar_trabajadores(
     - calificacion_min: Calificación mínima (1-5)
     - disponibilidad: Estado de disponibilidad del trabajador
     - tiene_arl: Filtra si tiene o no ARL
+    - fields: Campos a devolver, separados por comas (ej: "nombre_completo,calificacion_promedio,
+      oficios.nombre_oficio"). id_trabajador siempre se incluye. Sin fields se devuelve todo.
     
     Los resultados se ordenan de mayor a menor calificación.
     """
     
+    campos = _campos_solicitados(fields, ESQUEMA_TRABAJADOR, ("id_trabajador",))
+    seleccion = campos if campos is not None else todos_los_campos(ESQUEMA_TRABAJADOR)
+    
     try:
-        # Construir query base con joins necesarios
-        query = (
-            db.query(Trabajador, Barrio, Ciudad)
-            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-            .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
-        )
+        escalares = [campo for campo, subcampos in seleccion.items() if subcampos is None]
+        campos_barrio = seleccion.get("barrio") or set()
+        campos_oficios = seleccion.get("oficios")
+        
+        # Solo las columnas pedidas (más id_trabajador) y solo los joins que hacen falta
+        columnas = [getattr(Trabajador, campo) for campo in escalares if campo != "id_trabajador"]
+        campos_barrio = [campo for campo in COLUMNAS_BARRIO if campo in campos_barrio]
+        columnas += [COLUMNAS_BARRIO[campo].label(f"barrio__{campo}") for campo in campos_barrio]
+        query = select(Trabajador.id_trabajador, *columnas).select_from(Trabajador)
+        
+        if campos_barrio or ciudad_id is not None:
+            query = query.join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+        if {"ciudad", "departamento", "region"}.intersection(campos_barrio):
+            query = query.join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
         
         # Aplicar filtros opcionales
         filtros_aplicados = {}
         
         if ciudad_id is not None:
-            query = query.filter(Ciudad.id_ciudad == ciudad_id)
+            query = query.where(Barrio.id_ciudad == ciudad_id)
             filtros_aplicados["ciudad_id"] = ciudad_id
             
         if calificacion_min is not None:
-            query = query.filter(Trabajador.calificacion_promedio >= calificacion_min)
+            query = query.where(Trabajador.calificacion_promedio >= calificacion_min)
             filtros_aplicados["calificacion_min"] = calificacion_min
             
         if disponibilidad is not None:
-            query = query.filter(Trabajador.disponibilidad == disponibilidad)
+            query = query.where(Trabajador.disponibilidad == disponibilidad)
             filtros_aplicados["disponibilidad"] = disponibilidad
             
         if tiene_arl is not None:
-            query = query.filter(Trabajador.tiene_arl == tiene_arl)
+            query = query.where(Trabajador.tiene_arl == tiene_arl)
             filtros_aplicados["tiene_arl"] = tiene_arl
         
         # Filtro por oficio requiere join adicional
@@ -486,48 +709,120 @@ async def listar_trabajadores(
             query = query.join(
                 TrabajadorOficio, 
                 Trabajador.id_trabajador == TrabajadorOficio.id_trabajador
-            ).filter(TrabajadorOficio.id_oficio == oficio_id)
+            ).where(TrabajadorOficio.id_oficio == oficio_id)
             filtros_aplicados["oficio_id"] = oficio_id
         
         # Ordenar por calificación descendente
         query = query.order_by(Trabajador.calificacion_promedio.desc())
         
-        # Ejecutar query
-        resultados = query.all()
+        filas = db.execute(query).mappings().all()
+        
+        # Oficios de todos los trabajadores en una sola consulta (solo si se pidieron)
+        oficios = (
+            _oficios_por_trabajador(db, [fila["id_trabajador"] for fila in filas], campos_oficios)
+            if campos_oficios is not None else {}
+        )
         
-        # Procesar resultados
         trabajadores_list = []
-        for trabajador, barrio, ciudad in resultados:
-            # Obtener todos los oficios del trabajador
-            oficios_query = (
-                db.query(TrabajadorOficio, Oficio)
-                .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
-                .filter(TrabajadorOficio.id_trabajador == trabajador.id_trabajador)
-                .all()
-            )
-            
-            oficios_list = []
-            for trab_oficio, oficio in oficios_query:
-                oficios_list.append(OficioInfo(
-                    id_oficio=oficio.id_oficio,
-                    nombre_oficio=oficio.nombre_oficio,
-                    tarifa_hora_promedio=trab_oficio.tarifa_hora_promedio,
-                    tarifa_visita=trab_oficio.tarifa_visita,
-                    certificaciones=trab_oficio.certificaciones
-                ))
-            
-            # Crear objeto de barrio
-            barrio_info = BarrioInfo(
-                id_barrio=barrio.id_barrio,
-                nombre_barrio=barrio.nombre_barrio,
-                estrato=barrio.estrato,
-                ciudad=ciudad.nombre_ciudad,
-                departamento=ciudad.departamento,
-                region=ciudad.region
-            )
-            
-            # Crear item de trabajador
-            trabajador_item = TrabajadorListItem(
+        for fila in filas:
+            item = {campo: fila[campo] for campo in escalares}
+            if "calificacion_promedio" in item:
+                item["calificacion_promedio"] = float(item["calificacion_promedio"])
+            if "barrio" in seleccion:
+                item["barrio"] = {campo: fila[f"barrio__{campo}"] for campo in campos_barrio}
+            if campos_oficios is not None:
+                item["oficios"] = oficios[fila["id_trabajador"]]
+            trabajadores_list.append(item)
+        
+        if campos is not None:
+            # Respuesta parcial: se arma el JSON directamente, sin validar contra el schema completo
+            return JSONResponse(content={
+                "total": len(trabajadores_list),
+                "trabajadores": trabajadores_list,
+                "filtros_aplicados": filtros_aplicados
+            })
+        
+        # Retornar respuesta
+        return TrabajadorListResponse(
+            total=len(trabajadores_list),
+            trabajadores=trabajadores_list,
+            filtros_aplicados=filtros_aplicados
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al listar trabajadores: {str(e)}"
+        )
+
+
+def _oficios_por_trabajador(db: Session, ids_trabajadores: list, campos: set = None) -> dict:
+    """Oficios de varios trabajadores en una sola consulta: {id_trabajador: [dict de OficioInfo]}.
+
+    Con `campos` solo se leen esas columnas (y el join a oficios solo si se pide el nombre).
+    """
+    campos = [campo for campo in COLUMNAS_OFICIO if campos is None or campo in campos]
+    oficios = {id_trabajador: [] for id_trabajador in ids_trabajadores}
+    if not ids_trabajadores:
+        return oficios
+    query = (
+        select(TrabajadorOficio.id_trabajador, *[COLUMNAS_OFICIO[campo].label(campo) for campo in campos])
+        .where(TrabajadorOficio.id_trabajador.in_(ids_trabajadores))
+        .order_by(TrabajadorOficio.id_trabajador, TrabajadorOficio.id_oficio)
+    )
+    if "nombre_oficio" in campos:
+        query = query.join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
+    for fila in db.execute(query).mappings():
+        oficios[fila["id_trabajador"]].append({campo: fila[campo] for campo in campos})
+    return oficios
+
+
+@app.get("/trabajadores/buscar", response_model=BusquedaTrabajadoresResponse)
+async def buscar_trabajadores(
+    q: str = Query(..., min_length=2, max_length=100),
+    limite: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAX),
+    cursor: str = None,
+    db: Session = Depends(get_db_lectura)
+):
+    """
+    🔎 Búsqueda de texto libre de trabajadores.
+    
+    Busca en el nombre del trabajador, el nombre y la descripción de sus oficios y sus
+    certificaciones, sin distinguir mayúsculas ni tildes y tolerando errores de escritura.
+    
+    Parámetros de query:
+    - q: Texto a buscar (mínimo 2 caracteres)
+    - limite: Resultados por página (máximo 100)
+    - cursor: Valor de `siguiente` de la página anterior
+    
+    Los resultados se ordenan por relevancia, luego por calificación.
+    """
+    
+    try:
+        try:
+            pagina, siguiente = buscar_trabajadores_texto(db, q, limite, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        ids = [fila["id_trabajador"] for fila in pagina]
+        relevancias = {fila["id_trabajador"]: float(fila["relevancia"]) for fila in pagina}
+        
+        filas = (
+            db.query(Trabajador, Barrio, Ciudad)
+            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+            .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
+            .filter(Trabajador.id_trabajador.in_(ids))
+            .all()
+        ) if ids else []
+        por_id = {trabajador.id_trabajador: (trabajador, barrio, ciudad) for trabajador, barrio, ciudad in filas}
+        oficios = _oficios_por_trabajador(db, ids)
+        
+        trabajadores_list = []
+        for id_trabajador in ids:
+            if id_trabajador not in por_id:
+                continue
+            trabajador, barrio, ciudad = por_id[id_trabajador]
+            trabajadores_list.append(TrabajadorBusquedaItem(
                 id_trabajador=trabajador.id_trabajador,
                 nombre_completo=trabajador.nombre_completo,
                 telefono=trabajador.telefono,
@@ -538,50 +833,109 @@ async def listar_trabajadores(
                 cobertura_km=trabajador.cobertura_km,
                 tiene_arl=trabajador.tiene_arl,
                 tipo_persona=trabajador.tipo_persona,
-                barrio=barrio_info,
-                oficios=oficios_list
-            )
-            
-            trabajadores_list.append(trabajador_item)
-        
-        # Retornar respuesta
-        return TrabajadorListResponse(
+                barrio=BarrioInfo(
+                    id_barrio=barrio.id_barrio,
+                    nombre_barrio=barrio.nombre_barrio,
+                    estrato=barrio.estrato,
+                    ciudad=ciudad.nombre_ciudad,
+                    departamento=ciudad.departamento,
+                    region=ciudad.region
+                ),
+                oficios=oficios[id_trabajador],
+                relevancia=relevancias[id_trabajador]
+            ))
+        
+        return BusquedaTrabajadoresResponse(
+            consulta=q,
             total=len(trabajadores_list),
             trabajadores=trabajadores_list,
-            filtros_aplicados=filtros_aplicados
+            siguiente=siguiente
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error al listar trabajadores: {str(e)}"
+            detail=f"Error al buscar trabajadores: {str(e)}"
         )
 
+def _solo_columnas(query, modelo, campos: dict = None):
+    """Limita las columnas que se cargan de `modelo` a los campos pedidos con ?fields=."""
+    if campos is None:
+        return query
+    return query.options(load_only(*[getattr(modelo, campo) for campo in campos if hasattr(modelo, campo)]))
+
+
+def _opcion_parcial(entidad, total: int, campos: dict) -> dict:
+    """Opción de catálogo solo con los campos pedidos (total_trabajadores viene del conteo)."""
+    return {
+        campo: total if campo == "total_trabajadores" else getattr(entidad, campo)
+        for campo in campos
+    }
+
+
+def _ciudades_con_conteo(db: Session, oficio_id: int = None, campos: dict = None):
+    """Ciudades con trabajadores (opcionalmente de un oficio) leídas de conteos_catalogo."""
+    query = (
+        db.query(Ciudad, ConteoCatalogo.total_trabajadores)
+        .join(ConteoCatalogo, and_(
+            ConteoCatalogo.id_ciudad == Ciudad.id_ciudad,
+            ConteoCatalogo.id_oficio == (oficio_id or 0)
+        ))
+        .filter(ConteoCatalogo.total_trabajadores > 0)
+        .order_by(Ciudad.nombre_ciudad)
+    )
+    return _solo_columnas(query, Ciudad, campos).all()
+
+
+def _oficios_con_conteo(db: Session, ciudad_id: int = None, campos: dict = None):
+    """Oficios con trabajadores (opcionalmente en una ciudad) leídos de conteos_catalogo."""
+    query = (
+        db.query(Oficio, ConteoCatalogo.total_trabajadores)
+        .join(ConteoCatalogo, and_(
+            ConteoCatalogo.id_oficio == Oficio.id_oficio,
+            ConteoCatalogo.id_ciudad == (ciudad_id or 0)
+        ))
+        .filter(ConteoCatalogo.total_trabajadores > 0)
+        .order_by(Oficio.nombre_oficio)
+    )
+    return _solo_columnas(query, Oficio, campos).all()
+
+
 @app.get("/ciudades", response_model=CiudadesResponse)
 async def listar_ciudades(
     con_trabajadores: bool = True,
-    db: Session = Depends(get_db)
+    fields: str = None,
+    db: Session = Depends(get_db_lectura)
 ):
     """
     🏙️ Endpoint para listar ciudades disponibles.
     
     Parámetros:
     - con_trabajadores: Si es True, solo devuelve ciudades con trabajadores registrados
+    - fields: Campos a devolver, separados por comas (ej: "nombre_ciudad"); id_ciudad siempre se incluye
     
     Útil para poblar el select de ciudades en el frontend.
     """
     
+    campos = _campos_solicitados(fields, ESQUEMA_CIUDAD, ("id_ciudad",))
+    
     try:
+        if campos is not None:
+            if con_trabajadores:
+                filas = _ciudades_con_conteo(db, campos=campos)
+            else:
+                ciudades = _solo_columnas(db.query(Ciudad), Ciudad, campos).order_by(Ciudad.nombre_ciudad).all()
+                filas = [(ciudad, 0) for ciudad in ciudades]
+            return JSONResponse(content={
+                "total": len(filas),
+                "ciudades": [_opcion_parcial(ciudad, total, campos) for ciudad, total in filas]
+            })
+        
         if con_trabajadores:
-            # Ciudades con trabajadores y su conteo
-            ciudades_con_trabajadores = (
-                db.query(Ciudad, func.count(Trabajador.id_trabajador).label('total'))
-                .join(Barrio, Ciudad.id_ciudad == Barrio.id_ciudad)
-                .join(Trabajador, Barrio.id_barrio == Trabajador.id_barrio)
-                .group_by(Ciudad.id_ciudad)
-                .order_by(Ciudad.nombre_ciudad)
-                .all()
-            )
+            # Ciudades con trabajadores y su conteo (tabla agregada)
+            ciudades_con_trabajadores = _ciudades_con_conteo(db)
             
             ciudades_list = [
                 CiudadOption(
@@ -623,7 +977,8 @@ async def listar_ciudades(
 async def listar_oficios(
     ciudad_id: int = None,
     con_trabajadores: bool = True,
-    db: Session = Depends(get_db)
+    fields: str = None,
+    db: Session = Depends(get_db_lectura)
 ):
     """
     🔧 Endpoint para listar oficios disponibles.
@@ -631,31 +986,28 @@ async def listar_oficios(
     Parámetros:
     - ciudad_id: Filtra oficios que tienen trabajadores en esta ciudad
     - con_trabajadores: Si es True, solo devuelve oficios con trabajadores registrados
+    - fields: Campos a devolver, separados por comas (ej: "nombre_oficio"); id_oficio siempre se incluye
     
     Útil para poblar el select de oficios de forma coordinada con la ciudad seleccionada.
     """
     
+    campos = _campos_solicitados(fields, ESQUEMA_OFICIO, ("id_oficio",))
+    
     try:
+        if campos is not None:
+            if con_trabajadores:
+                filas = _oficios_con_conteo(db, ciudad_id, campos)
+            else:
+                oficios = _solo_columnas(db.query(Oficio), Oficio, campos).order_by(Oficio.nombre_oficio).all()
+                filas = [(oficio, 0) for oficio in oficios]
+            return JSONResponse(content={
+                "total": len(filas),
+                "oficios": [_opcion_parcial(oficio, total, campos) for oficio, total in filas]
+            })
+        
         if con_trabajadores:
-            # Query base: oficios con trabajadores
-            query = (
-                db.query(
-                    Oficio,
-                    func.count(func.distinct(Trabajador.id_trabajador)).label('total')
-                )
-                .join(TrabajadorOficio, Oficio.id_oficio == TrabajadorOficio.id_oficio)
-                .join(Trabajador, TrabajadorOficio.id_trabajador == Trabajador.id_trabajador)
-            )
-            
-            # Si se especifica ciudad, filtrar por trabajadores en esa ciudad
-            if ciudad_id is not None:
-                query = query.join(Barrio, Trabajador.id_barrio == Barrio.id_barrio).filter(
-                    Barrio.id_ciudad == ciudad_id
-                )
-            
-            query = query.group_by(Oficio.id_oficio).order_by(Oficio.nombre_oficio)
-            
-            resultados = query.all()
+            # Oficios con trabajadores (en la ciudad indicada, si la hay) desde la tabla agregada
+            resultados = _oficios_con_conteo(db, ciudad_id)
             
             oficios_list = [
                 OficioOption(
@@ -693,11 +1045,116 @@ async def listar_oficios(
         )
 
 
+def _sentencia_facetas(ciudad_id: int = None, oficio_id: int = None):
+    """Construye la consulta única que devuelve todas las facetas de filtros disponibles."""
+    base = select(
+        Trabajador.calificacion_promedio,
+        Trabajador.disponibilidad,
+        Trabajador.tiene_arl
+    )
+    if ciudad_id is not None:
+        base = (
+            base.join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+            .where(Barrio.id_ciudad == ciudad_id)
+        )
+    if oficio_id is not None:
+        base = (
+            base.join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
+            .where(TrabajadorOficio.id_oficio == oficio_id)
+        )
+    base = base.cte("base")
+    
+    resumen = select(
+        func.max(base.c.calificacion_promedio).label("calificacion_max"),
+        func.min(base.c.calificacion_promedio).label("calificacion_min"),
+        func.array_agg(distinct(base.c.disponibilidad)).label("disponibilidades"),
+        func.count().filter(base.c.tiene_arl.is_(True)).label("con_arl"),
+        func.count().filter(base.c.tiene_arl.is_(False)).label("sin_arl")
+    ).cte("resumen")
+    
+    ciudades = (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "id_ciudad", Ciudad.id_ciudad,
+                    "nombre_ciudad", Ciudad.nombre_ciudad,
+                    "departamento", Ciudad.departamento,
+                    "region", Ciudad.region,
+                    "total_trabajadores", ConteoCatalogo.total_trabajadores
+                ),
+                Ciudad.nombre_ciudad
+            )),
+            literal_column("'[]'::json")
+        ))
+        .join(ConteoCatalogo, and_(
+            ConteoCatalogo.id_ciudad == Ciudad.id_ciudad,
+            ConteoCatalogo.id_oficio == (oficio_id or 0)
+        ))
+        .where(ConteoCatalogo.total_trabajadores > 0)
+        .scalar_subquery()
+    )
+    
+    oficios = (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "id_oficio", Oficio.id_oficio,
+                    "nombre_oficio", Oficio.nombre_oficio,
+                    "categoria_servicio", Oficio.categoria_servicio,
+                    "descripcion", Oficio.descripcion,
+                    "total_trabajadores", ConteoCatalogo.total_trabajadores
+                ),
+                Oficio.nombre_oficio
+            )),
+            literal_column("'[]'::json")
+        ))
+        .join(ConteoCatalogo, and_(
+            ConteoCatalogo.id_oficio == Oficio.id_oficio,
+            ConteoCatalogo.id_ciudad == (ciudad_id or 0)
+        ))
+        .where(ConteoCatalogo.total_trabajadores > 0)
+        .scalar_subquery()
+    )
+    
+    return select(
+        resumen.c.calificacion_max,
+        resumen.c.calificacion_min,
+        resumen.c.disponibilidades,
+        resumen.c.con_arl,
+        resumen.c.sin_arl,
+        ciudades.label("ciudades"),
+        oficios.label("oficios")
+    )
+
+
+@app.get("/precios-mercado")
+def obtener_precio_mercado(id_oficio: int, id_ciudad: int = None, estrato: int = None, id_barrio: int = None):
+    """
+    💲 Rango de precios de mercado (p10/p50/p90) de un oficio
+    
+    Sale de los servicios completados del oficio en la ciudad y estrato (o del barrio),
+    subiendo a ciudad, tarifas_mercado y todo el oficio si no hay muestras suficientes.
+    Incluye los umbrales a partir de los cuales un precio se considera anómalo.
+    """
+    if not precios_mercado.lista:
+        raise HTTPException(status_code=503, detail="Los precios de mercado aún no se han calculado")
+    if id_barrio is not None:
+        rango = precios_mercado.rango_barrio(id_oficio, id_barrio)
+    else:
+        rango = precios_mercado.rango(id_oficio, id_ciudad, estrato)
+    if rango is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No hay datos de precios para el oficio ID {id_oficio}"
+        )
+    return rango
+
+
 @app.get("/trabajadores/filtros/disponibles", response_model=FiltrosDisponibles)
 async def obtener_filtros_disponibles(
     ciudad_id: int = None,
     oficio_id: int = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
     """
     🎛️ Endpoint para obtener opciones disponibles según filtros ya aplicados.
@@ -712,119 +1169,24 @@ async def obtener_filtros_disponibles(
     """
     
     try:
-        # Query base para trabajadores
-        trabajadores_query = db.query(Trabajador)
+        # Una sola sentencia calcula todas las facetas: el conjunto filtrado de
+        # trabajadores se recorre una vez con agregados FILTER, y las listas de
+        # ciudades/oficios salen de conteos_catalogo como json_agg.
+        fila = db.execute(_sentencia_facetas(ciudad_id, oficio_id)).one()
         
-        # Aplicar filtros previos
-        if ciudad_id is not None:
-            trabajadores_query = (
-                trabajadores_query
-                .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-                .filter(Barrio.id_ciudad == ciudad_id)
-            )
+        ciudades_list = [CiudadOption(**ciudad) for ciudad in fila.ciudades]
+        oficios_list = [OficioOption(**oficio) for oficio in fila.oficios]
         
-        if oficio_id is not None:
-            trabajadores_query = (
-                trabajadores_query
-                .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
-                .filter(TrabajadorOficio.id_oficio == oficio_id)
-            )
-        
-        # Obtener ciudades disponibles según filtros
-        if oficio_id is not None:
-            ciudades_disponibles = (
-                db.query(Ciudad, func.count(Trabajador.id_trabajador).label('total'))
-                .join(Barrio, Ciudad.id_ciudad == Barrio.id_ciudad)
-                .join(Trabajador, Barrio.id_barrio == Trabajador.id_barrio)
-                .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
-                .filter(TrabajadorOficio.id_oficio == oficio_id)
-                .group_by(Ciudad.id_ciudad)
-                .order_by(Ciudad.nombre_ciudad)
-                .all()
-            )
-        else:
-            ciudades_disponibles = (
-                db.query(Ciudad, func.count(Trabajador.id_trabajador).label('total'))
-                .join(Barrio, Ciudad.id_ciudad == Barrio.id_ciudad)
-                .join(Trabajador, Barrio.id_barrio == Trabajador.id_barrio)
-                .group_by(Ciudad.id_ciudad)
-                .order_by(Ciudad.nombre_ciudad)
-                .all()
-            )
-        
-        ciudades_list = [
-            CiudadOption(
-                id_ciudad=ciudad.id_ciudad,
-                nombre_ciudad=ciudad.nombre_ciudad,
-                departamento=ciudad.departamento,
-                region=ciudad.region,
-                total_trabajadores=total
-            )
-            for ciudad, total in ciudades_disponibles
-        ]
-        
-        # Obtener oficios disponibles según filtros
-        if ciudad_id is not None:
-            oficios_disponibles = (
-                db.query(Oficio, func.count(func.distinct(Trabajador.id_trabajador)).label('total'))
-                .join(TrabajadorOficio, Oficio.id_oficio == TrabajadorOficio.id_oficio)
-                .join(Trabajador, TrabajadorOficio.id_trabajador == Trabajador.id_trabajador)
-                .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-                .filter(Barrio.id_ciudad == ciudad_id)
-                .group_by(Oficio.id_oficio)
-                .order_by(Oficio.nombre_oficio)
-                .all()
-            )
-        else:
-            oficios_disponibles = (
-                db.query(Oficio, func.count(func.distinct(Trabajador.id_trabajador)).label('total'))
-                .join(TrabajadorOficio, Oficio.id_oficio == TrabajadorOficio.id_oficio)
-                .join(Trabajador, TrabajadorOficio.id_trabajador == Trabajador.id_trabajador)
-                .group_by(Oficio.id_oficio)
-                .order_by(Oficio.nombre_oficio)
-                .all()
-            )
-        
-        oficios_list = [
-            OficioOption(
-                id_oficio=oficio.id_oficio,
-                nombre_oficio=oficio.nombre_oficio,
-                categoria_servicio=oficio.categoria_servicio,
-                descripcion=oficio.descripcion,
-                total_trabajadores=total
-            )
-            for oficio, total in oficios_disponibles
-        ]
-        
-        # Obtener rango de calificaciones disponibles
-        stats = trabajadores_query.with_entities(
-            func.max(Trabajador.calificacion_promedio),
-            func.min(Trabajador.calificacion_promedio)
-        ).first()
-        
-        calificacion_max = float(stats[0]) if stats[0] else 5.0
-        calificacion_min = float(stats[1]) if stats[1] else 1.0
-        
-        # Obtener disponibilidades únicas
-        disponibilidades = (
-            trabajadores_query
-            .with_entities(Trabajador.disponibilidad)
-            .distinct()
-            .all()
-        )
-        disponibilidades_list = [d[0] for d in disponibilidades]
-        
-        # Contar trabajadores con/sin ARL
-        con_arl = trabajadores_query.filter(Trabajador.tiene_arl == True).count()
-        sin_arl = trabajadores_query.filter(Trabajador.tiene_arl == False).count()
+        calificacion_max = float(fila.calificacion_max) if fila.calificacion_max else 5.0
+        calificacion_min = float(fila.calificacion_min) if fila.calificacion_min else 1.0
         
         return FiltrosDisponibles(
             ciudades_disponibles=ciudades_list,
             oficios_disponibles=oficios_list,
             calificacion_min_sugerida=calificacion_min,
             calificacion_max_disponible=calificacion_max,
-            disponibilidades=disponibilidades_list,
-            tiene_arl_count={"con_arl": con_arl, "sin_arl": sin_arl}
+            disponibilidades=list(fila.disponibilidades or []),
+            tiene_arl_count={"con_arl": fila.con_arl, "sin_arl": fila.sin_arl}
         )
         
     except Exception as e:
@@ -834,10 +1196,47 @@ async def obtener_filtros_disponibles(
         )
 
 
+def _estadisticas_trabajador(db: Session, trabajador: Trabajador) -> EstadisticasTrabajador:
+    """Lee la fila de estadisticas_trabajador; si no existe, agrega en SQL sobre servicios."""
+    fila = db.get(EstadisticaTrabajador, trabajador.id_trabajador)
+    
+    if fila is None:
+        calificaciones = (
+            select(func.count())
+            .select_from(Calificacion)
+            .join(Servicio, Calificacion.id_servicio == Servicio.id_servicio)
+            .where(
+                Servicio.id_trabajador == trabajador.id_trabajador,
+                Calificacion.quien_califica == 'solicitante'
+            )
+            .scalar_subquery()
+        )
+        fila = db.execute(
+            select(
+                func.count().label("total_servicios"),
+                func.count().filter(Servicio.estado == 'completado').label("servicios_completados"),
+                func.count().filter(Servicio.estado.in_(['asignado', 'en_proceso'])).label("servicios_en_proceso"),
+                func.coalesce(
+                    func.sum(Servicio.costo_final_cop).filter(Servicio.estado == 'completado'), 0
+                ).label("total_ingresos"),
+                calificaciones.label("total_calificaciones")
+            ).where(Servicio.id_trabajador == trabajador.id_trabajador)
+        ).one()
+    
+    return EstadisticasTrabajador(
+        total_servicios=fila.total_servicios,
+        servicios_completados=fila.servicios_completados,
+        servicios_en_proceso=fila.servicios_en_proceso,
+        total_calificaciones=fila.total_calificaciones,
+        promedio_calificacion=float(trabajador.calificacion_promedio),
+        total_ingresos=int(fila.total_ingresos)
+    )
+
+
 @app.get("/trabajadores/{id_trabajador}/perfil", response_model=PerfilTrabajador)
 async def obtener_perfil_trabajador(
     id_trabajador: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
     """
     👤 Endpoint para obtener el perfil completo de un trabajador.
@@ -943,20 +1342,8 @@ async def obtener_perfil_trabajador(
             for calificacion, servicio, solicitud, oficio in calificaciones_query
         ]
         
-        # 5. Calcular estadísticas
-        total_servicios = len(servicios_list)
-        servicios_completados = sum(1 for s in servicios_list if s.estado == 'completado')
-        servicios_en_proceso = sum(1 for s in servicios_list if s.estado in ['asignado', 'en_proceso'])
-        total_ingresos = sum(s.costo_final_cop for s in servicios_list if s.estado == 'completado')
-        
-        estadisticas = EstadisticasTrabajador(
-            total_servicios=total_servicios,
-            servicios_completados=servicios_completados,
-            servicios_en_proceso=servicios_en_proceso,
-            total_calificaciones=len(calificaciones_list),
-            promedio_calificacion=float(trabajador.calificacion_promedio),
-            total_ingresos=total_ingresos
-        )
+        # 5. Estadísticas: una fila mantenida por triggers (o agregado SQL si aún no existe)
+        estadisticas = _estadisticas_trabajador(db, trabajador)
         
         # 6. Construir objeto de barrio
         barrio_info = BarrioInfo(
@@ -1090,22 +1477,14 @@ async def procesar_y_guardar_solicitud_real(
     try:
         # ========== PASO 1: OBTENER OFICIOS Y DETECTAR OFICIO NECESARIO ==========
         print("🔍 [GUARDAR] Consultando oficios...")
-        oficios = db.query(Oficio).all()
-        if not oficios:
+        oficios_disponibles, oficio_ids_validos = catalogo_oficios(db)
+        if not oficio_ids_validos:
             raise HTTPException(
                 status_code=500,
                 detail="No hay oficios disponibles en la base de datos."
             )
         
-        print(f"✅ [GUARDAR] Oficios encontrados: {len(oficios)}")
-        
-        oficios_str_list = []
-        for oficio in oficios:
-            oficios_str_list.append(
-                f"ID: {oficio.id_oficio}, Nombre: {oficio.nombre_oficio}, "
-                f"Categoría: {oficio.categoria_servicio}, Descripción: {oficio.descripcion}"
-            )
-        oficios_disponibles = "\n".join(oficios_str_list)
+        print(f"✅ [GUARDAR] Oficios encontrados: {len(oficio_ids_validos)}")
         
         # Análisis ligero para detectar oficio
         print("🔍 [GUARDAR] Detectando oficio del texto...")
@@ -1123,12 +1502,15 @@ async def procesar_y_guardar_solicitud_real(
         print(f"🔍 [GUARDAR] Detectando ciudad...")
         id_barrio_usuario = solicitud_input.id_barrio_usuario
         id_ciudad_usuario = None
+        ubicacion_cliente = None
         
-        # Si se proporciona barrio, obtener su ciudad
+        # Si se proporciona barrio, obtener su ciudad (y su ubicación, si está georreferenciado)
         if id_barrio_usuario and id_barrio_usuario > 0:
             barrio = db.query(Barrio).filter(Barrio.id_barrio == id_barrio_usuario).first()
             if barrio:
                 id_ciudad_usuario = barrio.id_ciudad
+                if barrio.latitud is not None and barrio.longitud is not None:
+                    ubicacion_cliente = (float(barrio.latitud), float(barrio.longitud))
         
         # Si no tenemos ciudad, intentar detectar del texto
         if not id_ciudad_usuario:
@@ -1171,51 +1553,23 @@ async def procesar_y_guardar_solicitud_real(
         print(f"   - Ciudad ID: {id_ciudad_usuario}")
         print(f"   - Oficio ID: {id_oficio_detectado} ({nombre_oficio})")
         
-        trabajadores_filtrados = (
-            db.query(Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad)
-            .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
-            .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
-            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
-            .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
-            .filter(
-                Oficio.id_oficio == id_oficio_detectado,  # ✅ Solo el oficio necesario
-                Ciudad.id_ciudad == id_ciudad_usuario,     # ✅ Solo la ciudad del usuario
-                Trabajador.disponibilidad.in_(["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA"])
-            )
-            .order_by(
-                Trabajador.calificacion_promedio.desc(),
-                Trabajador.anos_experiencia.desc()
-            )
-            .limit(15)  # Máximo 15 trabajadores más relevantes
-            .all()
-        )
+        # Con la ubicación del barrio se filtra por cobertura real en vez de por ciudad;
+        # si salen muy pocos se amplía a la ciudad y a las ciudades vecinas
+        trabajadores_filtrados = capacidad.filtrar(buscar_candidatos_cacheados(
+            db, id_oficio_detectado, id_ciudad_usuario, ubicacion=ubicacion_cliente, id_barrio=id_barrio_usuario
+        ))
         
         print(f"✅ [GUARDAR] Trabajadores encontrados: {len(trabajadores_filtrados)}")
         
         if not trabajadores_filtrados:
             raise HTTPException(
                 status_code=404,
-                detail=f"No se encontraron trabajadores de '{nombre_oficio}' disponibles en tu ciudad."
+                detail=f"No se encontraron trabajadores de '{nombre_oficio}' disponibles "
+                       "en tu zona ni en las ciudades cercanas."
             )
         
         # Formatear solo los trabajadores filtrados (no los 220)
-        trabajadores_str_list = []
-        for trabajador, trab_oficio, oficio, barrio, ciudad in trabajadores_filtrados:
-            trabajadores_str_list.append(
-                f"ID: {trabajador.id_trabajador}, "
-                f"Nombre: {trabajador.nombre_completo}, "
-                f"Oficio: {oficio.nombre_oficio} (ID: {oficio.id_oficio}), "
-                f"Experiencia: {trabajador.anos_experiencia} años, "
-                f"Calificación: {trabajador.calificacion_promedio}/5, "
-                f"Ubicación: {barrio.nombre_barrio}, {ciudad.nombre_ciudad}, "
-                f"Cobertura: {trabajador.cobertura_km} km, "
-                f"Tarifa hora: ${trab_oficio.tarifa_hora_promedio}, "
-                f"Tarifa visita: ${trab_oficio.tarifa_visita}, "
-                f"Disponibilidad: {trabajador.disponibilidad}, "
-                f"ARL: {'Sí' if trabajador.tiene_arl else 'No'}"
-            )
-        
-        trabajadores_disponibles = "\n".join(trabajadores_str_list)
+        trabajadores_disponibles = formatear_candidatos(trabajadores_filtrados)
         
         # ========== PASO 4: EJECUTAR PIPELINE A2A CON TRABAJADORES ULTRA-FILTRADOS ==========
         print("🚀 [GUARDAR] Ejecutando pipeline A2A...")
@@ -1226,14 +1580,19 @@ async def procesar_y_guardar_solicitud_real(
             texto_usuario=solicitud_input.texto_usuario,
             oficios_disponibles=oficios_disponibles,
             trabajadores_disponibles=trabajadores_disponibles,  # Solo 5-15 en vez de 220
-            id_barrio_usuario=solicitud_input.id_barrio_usuario
+            id_barrio_usuario=solicitud_input.id_barrio_usuario,
+            candidatos=trabajadores_filtrados,
+            rango_precios=precios_mercado.rango_barrio(id_oficio_detectado, id_barrio_usuario),
+            clave_cache=_clave_recomendacion(id_oficio_detectado, id_ciudad_usuario, id_barrio_usuario)
         )
         
         print("✅ [GUARDAR] Pipeline A2A completado")
+        _aplicar_distancias(resultado_pipeline.recomendaciones, trabajadores_filtrados)
         
         # Verificar si el pipeline recomienda crear la solicitud
         if resultado_pipeline.decision_final != "solicitud_creada":
             # Si no se debe crear, retornar resultado del pipeline tal cual
+            await _registrar_auditoria(resultado_pipeline)
             return resultado_pipeline
         
         # Verificar alertas críticas
@@ -1243,6 +1602,7 @@ async def procesar_y_guardar_solicitud_real(
         ]
         
         if alertas_criticas:
+            await _registrar_auditoria(resultado_pipeline)
             raise HTTPException(
                 status_code=400,
                 detail=f"Solicitud bloqueada por alerta crítica: {alertas_criticas[0].detalle}"
@@ -1269,6 +1629,7 @@ async def procesar_y_guardar_solicitud_real(
         db.add(nueva_solicitud_real)
         db.commit()
         db.refresh(nueva_solicitud_real)
+        await _registrar_auditoria(resultado_pipeline, nueva_solicitud_real.id_solicitud)
         
         # Actualizar el resultado con la solicitud real
         solicitud_real = SolicitudOutput(
@@ -1284,6 +1645,15 @@ async def procesar_y_guardar_solicitud_real(
             flag_alerta=nueva_solicitud_real.flag_alerta
         )
         
+        # El primer recomendado con cupo queda reservado mientras la solicitud se convierte en servicio
+        if resultado_pipeline.recomendaciones:
+            id_reservado = capacidad.reservar_primero(
+                (r.id_trabajador for r in resultado_pipeline.recomendaciones.trabajadores_recomendados),
+                id_solicitud=nueva_solicitud_real.id_solicitud
+            )
+            if id_reservado is not None:
+                print(f"📌 [GUARDAR] Cupo reservado: trabajador {id_reservado}")
+        
         # Actualizar resultado
         resultado_pipeline.solicitud_creada = solicitud_real
         resultado_pipeline.decision_final = "solicitud_creada"
@@ -1316,6 +1686,13 @@ def crear_tablas_bd():
     try:
         # Crear todas las tablas definidas en los modelos
         Base.metadata.create_all(bind=engine)
+
+        # Bases creadas antes del particionamiento: convertir alertas y clasificacion_logs
+        migradas = []
+        with engine.begin() as conexion:
+            for tabla in (Alerta.__table__, ClasificacionLog.__table__):
+                if migrar_a_particionada(conexion, tabla):
+                    migradas.append(tabla.name)
         
         return {
             "mensaje": "✅ Tablas creadas/actualizadas exitosamente",
@@ -1323,8 +1700,10 @@ def crear_tablas_bd():
                 "ciudades", "barrios", "oficios", "solicitantes", 
                 "trabajadores", "trabajador_oficio", "tarifas_mercado",
                 "solicitudes", "recomendaciones", "servicios", 
-                "calificaciones", "alertas", "clasificacion_logs"
-            ]
+                "calificaciones", "alertas", "clasificacion_logs",
+                "conteos_catalogo", "estadisticas_trabajador", "busqueda_trabajadores"
+            ],
+            "migradas_a_particionadas": migradas
         }
         
     except Exception as e:
@@ -1334,6 +1713,72 @@ def crear_tablas_bd():
         )
 
 
+@app.get("/admin/metricas")
+def obtener_metricas():
+    """
+    📈 Endpoint de administración: Métricas internas
+    
+    - escritor_diferido: filas encoladas, escritas, descartadas por contrapresión,
+      rechazadas por la base (fila a fila), fallidas, pendientes en cola y duración
+      de los lotes.
+    - caches: aciertos, fallos e invalidaciones de las cachés en memoria y estado de
+      la escucha de cambios (LISTEN/NOTIFY).
+    - precios_mercado: rangos calculados por nivel y duración del último cálculo.
+    - capacidad: reservas tomadas, rechazadas, liberadas y vencidas, y la última
+      reconciliación con la base.
+    - version_pesos: versión de los pesos de puntuación en uso (0 = manuales).
+    """
+    return {
+        "escritor_diferido": escritor.metricas(),
+        "caches": metricas_caches(),
+        "precios_mercado": precios_mercado.metricas(),
+        "capacidad": capacidad.metricas(),
+        "version_pesos": version_pesos(),
+    }
+
+
+@app.post("/admin/particiones/mantener")
+def mantener_particiones_bd(eliminar: bool = False):
+    """
+    🗂️ Endpoint de administración: Ejecuta ya el mantenimiento de particiones
+    
+    Crea las particiones mensuales de los próximos meses y separa (DETACH) las que
+    superan la retención configurada. Con eliminar=true además las borra.
+    """
+    try:
+        return {"particiones": _mantener_particiones(eliminar=eliminar)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error manteniendo particiones: {str(e)}"
+        )
+
+
+@app.post("/admin/asignacion/ejecutar")
+def ejecutar_asignacion(ventana_horas: float = None, capacidad: int = None, simular: bool = False):
+    """
+    🧮 Endpoint de administración: Asignación óptima por lotes de solicitudes pendientes
+    
+    Agrupa las solicitudes pendientes de la ventana por (oficio, ciudad), resuelve una
+    asignación con capacidad por trabajador que maximiza el score total y guarda las
+    recomendaciones asignadas (es_asignado), reservando el cupo de cada trabajador.
+    capacidad cambia los servicios simultáneos permitidos (CAPACIDAD_MAX_CONCURRENCIA).
+    Con simular=true solo devuelve el resumen.
+    """
+    opciones = {"simular": simular}
+    if ventana_horas is not None:
+        opciones["ventana_horas"] = ventana_horas
+    if capacidad is not None:
+        opciones["capacidad_trabajador"] = capacidad
+    try:
+        return {"asignacion": _asignar_pendientes(**opciones)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error en la asignación por lotes: {str(e)}"
+        )
+
+
 @app.post("/admin/cargar-datos-minimos")
 def cargar_datos_minimos(db: Session = Depends(get_db)):
     """
@@ -1373,8 +1818,8 @@ def cargar_datos_minimos(db: Session = Depends(get_db)):
         
         # BARRIOS
         barrios = [
-            Barrio(id_barrio=1, id_ciudad=1, nombre_barrio='Chapinero', estrato=4),
-            Barrio(id_barrio=2, id_ciudad=1, nombre_barrio='Usaquén', estrato=5)
+            Barrio(id_barrio=1, id_ciudad=1, nombre_barrio='Chapinero', estrato=4, latitud=4.6486, longitud=-74.0628),
+            Barrio(id_barrio=2, id_ciudad=1, nombre_barrio='Usaquén', estrato=5, latitud=4.6947, longitud=-74.0308)
         ]
         db.add_all(barrios)
         
@@ -1512,6 +1957,10 @@ def cargar_datos_minimos(db: Session = Depends(get_db)):
             )
         ]
         db.add_all(tarifas)
+        db.flush()
+        
+        # Los IDs se insertaron explícitos: dejar las secuencias después del máximo
+        reiniciar_secuencias(db)
         
         # Confirmar todos los cambios
         db.commit()
@@ -0,0 +1,196 @@
+"""
+matriz_distancias.py - Matriz de distancias barrio × barrio en un archivo mapeado en memoria
+
+Los barrios son un conjunto pequeño y casi fijo, así que la distancia entre centroides se
+calcula una sola vez para todos los pares y se guarda como matriz densa float32 en disco.
+Cada proceso de la API la abre con np.memmap en solo lectura: el sistema operativo
+comparte las mismas páginas entre todos los procesos y una distancia es un acceso por
+índice, O(1).
+
+El nombre del archivo lleva una versión calculada a partir de los ids y las coordenadas de
+los barrios. Al cambiar un barrio (aviso de la escucha de cambios) cada proceso calcula la
+versión nueva y, si otro proceso ya escribió ese archivo, solo lo abre; si no, lo construye.
+
+Uso (construirla por adelantado, p. ej. después de una carga masiva):
+    python matriz_distancias.py [--directorio /ruta]
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import select
+
+from database import Barrio
+from geo import matriz_distancias_km
+
+
+DIRECTORIO = Path(os.getenv("MATRIZ_DISTANCIAS_DIR", Path(tempfile.gettempdir()) / "gaply"))
+
+# Filas de la matriz calculadas por bloque al construirla (acota la memoria temporal)
+FILAS_POR_BLOQUE = 1024
+
+
+def _barrios(conexion) -> tuple:
+    """(ids, latitudes, longitudes) de todos los barrios, por id; NaN sin coordenadas."""
+    filas = conexion.execute(
+        select(Barrio.id_barrio, Barrio.latitud, Barrio.longitud).order_by(Barrio.id_barrio)
+    ).all()
+    ids = np.array([fila.id_barrio for fila in filas], dtype=np.int64)
+    latitudes = np.array([np.nan if fila.latitud is None else float(fila.latitud) for fila in filas])
+    longitudes = np.array([np.nan if fila.longitud is None else float(fila.longitud) for fila in filas])
+    return ids, latitudes, longitudes
+
+
+def _version(ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> str:
+    resumen = hashlib.sha1()
+    for arreglo in (ids, latitudes, longitudes):
+        resumen.update(arreglo.tobytes())
+    return resumen.hexdigest()[:16]
+
+
+def _ruta(directorio: Path, version: str) -> Path:
+    return directorio / f"distancias_{version}.f32"
+
+
+def _modificado(ruta: Path) -> float:
+    """mtime del archivo; -inf si otro proceso acaba de borrarlo."""
+    try:
+        return ruta.stat().st_mtime
+    except FileNotFoundError:
+        return float("-inf")
+
+
+def construir(conexion, directorio: Path = DIRECTORIO) -> str:
+    """Calcula la matriz de los barrios actuales y la escribe en `directorio`. Devuelve la versión."""
+    ids, latitudes, longitudes = _barrios(conexion)
+    version = _version(ids, latitudes, longitudes)
+    ruta = _ruta(directorio, version)
+    if ruta.exists():
+        return version
+
+    directorio.mkdir(parents=True, exist_ok=True)
+    n = len(ids)
+    # Se escribe en un temporal y se renombra: ningún proceso abre una matriz a medias
+    temporal = directorio / f".distancias_{version}.{os.getpid()}.tmp"
+    if n:
+        matriz = np.memmap(temporal, dtype=np.float32, mode="w+", shape=(n, n))
+        for inicio in range(0, n, FILAS_POR_BLOQUE):
+            fin = min(inicio + FILAS_POR_BLOQUE, n)
+            matriz[inicio:fin] = matriz_distancias_km(
+                latitudes[inicio:fin], longitudes[inicio:fin], latitudes, longitudes
+            )
+        matriz.flush()
+        del matriz
+    else:
+        temporal.touch()
+    os.replace(temporal, ruta)
+
+    # La versión reemplazada se conserva: otro proceso que todavía leyó los barrios anteriores
+    # puede estar a punto de abrirla. Las más antiguas ya no se abrirán (los procesos que las
+    # tengan abiertas siguen leyendo).
+    anteriores = sorted(
+        (p for p in directorio.glob("distancias_*.f32") if p != ruta),
+        key=lambda p: (_modificado(p), p.name)
+    )
+    for anterior in anteriores[:-1]:
+        anterior.unlink(missing_ok=True)
+    return version
+
+
+class MatrizDistancias:
+    """Matriz de distancias entre barrios abierta en solo lectura para el proceso."""
+
+    def __init__(self, directorio: Path = DIRECTORIO):
+        self.directorio = Path(directorio)
+        self._lock = threading.Lock()
+        # (matriz, posiciones, versión) se reemplaza entero: quien lee ve el viejo o el nuevo
+        self._estado = (None, np.full(0, -1, dtype=np.int64), None)
+        self._ultima_actualizacion = {"barrios": 0, "ms": 0.0, "construida": False}
+
+    @property
+    def lista(self) -> bool:
+        return self._estado[0] is not None
+
+    def actualizar(self, engine):
+        """Abre la matriz de los barrios actuales, construyéndola si nadie lo hizo aún."""
+        inicio = time.perf_counter()
+        with self._lock:
+            with engine.connect() as conexion:
+                ids, latitudes, longitudes = _barrios(conexion)
+                version = _version(ids, latitudes, longitudes)
+                if version == self._estado[2]:
+                    return
+                ruta = _ruta(self.directorio, version)
+                construida = not ruta.exists()
+                construir(conexion, self.directorio)
+
+            # id_barrio -> fila/columna de la matriz (-1 = barrio desconocido)
+            posiciones = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+            posiciones[ids] = np.arange(len(ids))
+            matriz = (
+                np.memmap(ruta, dtype=np.float32, mode="r", shape=(len(ids), len(ids)))
+                if len(ids) else np.zeros((0, 0), dtype=np.float32)
+            )
+            self._estado = (matriz, posiciones, version)
+        ms = (time.perf_counter() - inicio) * 1000
+        self._ultima_actualizacion = {"barrios": len(ids), "ms": round(ms, 1), "construida": construida}
+        print(f"📏 Matriz de distancias {version}: {len(ids)} barrios "
+              f"({'construida' if construida else 'abierta'} en {ms:.0f} ms)")
+
+    @staticmethod
+    def _posicion(posiciones: np.ndarray, ids_barrio) -> np.ndarray:
+        ids_barrio = np.asarray(ids_barrio, dtype=np.int64)
+        dentro = (ids_barrio >= 0) & (ids_barrio < len(posiciones))
+        return np.where(dentro, posiciones[np.where(dentro, ids_barrio, 0)], -1)
+
+    def distancias(self, id_barrio_origen: int, ids_barrio) -> np.ndarray:
+        """Distancias (km, float64) desde un barrio a muchos; NaN si alguno no está en la matriz."""
+        matriz, posiciones, _ = self._estado
+        destinos = self._posicion(posiciones, ids_barrio)
+        origen = int(self._posicion(posiciones, [id_barrio_origen])[0]) if matriz is not None else -1
+        if origen < 0:
+            return np.full(len(destinos), np.nan)
+        return np.where(destinos >= 0, matriz[origen, np.maximum(destinos, 0)], np.nan).astype(np.float64)
+
+    def distancia(self, id_barrio_a: int, id_barrio_b: int) -> float:
+        """Distancia (km) entre dos barrios, o None si falta alguno o sus coordenadas."""
+        matriz, posiciones, _ = self._estado
+        if matriz is None or not (0 <= id_barrio_a < len(posiciones) and 0 <= id_barrio_b < len(posiciones)):
+            return None
+        fila, columna = posiciones[id_barrio_a], posiciones[id_barrio_b]
+        if fila < 0 or columna < 0:
+            return None
+        valor = float(matriz[fila, columna])
+        return None if np.isnan(valor) else valor
+
+    def metricas(self) -> dict:
+        matriz, _, version = self._estado
+        return {
+            "lista": matriz is not None,
+            "version": version,
+            "barrios": int(matriz.shape[0]) if matriz is not None else 0,
+            "ultima_actualizacion": self._ultima_actualizacion,
+        }
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Construye la matriz de distancias entre barrios")
+    parser.add_argument("--directorio", type=Path, default=DIRECTORIO, help="Dónde escribir la matriz")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    with engine.connect() as conexion:
+        version = construir(conexion, args.directorio)
+    print(f"✅ Matriz {version} lista en {args.directorio} ({time.perf_counter() - inicio:,.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
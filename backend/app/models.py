@@ -276,6 +276,51 @@ class TrabajadorListResponse(BaseModel):
 
 
 
+class TrabajadorBusquedaItem(TrabajadorListItem):
+
+
+    """Trabajador encontrado por la búsqueda de texto libre."""
+
+
+    relevancia: float
+
+
+
+
+
+
+
+
+class BusquedaTrabajadoresResponse(BaseModel):
+
+
+    """Respuesta de la búsqueda de texto libre, paginada por cursor."""
+
+
+    consulta: str
+
+
+    total: int
+
+
+    trabajadores: list[TrabajadorBusquedaItem] = []
+
+
+    
+
+
+    # Cursor para pedir la página siguiente (None si no hay más)
+
+
+    siguiente: Optional[str] = None
+
+
+
+
+
+
+
+
 # Schemas para endpoints de filtros coordinados
 
 
@@ -0,0 +1,136 @@
+"""
+notificaciones.py - Escucha de cambios vía LISTEN/NOTIFY
+
+Los triggers de database.py (DDL_NOTIFICACIONES) publican en CANAL_CAMBIOS cada fila
+insertada, modificada o borrada de ciudades, barrios, oficios, trabajadores y
+trabajador_oficio. Cada proceso de la API mantiene una conexión dedicada escuchando ese
+canal en un hilo y reparte cada aviso a las funciones suscritas a la tabla (las cachés
+de caches.py), que invalidan solo lo afectado en milisegundos.
+
+Si la conexión se pierde se reintenta; al reconectar se avisa una RECARGA a todos los
+suscriptores, porque los cambios de mientras no llegaron. Mientras no está conectada,
+conectada es False y las cachés no deben usarse.
+"""
+
+import json
+import os
+import select
+import threading
+import time
+
+from database import CANAL_CAMBIOS
+
+
+REINTENTO_SEGUNDOS = float(os.getenv("NOTIFICACIONES_REINTENTO_SEGUNDOS", "5"))
+
+# Cada cuánto despierta el hilo para comprobar si debe detenerse
+_ESPERA_SELECT_SEGUNDOS = 1.0
+
+
+class EscuchaCambios:
+    """Hilo que hace LISTEN sobre CANAL_CAMBIOS y reparte los avisos a los suscriptores."""
+
+    def __init__(self, engine, canal: str = CANAL_CAMBIOS):
+        self.engine = engine
+        self.canal = canal
+        self._suscriptores = {}
+        self._hilo = None
+        self._detener = threading.Event()
+        self._conectada = threading.Event()
+        self._contadores = {"recibidas": 0, "invalidas": 0, "errores_suscriptor": 0, "reconexiones": 0}
+        self._ultima = None
+
+    @property
+    def conectada(self) -> bool:
+        return self._conectada.is_set()
+
+    def suscribir(self, tablas, funcion):
+        """Llama a funcion(aviso) por cada cambio en `tablas` ("*" = todas).
+
+        Las RECARGA llegan a todos los suscriptores. La función corre en el hilo de escucha.
+        """
+        for tabla in ([tablas] if isinstance(tablas, str) else tablas):
+            self._suscriptores.setdefault(tabla, []).append(funcion)
+
+    def iniciar(self):
+        if self.engine.dialect.name != "postgresql" or (self._hilo and self._hilo.is_alive()):
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="escucha-cambios", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=_ESPERA_SELECT_SEGUNDOS * 2)
+            self._hilo = None
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                conexion = self._conectar()
+                # Lo ocurrido mientras no se escuchaba no llegó: todo el mundo a recargar
+                self._repartir({"tabla": "*", "op": "RECARGA"})
+                self._conectada.set()
+                print(f"📡 Escuchando cambios en el canal '{self.canal}'")
+                while not self._detener.is_set():
+                    if select.select([conexion], [], [], _ESPERA_SELECT_SEGUNDOS) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        self._procesar(conexion.notifies.pop(0).payload)
+            except Exception as e:
+                if not self._detener.is_set():
+                    print(f"⚠️  Escucha de cambios desconectada: {e}. Reintentando en {REINTENTO_SEGUNDOS}s")
+            finally:
+                self._conectada.clear()
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+            if self._detener.wait(REINTENTO_SEGUNDOS):
+                break
+            self._contadores["reconexiones"] += 1
+
+    def _conectar(self):
+        # Conexión fuera del pool: queda ocupada escuchando mientras viva el proceso
+        proxy = self.engine.raw_connection()
+        conexion = proxy.driver_connection
+        proxy.detach()
+        conexion.autocommit = True
+        with conexion.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.canal}"')
+        return conexion
+
+    def _procesar(self, carga: str):
+        self._contadores["recibidas"] += 1
+        try:
+            aviso = json.loads(carga)
+            aviso["tabla"]
+        except (ValueError, KeyError, TypeError):
+            self._contadores["invalidas"] += 1
+            return
+        self._ultima = time.time()
+        self._repartir(aviso)
+
+    def _repartir(self, aviso: dict):
+        if aviso.get("op") == "RECARGA":
+            funciones = {id(f): f for lista in self._suscriptores.values() for f in lista}.values()
+        else:
+            funciones = self._suscriptores.get(aviso["tabla"], []) + self._suscriptores.get("*", [])
+        for funcion in funciones:
+            try:
+                funcion(aviso)
+            except Exception as e:
+                self._contadores["errores_suscriptor"] += 1
+                print(f"❌ Error aplicando aviso de cambio {aviso}: {e}")
+
+    def metricas(self) -> dict:
+        return {
+            **self._contadores,
+            "conectada": self.conectada,
+            "canal": self.canal,
+            "segundos_desde_ultimo_aviso": round(time.time() - self._ultima, 1) if self._ultima else None,
+        }
@@ -0,0 +1,235 @@
+"""
+particiones.py - Particionamiento mensual por rango y retención
+
+Las tablas de solo-inserción (alertas, clasificacion_logs) están particionadas por mes
+sobre su columna de fecha. Este módulo:
+- crea las particiones de los próximos meses por adelantado (más una partición DEFAULT
+  que recoge cualquier fila fuera de rango),
+- mueve a su partición mensual las filas que hayan caído en DEFAULT (p. ej. tras una
+  carga masiva de histórico),
+- aplica la retención: separa (DETACH) las particiones más antiguas que el límite de
+  meses configurado y, opcionalmente, las elimina.
+
+Las funciones reciben una Connection o Session de SQLAlchemy y no hacen commit.
+"""
+
+import os
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+
+# tabla -> columna de partición y, para migrar tablas antiguas que no la tenían,
+# expresión SQL (sobre el alias "l" de la tabla antigua) que la reconstruye
+TABLAS_PARTICIONADAS = {
+    "alertas": {"columna": "fecha"},
+    "clasificacion_logs": {
+        "columna": "fecha",
+        "legado": "(SELECT s.fecha_creacion FROM public.solicitudes s WHERE s.id_solicitud = l.id_solicitud)",
+    },
+}
+
+MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+
+# Meses de historia que se mantienen adjuntos; 0 desactiva la retención
+RETENCION_MESES = {
+    "alertas": int(os.getenv("RETENCION_MESES_ALERTAS", "24")),
+    "clasificacion_logs": int(os.getenv("RETENCION_MESES_CLASIFICACION_LOGS", "12")),
+}
+
+_PATRON_PARTICION = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def _inicio_mes(fecha) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(tabla: str, mes: date) -> str:
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def crear_particion_default(conexion, tabla: str):
+    conexion.execute(text(
+        f"CREATE TABLE IF NOT EXISTS public.{tabla}_default PARTITION OF public.{tabla} DEFAULT"
+    ))
+
+
+def crear_particion_mensual(conexion, tabla: str, mes: date) -> bool:
+    """Crea la partición de un mes si no existe. Devuelve True si la creó.
+
+    La partición se crea como tabla suelta, recibe las filas de ese mes que estuvieran
+    en DEFAULT y luego se adjunta; así no falla aunque DEFAULT ya tenga datos del mes.
+    """
+    columna = TABLAS_PARTICIONADAS[tabla]["columna"]
+    particion = nombre_particion(tabla, mes)
+    existe = conexion.execute(text("SELECT to_regclass(:nombre)"), {"nombre": f"public.{particion}"}).scalar()
+    if existe:
+        return False
+
+    desde, hasta = mes, _sumar_meses(mes, 1)
+    conexion.execute(text(f"CREATE TABLE public.{particion} (LIKE public.{tabla} INCLUDING DEFAULTS)"))
+    conexion.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM public.{tabla}_default
+            WHERE {columna} >= :desde AND {columna} < :hasta
+            RETURNING *
+        )
+        INSERT INTO public.{particion} SELECT * FROM movidas
+    """), {"desde": desde, "hasta": hasta})
+    conexion.execute(text(
+        f"ALTER TABLE public.{tabla} ATTACH PARTITION public.{particion} "
+        f"FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"
+    ))
+    return True
+
+
+def crear_particiones(conexion, tabla: str, desde: date, hasta: date) -> list:
+    """Crea las particiones mensuales de `desde` a `hasta` (ambos meses incluidos)."""
+    creadas = []
+    mes, hasta = _inicio_mes(desde), _inicio_mes(hasta)
+    while mes <= hasta:
+        if crear_particion_mensual(conexion, tabla, mes):
+            creadas.append(nombre_particion(tabla, mes))
+        mes = _sumar_meses(mes, 1)
+    return creadas
+
+
+def listar_particiones(conexion, tabla: str) -> list:
+    """Devuelve [(nombre, mes)] de las particiones mensuales adjuntas, ordenadas por mes."""
+    nombres = conexion.execute(text("""
+        SELECT hija.relname
+        FROM pg_inherits
+        JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+        JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+        JOIN pg_namespace ns ON ns.oid = padre.relnamespace
+        WHERE ns.nspname = 'public' AND padre.relname = :tabla
+    """), {"tabla": tabla}).scalars().all()
+
+    particiones = []
+    for nombre in nombres:
+        coincidencia = _PATRON_PARTICION.search(nombre)
+        if coincidencia:
+            particiones.append((nombre, date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)))
+    return sorted(particiones, key=lambda p: p[1])
+
+
+def aplicar_retencion(conexion, tabla: str, meses: int, hoy: date = None, eliminar: bool = False) -> list:
+    """Separa (y opcionalmente elimina) las particiones anteriores a `meses` meses atrás.
+
+    Las particiones separadas quedan como tablas normales para archivarlas con pg_dump.
+    """
+    if meses <= 0:
+        return []
+    limite = _sumar_meses(_inicio_mes(hoy or date.today()), -meses)
+    separadas = []
+    for nombre, mes in listar_particiones(conexion, tabla):
+        if mes >= limite:
+            break
+        conexion.execute(text(f"ALTER TABLE public.{tabla} DETACH PARTITION public.{nombre}"))
+        if eliminar:
+            conexion.execute(text(f"DROP TABLE public.{nombre}"))
+        separadas.append(nombre)
+    return separadas
+
+
+def es_particionada(conexion, tabla: str) -> bool:
+    tipo = conexion.execute(text("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace ns ON ns.oid = c.relnamespace
+        WHERE ns.nspname = 'public' AND c.relname = :tabla
+    """), {"tabla": tabla}).scalar()
+    return tipo == "p"
+
+
+def preparar_particiones(conexion, tabla: str, hoy: date = None) -> list:
+    """Asegura DEFAULT y las particiones desde el mes más antiguo en DEFAULT hasta hoy + MESES_ADELANTE."""
+    columna = TABLAS_PARTICIONADAS[tabla]["columna"]
+    mes_actual = _inicio_mes(hoy or date.today())
+    crear_particion_default(conexion, tabla)
+    minimo = conexion.execute(text(f"SELECT MIN({columna}) FROM public.{tabla}_default")).scalar()
+    desde = min(_inicio_mes(minimo), mes_actual) if minimo is not None else mes_actual
+    return crear_particiones(conexion, tabla, desde, _sumar_meses(mes_actual, MESES_ADELANTE))
+
+
+def mantener_particiones(conexion, hoy: date = None, eliminar: bool = False) -> dict:
+    """Tarea periódica: crea particiones por adelantado y aplica la retención configurada."""
+    # Serializa réplicas/workers que ejecuten la tarea a la vez
+    conexion.execute(text("SELECT pg_advisory_xact_lock(hashtext('mantener_particiones'))"))
+    resumen = {}
+    for tabla in TABLAS_PARTICIONADAS:
+        if not es_particionada(conexion, tabla):
+            continue
+        resumen[tabla] = {
+            "creadas": preparar_particiones(conexion, tabla, hoy),
+            "separadas": aplicar_retencion(conexion, tabla, RETENCION_MESES.get(tabla, 0), hoy, eliminar),
+        }
+    return resumen
+
+
+def migrar_a_particionada(conexion, tabla_sa) -> bool:
+    """Convierte una tabla existente sin particionar en la versión particionada.
+
+    Renombra la tabla antigua, crea la nueva desde el modelo, copia los datos a sus
+    particiones y elimina la antigua. No hace nada si ya está particionada o no existe.
+    """
+    tabla = tabla_sa.name
+    config = TABLAS_PARTICIONADAS[tabla]
+    columna = config["columna"]
+    existe = conexion.execute(text("SELECT to_regclass(:nombre)"), {"nombre": f"public.{tabla}"}).scalar()
+    if not existe or es_particionada(conexion, tabla):
+        return False
+
+    legado = f"{tabla}_legado"
+    pk = [c.name for c in tabla_sa.primary_key.columns if c.autoincrement is True][0]
+    secuencia = conexion.execute(
+        text("SELECT pg_get_serial_sequence(:tabla, :columna)"), {"tabla": f"public.{tabla}", "columna": pk}
+    ).scalar()
+    conexion.execute(text(f"ALTER TABLE public.{tabla} RENAME TO {legado}"))
+    conexion.execute(text(f"ALTER TABLE public.{legado} RENAME CONSTRAINT {tabla}_pkey TO {legado}_pkey"))
+    if secuencia:
+        conexion.execute(text(f"ALTER SEQUENCE {secuencia} RENAME TO {legado}_{pk}_seq"))
+
+    columnas_legado = set(conexion.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :tabla
+    """), {"tabla": legado}).scalars().all())
+
+    tabla_sa.create(conexion)
+
+    columnas = [c.name for c in tabla_sa.columns if c.name in columnas_legado]
+    expresiones = [f"l.{c}" for c in columnas]
+    if columna in columnas_legado:
+        expresion_fecha = f"l.{columna}"
+    else:
+        expresion_fecha = f"COALESCE({config.get('legado', 'NULL')}, now())"
+        columnas.append(columna)
+        expresiones.append(expresion_fecha)
+
+    minimo, maximo = conexion.execute(text(
+        f"SELECT MIN({expresion_fecha}), MAX({expresion_fecha}) FROM public.{legado} l"
+    )).one()
+    if minimo is not None:
+        crear_particiones(conexion, tabla, minimo, maximo)
+
+    conexion.execute(text(
+        f"INSERT INTO public.{tabla} ({', '.join(columnas)}) "
+        f"SELECT {', '.join(expresiones)} FROM public.{legado} l"
+    ))
+    conexion.execute(text(f"DROP TABLE public.{legado}"))
+    conexion.execute(text(
+        f"SELECT setval(pg_get_serial_sequence(:tabla, :columna), COALESCE(MAX({pk}), 0) + 1, false) "
+        f"FROM public.{tabla}"
+    ), {"tabla": f"public.{tabla}", "columna": pk})
+    return True
+
+
+def particiones_iniciales(target, connection, **kw):
+    """Listener after_create: DEFAULT y particiones del mes actual en adelante."""
+    if connection.dialect.name == "postgresql":
+        preparar_particiones(connection, target.name, datetime.utcnow().date())
@@ -0,0 +1,218 @@
+"""
+precios_mercado.py - Percentiles de precios de mercado por oficio, ciudad y estrato
+
+El precio de mercado de una solicitud lo estimaba el agente analista del LLM, y
+tarifas_mercado (con la ciudad como texto libre) no se consultaba. Aquí se calculan
+p10/p50/p90 de servicios.costo_final_cop de los servicios completados, agrupados por
+oficio × ciudad × estrato del barrio del servicio, con NumPy para todos los grupos a la vez.
+
+Cuando un grupo tiene menos de MIN_MUESTRAS servicios se sube de nivel:
+
+1. servicios del oficio en la ciudad y estrato
+2. servicios del oficio en la ciudad (todos los estratos)
+3. tarifas_mercado del oficio en la ciudad (p10 = mínimo, p90 = máximo)
+4. servicios del oficio en todas las ciudades
+5. tarifas_mercado del oficio en todas las ciudades
+
+Cada rango lleva además umbrales de precio anómalo: MARGEN_ANOMALIA veces el ancho p10–p90
+por debajo de p10 y por encima de p90. La tabla se recalcula periódicamente
+(INTERVALO_MINUTOS) y se consulta en memoria.
+
+Uso (ver la tabla calculada):
+    python precios_mercado.py [--oficio ID]
+"""
+
+import argparse
+import os
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from sqlalchemy import select
+
+from database import Servicio, Solicitud, Barrio, Ciudad, TarifaMercado
+
+
+PERCENTILES = (10, 50, 90)
+
+# Servicios necesarios para usar los percentiles de un grupo
+MIN_MUESTRAS = int(os.getenv("PRECIOS_MERCADO_MIN_MUESTRAS", "5"))
+
+# Fracción del ancho p10–p90 que se tolera fuera del rango antes de marcar un precio anómalo
+MARGEN_ANOMALIA = float(os.getenv("PRECIOS_MERCADO_MARGEN_ANOMALIA", "0.5"))
+
+INTERVALO_MINUTOS = int(os.getenv("PRECIOS_MERCADO_INTERVALO_MINUTOS", "60"))
+
+
+def _normalizar(nombre: str) -> str:
+    """Nombre de ciudad comparable: sin tildes, minúsculas y sin 'D.C.'."""
+    sin_tildes = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode()
+    return " ".join(sin_tildes.lower().replace("d.c.", "").replace(",", " ").split())
+
+
+def percentiles_por_grupo(claves: np.ndarray, valores: np.ndarray, percentiles=PERCENTILES) -> tuple:
+    """Percentiles de `valores` por cada combinación distinta de las columnas de `claves`.
+
+    Interpolación lineal, como np.percentile. Devuelve (claves únicas, muestras, percentiles)
+    con una fila por grupo.
+    """
+    if len(valores) == 0:
+        return claves[:0], np.zeros(0, dtype=np.int64), np.zeros((0, len(percentiles)))
+    orden = np.lexsort((valores, *claves.T[::-1]))
+    claves, valores = claves[orden], valores[orden]
+    nuevo = np.r_[True, np.any(claves[1:] != claves[:-1], axis=1)]
+    inicios = np.flatnonzero(nuevo)
+    muestras = np.diff(np.r_[inicios, len(valores)])
+
+    posicion = (muestras - 1)[:, None] * (np.asarray(percentiles, dtype=np.float64) / 100)[None, :]
+    bajo = np.floor(posicion).astype(np.int64)
+    alto = np.ceil(posicion).astype(np.int64)
+    inferior = valores[inicios[:, None] + bajo]
+    superior = valores[inicios[:, None] + alto]
+    return claves[inicios], muestras, inferior + (superior - inferior) * (posicion - bajo)
+
+
+def _rangos(claves: np.ndarray, muestras: np.ndarray, valores: np.ndarray, fuente: str, minimo: int = 1) -> dict:
+    """{clave: rango} de los grupos con al menos `minimo` muestras, con umbrales de anomalía."""
+    p10, p50, p90 = valores[:, 0], valores[:, 1], valores[:, 2]
+    ancho = p90 - p10
+    umbral_bajo = np.maximum(p10 - MARGEN_ANOMALIA * ancho, 0)
+    umbral_alto = p90 + MARGEN_ANOMALIA * ancho
+    return {
+        tuple(clave): {
+            "p10": round(a), "p50": round(b), "p90": round(c), "muestras": int(n), "fuente": fuente,
+            "umbral_bajo": round(bajo), "umbral_alto": round(alto),
+        }
+        for clave, n, a, b, c, bajo, alto in zip(
+            claves.tolist(), muestras.tolist(), p10.tolist(), p50.tolist(), p90.tolist(),
+            umbral_bajo.tolist(), umbral_alto.tolist()
+        )
+        if n >= minimo
+    }
+
+
+def calcular(conexion) -> dict:
+    """Tablas de rangos por nivel y barrio -> (ciudad, estrato) con los datos actuales."""
+    filas = conexion.execute(
+        select(Solicitud.id_oficio, Barrio.id_ciudad, Barrio.estrato, Servicio.costo_final_cop)
+        .join(Solicitud, Servicio.id_solicitud == Solicitud.id_solicitud)
+        .join(Barrio, Solicitud.id_barrio_servicio == Barrio.id_barrio)
+        .where(Servicio.estado == "completado", Servicio.costo_final_cop > 0)
+    ).all()
+    claves = np.array([fila[:3] for fila in filas], dtype=np.int64).reshape(-1, 3)
+    costos = np.array([fila[3] for fila in filas], dtype=np.float64)
+
+    tablas = {
+        "estrato": _rangos(*percentiles_por_grupo(claves, costos), "servicios", MIN_MUESTRAS),
+        "ciudad": _rangos(*percentiles_por_grupo(claves[:, :2], costos), "servicios", MIN_MUESTRAS),
+        "oficio": _rangos(*percentiles_por_grupo(claves[:, :1], costos), "servicios", MIN_MUESTRAS),
+    }
+
+    # tarifas_mercado: la ciudad es texto libre, se empareja por nombre normalizado
+    ciudades = {
+        _normalizar(nombre): id_ciudad
+        for id_ciudad, nombre in conexion.execute(select(Ciudad.id_ciudad, Ciudad.nombre_ciudad))
+    }
+    tarifas = [
+        (id_oficio, ciudades.get(_normalizar(ciudad), -1), precio_min, precio_max)
+        for id_oficio, ciudad, precio_min, precio_max in conexion.execute(
+            select(TarifaMercado.id_oficio, TarifaMercado.ciudad, TarifaMercado.precio_min, TarifaMercado.precio_max)
+        )
+    ]
+    for nivel, columnas in (("tarifas_ciudad", 2), ("tarifas_oficio", 1)):
+        por_clave = {}
+        for id_oficio, id_ciudad, precio_min, precio_max in tarifas:
+            if columnas == 2 and id_ciudad < 0:
+                continue
+            clave = (id_oficio, id_ciudad)[:columnas]
+            anterior = por_clave.get(clave, (precio_min, precio_max, 0))
+            por_clave[clave] = (min(anterior[0], precio_min), max(anterior[1], precio_max), anterior[2] + 1)
+        claves_tarifa = np.array(list(por_clave), dtype=np.int64).reshape(-1, columnas)
+        extremos = np.array([(a, (a + b) / 2, b) for a, b, _ in por_clave.values()], dtype=np.float64).reshape(-1, 3)
+        muestras = np.array([n for _, _, n in por_clave.values()], dtype=np.int64)
+        tablas[nivel] = _rangos(claves_tarifa, muestras, extremos, "tarifas_mercado")
+
+    barrios = {
+        id_barrio: (id_ciudad, estrato)
+        for id_barrio, id_ciudad, estrato in conexion.execute(select(Barrio.id_barrio, Barrio.id_ciudad, Barrio.estrato))
+    }
+    return {"tablas": tablas, "barrios": barrios, "servicios": len(costos)}
+
+
+class PreciosMercado:
+    """Rangos de precio de mercado en memoria, recalculados con actualizar()."""
+
+    # Orden de búsqueda: (nivel, columnas de la clave (id_oficio, id_ciudad, estrato))
+    NIVELES = (("estrato", 3), ("ciudad", 2), ("tarifas_ciudad", 2), ("oficio", 1), ("tarifas_oficio", 1))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = None
+        # Sube con cada cálculo, para cachear resultados que usan los rangos
+        self.version = 0
+        self._ultima_actualizacion = {"servicios": 0, "ms": 0.0}
+
+    @property
+    def lista(self) -> bool:
+        return self._datos is not None
+
+    def actualizar(self, engine):
+        inicio = time.perf_counter()
+        with self._lock:
+            with engine.connect() as conexion:
+                datos = calcular(conexion)
+            self._datos = datos
+            self.version += 1
+        ms = (time.perf_counter() - inicio) * 1000
+        grupos = sum(len(tabla) for tabla in datos["tablas"].values())
+        self._ultima_actualizacion = {"servicios": datos["servicios"], "grupos": grupos, "ms": round(ms, 1)}
+        print(f"💲 Precios de mercado: {grupos} rangos de {datos['servicios']} servicios ({ms:.0f} ms)")
+
+    def rango(self, id_oficio: int, id_ciudad: int = None, estrato: int = None) -> dict:
+        """Rango del grupo más específico con datos suficientes, o None si no hay ninguno."""
+        datos = self._datos
+        if datos is None or id_oficio is None:
+            return None
+        clave = (id_oficio, id_ciudad, estrato)
+        for nivel, columnas in self.NIVELES:
+            if None in clave[:columnas]:
+                continue
+            encontrado = datos["tablas"][nivel].get(clave[:columnas])
+            if encontrado is not None:
+                return {"id_oficio": id_oficio, "nivel": nivel, **encontrado}
+        return None
+
+    def rango_barrio(self, id_oficio: int, id_barrio: int = None) -> dict:
+        """rango() con la ciudad y el estrato del barrio."""
+        datos = self._datos
+        id_ciudad, estrato = (datos["barrios"].get(id_barrio, (None, None)) if datos is not None else (None, None))
+        return self.rango(id_oficio, id_ciudad, estrato)
+
+    def metricas(self) -> dict:
+        datos = self._datos
+        return {
+            "lista": datos is not None,
+            "rangos": {nivel: len(tabla) for nivel, tabla in datos["tablas"].items()} if datos else {},
+            "ultima_actualizacion": self._ultima_actualizacion,
+        }
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Calcula los percentiles de precios de mercado")
+    parser.add_argument("--oficio", type=int, default=None, help="Mostrar solo este oficio")
+    args = parser.parse_args()
+
+    precios = PreciosMercado()
+    precios.actualizar(engine)
+    for nivel, tabla in precios._datos["tablas"].items():
+        for clave, rango in sorted(tabla.items()):
+            if args.oficio is None or clave[0] == args.oficio:
+                print(f"{nivel:15} {clave}: p10 {rango['p10']:,} · p50 {rango['p50']:,} · p90 {rango['p90']:,} "
+                      f"({rango['muestras']} {rango['fuente']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+puntuacion.py - Motor de puntuación determinista de trabajadores
+
+Aplica con NumPy, sobre columnas de todos los candidatos a la vez, la misma fórmula
+ponderada por urgencia que antes se le pedía al LLM en el prompt del recomendador:
+
+- ALTA:  disponibilidad 40%, proximidad 30%, experiencia 20%, precio 10%
+- MEDIA: experiencia 30%, calificación 25%, proximidad 25%, precio 20%
+- BAJA:  precio 35%, calificación 30%, experiencia 25%, proximidad 10%
+
+Cada componente se normaliza a [0, 1], así que el score también queda en [0, 1]. El
+resultado es el mismo para los mismos datos, y el top-k sale en microsegundos; el LLM
+queda solo para redactar las explicaciones (MODO_RECOMENDADOR=puntuacion, por defecto).
+Con MODO_RECOMENDADOR=plantillas las explicaciones de explicaciones.py son las definitivas
+(sin LLM) y con MODO_RECOMENDADOR=llm se usa el recomendador LLM completo de antes.
+
+Los pesos de arriba son los manuales. Si existe ARCHIVO_PESOS (lo escribe
+entrenar_pesos.py con los pesos ajustados al historial) se usan los suyos: se cargan al
+importar el módulo y cargar_pesos() los recarga cuando el archivo cambia.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from cotizador import cotizar
+from explicaciones import explicar, explicar_algoritmo
+from geo import COBERTURA_MAX_KM
+from models import RecomendacionOutput, TrabajadorRecomendado
+
+
+MODO_RECOMENDADOR = os.getenv("MODO_RECOMENDADOR", "puntuacion").lower()
+
+COMPONENTES = ("disponibilidad", "proximidad", "experiencia", "calificacion", "precio")
+
+PESOS_MANUALES = {
+    "alta": {"disponibilidad": 0.40, "proximidad": 0.30, "experiencia": 0.20, "precio": 0.10},
+    "media": {"experiencia": 0.30, "calificacion": 0.25, "proximidad": 0.25, "precio": 0.20},
+    "baja": {"precio": 0.35, "calificacion": 0.30, "experiencia": 0.25, "proximidad": 0.10},
+}
+
+# Pesos en uso: se reemplaza el diccionario entero al recargar, nunca se modifica
+PESOS = PESOS_MANUALES
+
+ARCHIVO_PESOS = os.getenv("PESOS_ARCHIVO", str(Path(__file__).with_name("pesos_puntuacion.json")))
+
+# Versión del archivo de pesos cargado (0 = manuales) y su fecha de modificación
+_archivo_pesos = {"version": 0, "modificado": None}
+
+# Valor de cada disponibilidad para el componente de disponibilidad (ausente = 0)
+VALOR_DISPONIBILIDAD = {
+    "HOY": 1.0, "INMEDIATA": 1.0, "disponible": 0.8, "parcial": 0.5, "PROGRAMADA": 0.3,
+}
+
+# A partir de estos años la experiencia puntúa completa
+ANOS_EXPERIENCIA_PLENA = 15
+
+# Componente neutro cuando falta el dato (no cambia el orden entre candidatos)
+VALOR_NEUTRO = 0.5
+
+# Máximo de trabajadores recomendados, como pedía el prompt
+TOP_RECOMENDADOS = 5
+
+
+def _validar_pesos(pesos: dict) -> dict:
+    """Pesos por urgencia del archivo: componentes conocidos, no negativos y que suman 1."""
+    validados = {}
+    for urgencia, manuales in PESOS_MANUALES.items():
+        propios = pesos.get(urgencia)
+        if propios is None:
+            validados[urgencia] = manuales
+            continue
+        if set(propios) - set(COMPONENTES) or any(float(p) < 0 for p in propios.values()):
+            raise ValueError(f"pesos de '{urgencia}' con componentes desconocidos o negativos")
+        if abs(sum(float(p) for p in propios.values()) - 1) > 0.01:
+            raise ValueError(f"los pesos de '{urgencia}' no suman 1")
+        validados[urgencia] = {componente: float(p) for componente, p in propios.items()}
+    return validados
+
+
+def cargar_pesos(archivo: str = ARCHIVO_PESOS) -> bool:
+    """Carga los pesos de `archivo` si cambió desde la última carga. True si cambiaron.
+
+    Sin archivo se vuelve a los manuales; un archivo inválido se ignora y se conservan
+    los pesos en uso.
+    """
+    global PESOS
+    try:
+        modificado = os.stat(archivo).st_mtime_ns
+    except OSError:
+        modificado = None
+    if modificado == _archivo_pesos["modificado"]:
+        return False
+
+    if modificado is None:
+        PESOS, version = PESOS_MANUALES, 0
+    else:
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                contenido = json.load(f)
+            PESOS, version = _validar_pesos(contenido.get("pesos", {})), int(contenido.get("version", 0))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"⚠️  Archivo de pesos inválido ({archivo}): {e}; se conservan los pesos en uso")
+            _archivo_pesos["modificado"] = modificado
+            return False
+        print(f"🧠 Pesos de puntuación v{version} cargados de {archivo}")
+    _archivo_pesos.update(version=version, modificado=modificado)
+    return True
+
+
+def version_pesos() -> int:
+    """Versión de los pesos en uso (0 = manuales), para las claves de caché."""
+    return _archivo_pesos["version"]
+
+
+def vector_pesos(urgencia: str) -> np.ndarray:
+    """Pesos de la urgencia en el orden de COMPONENTES (urgencia desconocida = media)."""
+    pesos = PESOS.get((urgencia or "").lower(), PESOS["media"])
+    return np.array([pesos.get(componente, 0.0) for componente in COMPONENTES])
+
+
+def _columna(candidatos, clave: str) -> np.ndarray:
+    """Columna numérica de los candidatos, con NaN donde el valor falta."""
+    return np.array(
+        [np.nan if c.get(clave) is None else float(c[clave]) for c in candidatos],
+        dtype=np.float64
+    )
+
+
+def precio_referencia(candidato) -> Optional[float]:
+    """Tarifa de visita, o la de hora si no hay de visita; None sin ninguna."""
+    for clave in ("tarifa_visita", "tarifa_hora_promedio"):
+        if candidato.get(clave) is not None:
+            return float(candidato[clave])
+    return None
+
+
+def matriz_componentes(candidatos) -> np.ndarray:
+    """Matriz (candidatos × COMPONENTES) con cada componente normalizado a [0, 1].
+
+    - disponibilidad: VALOR_DISPONIBILIDAD del estado declarado.
+    - proximidad: 1 en el barrio del cliente, 0 al borde de la cobertura del trabajador.
+    - experiencia: años / ANOS_EXPERIENCIA_PLENA, saturado en 1.
+    - calificacion: promedio / 5.
+    - precio: el más barato del grupo 1, el más caro 0 (relativo a los candidatos).
+    """
+    n = len(candidatos)
+    matriz = np.full((n, len(COMPONENTES)), VALOR_NEUTRO)
+    if n == 0:
+        return matriz
+
+    matriz[:, 0] = [VALOR_DISPONIBILIDAD.get(c.get("disponibilidad"), 0.0) for c in candidatos]
+
+    distancia = _columna(candidatos, "distancia_km")
+    cobertura = np.fmin(_columna(candidatos, "cobertura_km"), COBERTURA_MAX_KM)
+    cobertura = np.where(np.isnan(cobertura) | (cobertura <= 0), COBERTURA_MAX_KM, cobertura)
+    matriz[:, 1] = np.where(np.isnan(distancia), VALOR_NEUTRO, np.clip(1 - distancia / cobertura, 0, 1))
+
+    experiencia = _columna(candidatos, "anos_experiencia")
+    matriz[:, 2] = np.where(np.isnan(experiencia), 0, np.clip(experiencia / ANOS_EXPERIENCIA_PLENA, 0, 1))
+
+    calificacion = _columna(candidatos, "calificacion_promedio")
+    matriz[:, 3] = np.where(np.isnan(calificacion), 0, np.clip(calificacion / 5, 0, 1))
+
+    precio = np.array([precio_referencia(c) for c in candidatos], dtype=np.float64)
+    if not np.isnan(precio).all():
+        minimo, maximo = np.nanmin(precio), np.nanmax(precio)
+        relativo = (maximo - precio) / (maximo - minimo) if maximo > minimo else np.ones(n)
+        matriz[:, 4] = np.where(np.isnan(precio), VALOR_NEUTRO, relativo)
+    return matriz
+
+
+def puntuar(candidatos, urgencia: str) -> tuple:
+    """(scores, contribuciones): score por candidato y aporte ponderado de cada componente."""
+    contribuciones = matriz_componentes(candidatos) * vector_pesos(urgencia)
+    return contribuciones.sum(axis=1), contribuciones
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mejores scores, de mayor a menor; empates por id_trabajador."""
+    if len(scores) > k:
+        # Umbral del k-ésimo: se conservan también los empatados con él para desempatar por id
+        umbral = np.partition(scores, len(scores) - k)[len(scores) - k]
+        indices = np.flatnonzero(scores >= umbral)
+    else:
+        indices = np.arange(len(scores))
+    orden = np.lexsort((ids[indices], -scores[indices]))
+    return indices[orden][:k]
+
+
+def recomendar(candidatos, id_oficio: int, urgencia: str, k: int = TOP_RECOMENDADOS,
+               rango_precios: dict = None) -> RecomendacionOutput:
+    """Top-k de candidatos con la fórmula por urgencia, en el formato del recomendador LLM.
+
+    `candidatos` son filas de consultas.buscar_candidatos (acceso por nombre de columna);
+    `rango_precios`, el rango de mercado de la zona para cotizar a quien no tiene tarifas.
+    """
+    urgencia = (urgencia or "media").lower()
+    candidatos = list(candidatos)
+    scores, contribuciones = puntuar(candidatos, urgencia)
+    ids = np.array([c["id_trabajador"] for c in candidatos], dtype=np.int64)
+    mejores = top_k(scores, ids, k)
+    return armar_recomendacion(
+        [candidatos[i] for i in mejores], scores[mejores], contribuciones[mejores],
+        id_oficio, urgencia, total=len(candidatos), rango_precios=rango_precios
+    )
+
+
+def armar_recomendacion(mejores, scores: np.ndarray, contribuciones: np.ndarray, id_oficio: int,
+                        urgencia: str, total: int, rango_precios: dict = None) -> RecomendacionOutput:
+    """RecomendacionOutput de los `mejores` ya ordenados, con sus scores y contribuciones.
+
+    El precio propuesto es la cotización de cotizador.py y las explicaciones salen de las
+    contribuciones (explicaciones.py). También lo usa la selección por fragmentos de
+    topk.py, que puntúa sin pasar por aquí.
+    """
+    urgencia = (urgencia or "media").lower()
+    mejores = list(mejores)
+    pesos = vector_pesos(urgencia)
+    precios = cotizar(mejores, urgencia, rango_precios).tolist()
+    recomendados = []
+    for c, score, aportes, precio in zip(mejores, scores, contribuciones, precios):
+        motivo = COMPONENTES[int(np.argmax(aportes))]
+        recomendados.append(TrabajadorRecomendado(
+            id_trabajador=c["id_trabajador"],
+            nombre_completo=c["nombre_completo"],
+            score_relevancia=round(float(score), 3),
+            distancia_km=c.get("distancia_km"),
+            motivo_top=motivo,
+            precio_propuesto=precio,
+            anos_experiencia=c.get("anos_experiencia") or 0,
+            calificacion_promedio=float(c.get("calificacion_promedio") or 0),
+            explicacion=explicar(c, aportes, pesos, COMPONENTES, precio, rango_precios),
+            tiene_arl=bool(c.get("tiene_arl"))
+        ))
+
+    return RecomendacionOutput(
+        total_candidatos_encontrados=total,
+        trabajadores_recomendados=recomendados,
+        criterios_busqueda={"urgencia": urgencia, "oficio_id": id_oficio},
+        explicacion_algoritmo=explicar_algoritmo(
+            urgencia, PESOS.get(urgencia, PESOS["media"]), total, recomendados
+        ),
+        confianza_recomendaciones=round(float(np.mean(scores)), 3) if len(scores) else 0.0
+    )
+
+
+cargar_pesos()
@@ -0,0 +1,324 @@
+"""
+topk.py - Top-k por score compuesto sobre fragmentos del índice de candidatos
+
+El score de puntuacion.py combina cinco componentes con pesos que dependen de la urgencia,
+así que ningún orden fijo (ni un índice de la base) sirve para cortar en los k primeros:
+hasta ahora había que puntuar a todos los candidatos del oficio.
+
+Para cada vector de pesos, cada cubeta del índice se ordena por su score y se parte en
+fragmentos de TAMANO_FRAGMENTO filas. Sin ubicación del cliente todo el score es fijo
+salvo el precio, que se normaliza con el mínimo y el máximo del grupo consultado: el score
+de una fila es a - c · precio, con c ≥ 0 según la consulta. El máximo de eso en un
+fragmento está siempre en la envolvente superior de sus puntos (precio, a), que se guarda
+(unas pocas filas por fragmento). Así cada consulta conoce la cota exacta de cada fragmento.
+
+La selección recorre los fragmentos de todas las cubetas de mayor a menor cota, los puntúa
+con NumPy, conserva los k mejores y se detiene cuando la cota del siguiente fragmento ya no
+alcanza al k-ésimo (al estilo del threshold algorithm). Normalmente se puntúan uno o dos
+fragmentos por cubeta, tenga la cubeta mil trabajadores o un millón.
+
+El resultado es exactamente el de puntuacion.recomendar sobre todos los candidatos: mismas
+componentes (el precio relativo a todo el grupo), mismos empates por id. Los trabajadores
+excluidos en la consulta (sin cupo) se tratan como si no estuvieran en las cubetas; las
+cotas siguen valiendo porque se calculan sobre un superconjunto.
+"""
+
+import heapq
+import os
+import threading
+
+import numpy as np
+
+from puntuacion import (
+    COMPONENTES, VALOR_DISPONIBILIDAD, VALOR_NEUTRO, ANOS_EXPERIENCIA_PLENA, TOP_RECOMENDADOS,
+    vector_pesos, top_k
+)
+
+
+TAMANO_FRAGMENTO = int(os.getenv("TOPK_TAMANO_FRAGMENTO", "1024"))
+
+DISPONIBILIDAD, PROXIMIDAD, EXPERIENCIA, CALIFICACION, PRECIO = range(len(COMPONENTES))
+
+# Margen de las cotas frente al redondeo de sumar en otro orden (los scores van de 0 a 1)
+HOLGURA = 1e-9
+
+
+def _envolvente(precios: np.ndarray, fijos: np.ndarray) -> np.ndarray:
+    """Índices de los puntos (precio, fijo) que maximizan fijo - c · precio para algún c ≥ 0."""
+    orden = np.lexsort((-fijos, precios))
+    precios, fijos = precios[orden], fijos[orden]
+    # Solo cuentan los que superan a todos los más baratos
+    mejor_previo = np.concatenate([[-np.inf], np.maximum.accumulate(fijos)[:-1]])
+    frente = np.flatnonzero(fijos > mejor_previo)
+
+    envolvente = []
+    for i in frente.tolist():
+        # Cadena cóncava: se descarta el punto intermedio que queda por debajo de la recta
+        while len(envolvente) >= 2:
+            a, b = envolvente[-2], envolvente[-1]
+            if (fijos[b] - fijos[a]) * (precios[i] - precios[b]) <= (fijos[i] - fijos[b]) * (precios[b] - precios[a]):
+                envolvente.pop()
+            else:
+                break
+        envolvente.append(i)
+    return orden[envolvente]
+
+
+def _vertices(fragmentos, pesos: np.ndarray, filas: np.ndarray) -> np.ndarray:
+    """Filas de un fragmento que pueden dar su cota: la envolvente de (precio, score fijo)."""
+    fijos = (fragmentos.matriz(filas, np.nan, np.nan)[:, :PRECIO] * pesos[:PRECIO]).sum(axis=1)
+    precio = fragmentos.precio[filas]
+    con_precio = ~np.isnan(precio)
+    propios = []
+    if con_precio.any():
+        propios.extend(filas[con_precio][_envolvente(precio[con_precio], fijos[con_precio])])
+    if not con_precio.all():
+        # Sin precio el componente es neutro: basta la de mayor score fijo
+        sin_precio = np.flatnonzero(~con_precio)
+        propios.append(filas[sin_precio[np.argmax(fijos[sin_precio])]])
+    return np.array(propios, dtype=np.int64)
+
+
+def _mapa(n: int, quitar: np.ndarray, posiciones: np.ndarray) -> np.ndarray:
+    """Índice en la cubeta nueva de cada fila de la vieja, -1 si se quitó (ver Cubeta.actualizada)."""
+    conservada = np.ones(n, dtype=bool)
+    conservada[quitar] = False
+    sin_quitadas = np.cumsum(conservada) - 1
+    mapa = sin_quitadas + np.searchsorted(posiciones, sin_quitadas, side="right")
+    mapa[quitar] = -1
+    return mapa
+
+
+class _Vista:
+    """Orden, fragmentos y filas candidatas a cota de una cubeta para un vector de pesos.
+
+    El orden (por score con el rango de precios de la cubeta al construirla) solo agrupa
+    filas parecidas: las cotas son exactas para cualquier reparto, así que las filas que
+    llegan después se insertan en el fragmento de su lugar sin reordenar el resto.
+    """
+
+    def __init__(self, fragmentos, pesos: np.ndarray, tamano: int, precios: tuple = None,
+                 orden: np.ndarray = None, clave: np.ndarray = None, tamanos: list = None, vertices: list = None):
+        self.pesos = pesos
+        self.tamano = tamano
+        self.precios = (fragmentos.precio_minimo, fragmentos.precio_maximo) if precios is None else precios
+        if orden is None:
+            n = len(fragmentos)
+            clave = (fragmentos.matriz(np.arange(n), *self.precios) * pesos).sum(axis=1)
+            orden = np.lexsort((fragmentos.ids, -clave))
+            clave = clave[orden]
+            tamanos = [min(tamano, n - inicio) for inicio in range(0, n, tamano)]
+        self.orden = orden
+        # Score de orden de cada posición, de mayor a menor, para insertar por bisección
+        self.clave = clave
+        self.tamanos = tamanos
+        self.fines = np.cumsum(tamanos, dtype=np.int64)
+        self.inicios = self.fines - tamanos
+        if vertices is None:
+            vertices = [_vertices(fragmentos, pesos, orden[i:f]) for i, f in zip(self.inicios, self.fines)]
+        self._vertices = vertices
+        self.vertices = np.concatenate(vertices) if vertices else np.empty(0, dtype=np.int64)
+        self.inicio_vertices = np.cumsum([0] + [len(propios) for propios in vertices[:-1]])
+
+    def cotas(self, fragmentos, pesos: np.ndarray, minimo: float, maximo: float) -> np.ndarray:
+        """Cota superior del score de cada fragmento con ese rango de precios del grupo."""
+        scores = (fragmentos.matriz(self.vertices, minimo, maximo) * pesos).sum(axis=1)
+        return np.maximum.reduceat(scores, self.inicio_vertices) + HOLGURA
+
+    def actualizada(self, fragmentos, mapa: np.ndarray, posiciones: np.ndarray) -> "_Vista":
+        """Esta vista sobre los fragmentos de la cubeta actualizada (Cubeta.actualizada).
+
+        `mapa` lleva cada fila vieja a su índice nuevo (_mapa). Las filas quitadas salen de
+        su fragmento y las nuevas entran en el de su lugar del orden; solo se recalcula la
+        envolvente de esos fragmentos (y se parten si crecen más del doble del tamaño).
+        """
+        orden = mapa[self.orden]
+        sale = orden < 0
+        fragmento = np.repeat(np.arange(len(self.tamanos)), self.tamanos)
+        tocados = set(fragmento[sale].tolist())
+        orden = orden[~sale]
+        clave, fragmento = self.clave[~sale], fragmento[~sale]
+        if not len(orden):
+            return _Vista(fragmentos, self.pesos, self.tamano)
+
+        if len(posiciones):
+            insertadas = posiciones + np.arange(len(posiciones))
+            claves = (fragmentos.matriz(insertadas, *self.precios) * self.pesos).sum(axis=1)
+            orden_nuevas = np.argsort(-claves, kind="stable")
+            insertadas, claves = insertadas[orden_nuevas], claves[orden_nuevas]
+            lugares = np.searchsorted(-clave, -claves, side="right")
+            destinos = fragmento[np.maximum(lugares - 1, 0)]
+            orden = np.insert(orden, lugares, insertadas)
+            clave = np.insert(clave, lugares, claves)
+            fragmento = np.insert(fragmento, lugares, destinos)
+            tocados.update(destinos.tolist())
+
+        tamanos_previos = np.bincount(fragmento, minlength=len(self.tamanos)).tolist()
+        previos = np.split(mapa[self.vertices], self.inicio_vertices[1:])
+        tamanos, vertices, inicio = [], [], 0
+        for f, n in enumerate(tamanos_previos):
+            filas = orden[inicio:inicio + n]
+            inicio += n
+            if f not in tocados:
+                tamanos.append(n)
+                vertices.append(previos[f])
+                continue
+            partes = [filas] if n <= 2 * self.tamano else [filas[i:i + self.tamano] for i in range(0, n, self.tamano)]
+            for parte in partes:
+                if len(parte):
+                    tamanos.append(len(parte))
+                    vertices.append(_vertices(fragmentos, self.pesos, parte))
+        return _Vista(fragmentos, self.pesos, self.tamano, self.precios, orden, clave, tamanos, vertices)
+
+
+def _rango_precios(fragmentos, quitadas: np.ndarray) -> tuple:
+    """(mínimo, máximo) de los precios de la cubeta sin las filas `quitadas`."""
+    minimo, maximo = fragmentos.precio_minimo, fragmentos.precio_maximo
+    # Solo hay que recalcular si se quita alguna fila con un precio extremo
+    if not len(quitadas) or not np.isin(fragmentos.precio[quitadas], (minimo, maximo)).any():
+        return minimo, maximo
+    precio = np.delete(fragmentos.precio, quitadas)
+    precio = precio[~np.isnan(precio)]
+    return (precio.min(), precio.max()) if len(precio) else (np.nan, np.nan)
+
+
+def _disponibilidad(disponibilidad: np.ndarray) -> np.ndarray:
+    return np.array([VALOR_DISPONIBILIDAD.get(d, 0.0) for d in disponibilidad], dtype=np.float64)
+
+
+class Fragmentos:
+    """Componentes fijos de una cubeta y sus vistas ordenadas por vector de pesos.
+
+    Se crea una vez por cubeta (las cubetas no cambian después de creadas; al actualizar una,
+    actualizados() deriva los de la nueva); cada vista se construye la primera vez que se
+    consulta con esos pesos.
+    """
+
+    def __init__(self, cubeta, tamano: int = TAMANO_FRAGMENTO, disponibilidad: np.ndarray = None):
+        self.tamano = tamano
+        self.filas = cubeta.filas
+        self.ids = cubeta.ids
+        self.disponibilidad = _disponibilidad(cubeta.disponibilidad) if disponibilidad is None else disponibilidad
+        self.experiencia = np.where(
+            np.isnan(cubeta.experiencia), 0, np.clip(cubeta.experiencia / ANOS_EXPERIENCIA_PLENA, 0, 1)
+        )
+        self.calificacion = np.where(np.isnan(cubeta.calificacion), 0, np.clip(cubeta.calificacion / 5, 0, 1))
+        # Igual que puntuacion.precio_referencia: tarifa de visita, o la de hora
+        self.precio = np.where(np.isnan(cubeta.tarifa_visita), cubeta.tarifa_hora, cubeta.tarifa_visita)
+        con_precio = self.precio[~np.isnan(self.precio)]
+        self.precio_minimo = con_precio.min() if len(con_precio) else np.nan
+        self.precio_maximo = con_precio.max() if len(con_precio) else np.nan
+        # Filas en orden de id, para posiciones(); se calcula la primera vez que hace falta
+        self._por_id = None
+        self._vistas = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vista(self, pesos: np.ndarray) -> _Vista:
+        clave = tuple(pesos.tolist())
+        vista = self._vistas.get(clave)
+        if vista is None:
+            with self._lock:
+                vista = self._vistas.get(clave)
+                if vista is None:
+                    vista = self._vistas[clave] = _Vista(self, pesos, self.tamano)
+        return vista
+
+    def actualizados(self, cubeta, quitar: np.ndarray, posiciones: np.ndarray) -> "Fragmentos":
+        """Fragmentos de `cubeta`, que es la de estos sin las filas `quitar` y con otras
+        insertadas en `posiciones` (Cubeta.actualizada). Las vistas ya construidas pasan
+        actualizadas en vez de volver a ordenarse."""
+        insertadas = posiciones + np.arange(len(posiciones))
+        disponibilidad = np.insert(
+            np.delete(self.disponibilidad, quitar), posiciones, _disponibilidad(cubeta.disponibilidad[insertadas])
+        )
+        fragmentos = Fragmentos(cubeta, self.tamano, disponibilidad)
+        if not len(fragmentos):
+            return fragmentos
+        with self._lock:
+            vistas = dict(self._vistas)
+        mapa = _mapa(len(self), quitar, posiciones)
+        fragmentos._vistas = {
+            clave: vista.actualizada(fragmentos, mapa, posiciones) for clave, vista in vistas.items()
+        }
+        return fragmentos
+
+    def posiciones(self, ids: np.ndarray) -> np.ndarray:
+        """Filas de la cubeta de esos ids de trabajador (los que no están se ignoran)."""
+        if not len(self) or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        if self._por_id is None:
+            self._por_id = np.argsort(self.ids, kind="stable")
+        ordenados = self.ids[self._por_id]
+        lugares = np.minimum(np.searchsorted(ordenados, ids), len(ordenados) - 1)
+        return self._por_id[lugares[ordenados[lugares] == ids]]
+
+    def matriz(self, indices: np.ndarray, minimo: float, maximo: float) -> np.ndarray:
+        """Componentes de esas filas como puntuacion.matriz_componentes, sin distancia.
+
+        `minimo` y `maximo` son los precios extremos del grupo (NaN si nadie tiene precio).
+        """
+        matriz = np.full((len(indices), len(COMPONENTES)), VALOR_NEUTRO)
+        matriz[:, DISPONIBILIDAD] = self.disponibilidad[indices]
+        matriz[:, EXPERIENCIA] = self.experiencia[indices]
+        matriz[:, CALIFICACION] = self.calificacion[indices]
+        if not np.isnan(minimo):
+            precio = self.precio[indices]
+            relativo = (maximo - precio) / (maximo - minimo) if maximo > minimo else np.ones(len(indices))
+            matriz[:, PRECIO] = np.where(np.isnan(precio), VALOR_NEUTRO, relativo)
+        return matriz
+
+
+def mejores(fragmentos: list, urgencia: str, k: int = TOP_RECOMENDADOS, excluir=None) -> tuple:
+    """Los k mejores candidatos de la unión de las cubetas `fragmentos` para la urgencia.
+
+    Devuelve (filas, scores, contribuciones, total, filas puntuadas), con las filas de
+    mayor a menor score, igual que puntuacion.recomendar sobre todos los candidatos.
+    Los ids de `excluir` no cuentan en el total ni en el rango de precios y no se eligen.
+    """
+    pesos = vector_pesos(urgencia)
+    excluir = np.fromiter(excluir or (), dtype=np.int64)
+    fuera = [f.posiciones(excluir) for f in fragmentos]
+    total = sum(len(f) - len(quitadas) for f, quitadas in zip(fragmentos, fuera))
+    rangos = [_rango_precios(f, quitadas) for f, quitadas in zip(fragmentos, fuera)]
+    con_precio = [rango for rango in rangos if not np.isnan(rango[0])]
+    minimo = min(rango[0] for rango in con_precio) if con_precio else np.nan
+    maximo = max(rango[1] for rango in con_precio) if con_precio else np.nan
+
+    # (-cota, cubeta, fragmento): los de mayor cota primero
+    vistas = [f.vista(pesos) for f in fragmentos]
+    pendientes = [
+        (-cota, i, j)
+        for i, (f, vista) in enumerate(zip(fragmentos, vistas))
+        for j, cota in enumerate(vista.cotas(f, pesos, minimo, maximo).tolist())
+    ]
+    heapq.heapify(pendientes)
+
+    scores = np.empty(0)
+    ids = np.empty(0, dtype=np.int64)
+    contribuciones = np.empty((0, len(COMPONENTES)))
+    filas = []
+    puntuadas = 0
+    while pendientes:
+        cota, i, j = pendientes[0]
+        # Con cota igual al k-ésimo todavía podría ganar el empate por id
+        if len(scores) >= k and -cota < scores[-1]:
+            break
+        heapq.heappop(pendientes)
+        f, vista = fragmentos[i], vistas[i]
+        indices = vista.orden[vista.inicios[j]:vista.fines[j]]
+        if len(fuera[i]):
+            indices = indices[~np.isin(indices, fuera[i])]
+        aportes = f.matriz(indices, minimo, maximo) * pesos
+        puntuadas += len(indices)
+
+        scores = np.concatenate([scores, aportes.sum(axis=1)])
+        ids = np.concatenate([ids, f.ids[indices]])
+        contribuciones = np.concatenate([contribuciones, aportes])
+        filas.extend(f.filas[e] for e in indices.tolist())
+        elegidos = top_k(scores, ids, k)
+        scores, ids, contribuciones = scores[elegidos], ids[elegidos], contribuciones[elegidos]
+        filas = [filas[e] for e in elegidos]
+    return filas, scores, contribuciones, total, puntuadas
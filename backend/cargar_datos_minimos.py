@@ -40,8 +40,8 @@ def cargar_datos_minimos():
         db.add(bogota)
         
         # 2. BARRIOS
-        chapinero = Barrio(id_barrio=1, id_ciudad=1, nombre_barrio='Chapinero', estrato=4)
-        usaquen = Barrio(id_barrio=2, id_ciudad=1, nombre_barrio='Usaquén', estrato=5)
+        chapinero = Barrio(id_barrio=1, id_ciudad=1, nombre_barrio='Chapinero', estrato=4, latitud=4.6486, longitud=-74.0628)
+        usaquen = Barrio(id_barrio=2, id_ciudad=1, nombre_barrio='Usaquén', estrato=5, latitud=4.6947, longitud=-74.0308)
         db.add_all([chapinero, usaquen])
         
         # 3. OFICIOS 
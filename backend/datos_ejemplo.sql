@@ -21,26 +21,26 @@ INSERT INTO ciudades (id_ciudad, nombre_ciudad, departamento, region, codigo_pos
 (4, 'Barranquilla', 'Atlántico', 'Caribe', 80000),
 (5, 'Cartagena', 'Bolívar', 'Caribe', 130000);
 
-INSERT INTO barrios (id_barrio, id_ciudad, nombre_barrio, estrato) VALUES
+INSERT INTO barrios (id_barrio, id_ciudad, nombre_barrio, estrato, latitud, longitud) VALUES
 -- Bogotá
-(1, 1, 'Chapinero', 4),
-(2, 1, 'Usaquén', 5),
-(3, 1, 'Kennedy', 3),
-(4, 1, 'Suba', 3),
-(5, 1, 'Engativá', 2),
+(1, 1, 'Chapinero', 4, 4.648600, -74.062800),
+(2, 1, 'Usaquén', 5, 4.694700, -74.030800),
+(3, 1, 'Kennedy', 3, 4.628000, -74.146900),
+(4, 1, 'Suba', 3, 4.741200, -74.083900),
+(5, 1, 'Engativá', 2, 4.706500, -74.112800),
 -- Medellín
-(6, 2, 'El Poblado', 6),
-(7, 2, 'Laureles', 4),
-(8, 2, 'Bello', 3),
+(6, 2, 'El Poblado', 6, 6.208700, -75.567100),
+(7, 2, 'Laureles', 4, 6.244900, -75.597300),
+(8, 2, 'Bello', 3, 6.337300, -75.558000),
 -- Cali
-(9, 3, 'San Fernando', 5),
-(10, 3, 'Ciudad Jardín', 4),
+(9, 3, 'San Fernando', 5, 3.432000, -76.544700),
+(10, 3, 'Ciudad Jardín', 4, 3.365300, -76.538400),
 -- Barranquilla
-(11, 4, 'El Prado', 5),
-(12, 4, 'Riomar', 6),
+(11, 4, 'El Prado', 5, 10.994100, -74.796600),
+(12, 4, 'Riomar', 6, 11.017300, -74.826500),
 -- Cartagena
-(13, 5, 'Bocagrande', 6),
-(14, 5, 'Getsemaní', 2);
+(13, 5, 'Bocagrande', 6, 10.399700, -75.555900),
+(14, 5, 'Getsemaní', 2, 10.421900, -75.544900);
 
 -- =====================================================
 -- MAESTROS: OFICIOS
@@ -15,9 +15,9 @@ INSERT INTO ciudades (id_ciudad, nombre_ciudad, departamento, region, codigo_pos
 (1, 'Bogotá D.C.', 'Cundinamarca', 'Andina', 110000);
 
 -- BARRIOS
-INSERT INTO barrios (id_barrio, id_ciudad, nombre_barrio, estrato) VALUES
-(1, 1, 'Chapinero', 4),
-(2, 1, 'Usaquén', 5);
+INSERT INTO barrios (id_barrio, id_ciudad, nombre_barrio, estrato, latitud, longitud) VALUES
+(1, 1, 'Chapinero', 4, 4.648600, -74.062800),
+(2, 1, 'Usaquén', 5, 4.694700, -74.030800);
 
 -- OFICIOS
 INSERT INTO oficios (id_oficio, nombre_oficio, categoria_servicio, descripcion) VALUES
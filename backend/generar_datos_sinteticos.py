@@ -0,0 +1,626 @@
+"""
+Generador de datos sintéticos para pruebas de escala.
+
+Produce un marketplace completo y consistente con las claves foráneas (ciudades, barrios
+con estrato y coordenadas, oficios, solicitantes, trabajadores con sus oficios y tarifas, solicitudes,
+recomendaciones, servicios, calificaciones, alertas y logs de clasificación) con
+distribuciones sesgadas: pocas ciudades y oficios concentran la demanda, y los
+trabajadores mejor calificados reciben más servicios.
+
+La salida usa el formato del cargador masivo (un <tabla>.csv por tabla con encabezado),
+así que se carga directamente con app/cargador_masivo.py. Con la misma semilla, los
+mismos parámetros y la misma --fecha-fin (por defecto, hoy) el resultado es idéntico.
+
+Uso:
+    python generar_datos_sinteticos.py --salida datos_carga --trabajadores 1000000 --solicitudes 10000000
+    cd app && python cargador_masivo.py ../datos_carga --truncar
+"""
+
+import argparse
+import csv
+import gzip
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+
+# =========================
+# CATÁLOGOS BASE
+# =========================
+
+# (nombre, departamento, región, código postal base, latitud, longitud del centro), ordenadas por tamaño
+CIUDADES_BASE = [
+    ("Bogotá D.C.", "Cundinamarca", "Andina", 110000, 4.7110, -74.0721),
+    ("Medellín", "Antioquia", "Andina", 50000, 6.2442, -75.5812),
+    ("Cali", "Valle del Cauca", "Pacífico", 76000, 3.4516, -76.5320),
+    ("Barranquilla", "Atlántico", "Caribe", 80000, 10.9685, -74.7813),
+    ("Cartagena", "Bolívar", "Caribe", 130000, 10.3910, -75.4794),
+    ("Cúcuta", "Norte de Santander", "Andina", 540000, 7.8939, -72.5078),
+    ("Soacha", "Cundinamarca", "Andina", 250050, 4.5794, -74.2168),
+    ("Soledad", "Atlántico", "Caribe", 83001, 10.9184, -74.7646),
+    ("Bucaramanga", "Santander", "Andina", 680000, 7.1193, -73.1227),
+    ("Bello", "Antioquia", "Andina", 51050, 6.3373, -75.5580),
+    ("Villavicencio", "Meta", "Orinoquía", 500000, 4.1420, -73.6266),
+    ("Ibagué", "Tolima", "Andina", 730000, 4.4389, -75.2322),
+    ("Santa Marta", "Magdalena", "Caribe", 470000, 11.2408, -74.1990),
+    ("Valledupar", "Cesar", "Caribe", 200000, 10.4631, -73.2532),
+    ("Manizales", "Caldas", "Andina", 170000, 5.0703, -75.5138),
+    ("Pereira", "Risaralda", "Andina", 660000, 4.8133, -75.6961),
+    ("Montería", "Córdoba", "Caribe", 230000, 8.7479, -75.8814),
+    ("Neiva", "Huila", "Andina", 410000, 2.9273, -75.2819),
+    ("Pasto", "Nariño", "Pacífico", 520000, 1.2136, -77.2811),
+    ("Armenia", "Quindío", "Andina", 630000, 4.5339, -75.6811),
+]
+
+KM_POR_GRADO = 111.195
+
+# (nombre, categoría, descripción, tarifa hora base, tarifa visita base)
+OFICIOS = [
+    ("Plomero", "Hogar", "Instalación y reparación de tuberías, desagües, llaves, tanques y sistemas hidráulicos", 32000, 22000),
+    ("Electricista", "Hogar", "Instalación y reparación de sistemas eléctricos residenciales y comerciales", 36000, 25000),
+    ("Cerrajero", "Seguridad", "Apertura de puertas, cambio de cerraduras, duplicado de llaves y sistemas de seguridad", 40000, 30000),
+    ("Técnico de Aires Acondicionados", "Hogar", "Instalación, mantenimiento y reparación de sistemas de aire acondicionado", 45000, 35000),
+    ("Técnico de Refrigeración", "Hogar", "Reparación y mantenimiento de neveras, congeladores y equipos de frío", 38000, 28000),
+    ("Técnico de Lavadoras", "Hogar", "Reparación y mantenimiento de lavadoras y secadoras de ropa", 34000, 25000),
+    ("Gasfitero", "Hogar", "Instalación y reparación de sistemas de gas domiciliario y estufas", 37000, 27000),
+    ("Pintor", "Construcción", "Pintura interior y exterior de viviendas y locales comerciales", 22000, 15000),
+    ("Albañil", "Construcción", "Trabajos de mampostería, muros, pisos, enchapes y obras civiles menores", 20000, 15000),
+    ("Carpintero", "Construcción", "Fabricación y reparación de muebles, puertas, ventanas y estructuras de madera", 28000, 20000),
+    ("Técnico de Computadoras", "Tecnología", "Reparación y mantenimiento de computadoras de escritorio y portátiles", 35000, 25000),
+    ("Instalador de Redes", "Tecnología", "Instalación de redes de datos, Wi-Fi y cableado estructurado", 40000, 30000),
+    ("Técnico de Celulares", "Tecnología", "Reparación de smartphones y tablets", 30000, 15000),
+    ("Instalador de Antenas", "Tecnología", "Instalación de antenas parabólicas, TV digital y sistemas de señal", 30000, 25000),
+    ("Soporte IT", "Tecnología", "Soporte técnico remoto y presencial para equipos y software", 45000, 30000),
+    ("Servicio de Limpieza", "Limpieza", "Limpieza profunda de hogares, oficinas y locales comerciales", 18000, 10000),
+    ("Jardinero", "Mantenimiento", "Diseño, mantenimiento y poda de jardines y áreas verdes", 20000, 15000),
+    ("Lavador de Fachadas", "Mantenimiento", "Limpieza de vidrios, fachadas y áreas de difícil acceso", 30000, 25000),
+    ("Fumigador", "Mantenimiento", "Control de plagas, fumigación y desinfección", 35000, 30000),
+    ("Servicio de Mudanzas", "Transporte", "Traslado de muebles, embalaje y transporte de pertenencias", 60000, 50000),
+    ("Mecánico Automotriz", "Automotriz", "Reparación y mantenimiento de vehículos", 45000, 35000),
+    ("Electricista Automotriz", "Automotriz", "Diagnóstico y reparación de sistemas eléctricos de vehículos", 42000, 30000),
+    ("Técnico de Latonería y Pintura", "Automotriz", "Reparación de carrocería y pintura automotriz", 40000, 30000),
+    ("Profesor Particular", "Educación", "Clases particulares a domicilio (matemáticas, idiomas, etc.)", 30000, 0),
+    ("Entrenador Personal", "Salud", "Entrenamiento físico personalizado a domicilio o gimnasio", 40000, 0),
+]
+
+NOMBRES = [
+    "Carlos", "Andrés", "Jairo", "Roberto", "Edison", "Fernando", "Miguel", "Pedro", "Luis", "Jorge",
+    "Juan", "Diego", "Camilo", "Sebastián", "Mauricio", "María", "Ana", "Luisa", "Carolina", "Paola",
+    "Diana", "Sandra", "Natalia", "Valentina", "Daniela", "Laura", "Marcela", "Gloria", "Claudia", "Lina",
+]
+APELLIDOS = [
+    "Mendoza", "Castro", "Sánchez", "Gómez", "Vargas", "Torres", "González", "Rodríguez", "Martínez",
+    "López", "Hernández", "Díaz", "Pérez", "Ramírez", "Moreno", "Jiménez", "Ruiz", "Álvarez", "Romero",
+    "Rojas", "Muñoz", "Ortiz", "Suárez", "Restrepo", "Cardona", "Ospina", "Villa", "Mora", "Ríos", "Parra",
+]
+PREFIJOS_BARRIO = [
+    "San José", "La Esperanza", "El Prado", "Santa Fe", "Los Alpes", "Villa del Río", "El Recreo",
+    "La Floresta", "Las Palmas", "El Porvenir", "San Antonio", "La Castellana", "Los Rosales",
+    "El Poblado", "Modelia", "Kennedy", "La Campiña", "Altos del Norte", "Belén", "Manrique",
+]
+PLANTILLAS_SOLICITUD = [
+    "Necesito un {o} urgente, tengo un problema en casa",
+    "Busco {o} para esta semana, es un trabajo sencillo",
+    "Requiero {o} para revisión y cotización del daño",
+    "Se necesita {o} para mantenimiento preventivo",
+    "Quisiera contratar un {o} cuando tengan disponibilidad",
+]
+TIPOS_ALERTA = [
+    ("precio_anomalo", "Precio propuesto fuera del rango observado para el oficio"),
+    ("riesgo_seguridad", "Trabajo con riesgo eléctrico o en altura"),
+    ("patron_sospechoso", "Varias solicitudes similares en poco tiempo desde el mismo usuario"),
+    ("calidad_baja", "Trabajador con calificación baja asignado a trabajo crítico"),
+]
+
+DISPONIBILIDADES = np.array(["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA", "ocupado"])
+P_DISPONIBILIDAD = [0.35, 0.2, 0.1, 0.08, 0.12, 0.15]
+URGENCIAS = np.array(["alta", "media", "baja"])
+P_URGENCIA = [0.3, 0.5, 0.2]
+P_ESTRATO = [0.12, 0.3, 0.3, 0.14, 0.09, 0.05]
+FACTOR_ESTRATO = np.array([0.8, 0.9, 1.0, 1.15, 1.3, 1.5])
+MOTIVOS = np.array(["experiencia", "proximidad", "precio", "calificacion", "disponibilidad"])
+
+DIAS_HISTORIA = 730
+
+
+# =========================
+# UTILIDADES
+# =========================
+
+def pesos_zipf(n: int, s: float) -> np.ndarray:
+    """Pesos ∝ 1 / rango^s, normalizados (el índice 0 es el más popular)."""
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    return pesos / pesos.sum()
+
+
+def redondear_miles(valores) -> np.ndarray:
+    return (np.round(np.asarray(valores) / 1000.0) * 1000).astype(np.int64)
+
+
+def fechas_texto(fechas: np.ndarray, mascara=None) -> np.ndarray:
+    """datetime64[s] → texto ISO; las posiciones fuera de la máscara quedan vacías (NULL)."""
+    texto = np.datetime_as_string(fechas, unit="s")
+    if mascara is not None:
+        texto = np.where(mascara, texto, "")
+    return texto
+
+
+def nombres_completos(rng, n: int) -> np.ndarray:
+    nombres = np.array(NOMBRES)[rng.integers(0, len(NOMBRES), n)]
+    apellido1 = np.array(APELLIDOS)[rng.integers(0, len(APELLIDOS), n)]
+    apellido2 = np.array(APELLIDOS)[rng.integers(0, len(APELLIDOS), n)]
+    return np.char.add(np.char.add(np.char.add(nombres, " "), np.char.add(apellido1, " ")), apellido2)
+
+
+class EscritorTabla:
+    """Escribe un <tabla>.csv (o .csv.gz) en formato del cargador masivo."""
+
+    def __init__(self, directorio: Path, tabla: str, columnas: list, comprimir: bool):
+        ruta = directorio / (f"{tabla}.csv.gz" if comprimir else f"{tabla}.csv")
+        self.archivo = (
+            gzip.open(ruta, "wt", encoding="utf-8", newline="", compresslevel=3) if comprimir
+            else open(ruta, "w", encoding="utf-8", newline="")
+        )
+        self.escritor = csv.writer(self.archivo)
+        self.escritor.writerow(columnas)
+        self.columnas = columnas
+        self.filas = 0
+
+    def escribir(self, **valores):
+        columnas = [np.asarray(valores[c]).tolist() for c in self.columnas]
+        self.escritor.writerows(zip(*columnas))
+        self.filas += len(columnas[0]) if columnas else 0
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+# =========================
+# GENERADOR
+# =========================
+
+class GeneradorMarketplace:
+    """Genera todas las tablas a partir de una semilla y parámetros de escala."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.semilla)
+        # Flujo aparte para coordenadas: añadirlas no cambia el resto de datos de una semilla
+        self.rng_geo = np.random.default_rng([args.semilla, 1])
+        self.salida = args.salida
+        self.salida.mkdir(parents=True, exist_ok=True)
+        self.fecha_fin = np.datetime64(args.fecha_fin, "s")
+
+    def _escritor(self, tabla, columnas):
+        return EscritorTabla(self.salida, tabla, columnas, self.args.comprimir)
+
+    # ---------- Maestros ----------
+
+    def generar_ciudades(self):
+        n = self.args.ciudades
+        nombres, deptos, regiones, codigos, centros = [], [], [], [], []
+        for i in range(n):
+            if i < len(CIUDADES_BASE):
+                nombre, depto, region, codigo, latitud, longitud = CIUDADES_BASE[i]
+            else:
+                base = CIUDADES_BASE[i % len(CIUDADES_BASE)]
+                nombre, depto, region, codigo = f"Municipio {i + 1}", base[1], base[2], base[3] + i
+                # Municipio vecino: entre 20 y 80 km de la ciudad base
+                angulo, distancia = self.rng_geo.uniform(0, 2 * np.pi), self.rng_geo.uniform(20, 80)
+                latitud = base[4] + distancia / KM_POR_GRADO * np.sin(angulo)
+                longitud = base[5] + distancia / (KM_POR_GRADO * np.cos(np.radians(base[4]))) * np.cos(angulo)
+            nombres.append(nombre)
+            deptos.append(depto)
+            regiones.append(region)
+            codigos.append(codigo)
+            centros.append((latitud, longitud))
+
+        self.ciudad_nombres = np.array(nombres)
+        self.ciudad_centro = np.array(centros)
+        self.peso_ciudad = pesos_zipf(n, 1.1)
+
+        escritor = self._escritor("ciudades", ["id_ciudad", "nombre_ciudad", "departamento", "region", "codigo_postal_base"])
+        escritor.escribir(
+            id_ciudad=np.arange(1, n + 1), nombre_ciudad=nombres, departamento=deptos,
+            region=regiones, codigo_postal_base=codigos
+        )
+        escritor.cerrar()
+
+    def generar_barrios(self):
+        rng = self.rng
+        n_ciudades = self.args.ciudades
+        total = self.args.barrios_por_ciudad * n_ciudades
+        # Ciudades grandes tienen más barrios (sesgo suavizado), mínimo 3 por ciudad
+        reparto = self.peso_ciudad ** 0.6
+        por_ciudad = np.maximum(3, np.round(total * reparto / reparto.sum())).astype(np.int64)
+
+        self.barrio_ciudad = np.repeat(np.arange(n_ciudades), por_ciudad)
+        n = len(self.barrio_ciudad)
+        self.barrio_estrato = rng.choice(np.arange(1, 7), size=n, p=P_ESTRATO)
+        # Peso de cada barrio: peso de su ciudad repartido entre sus barrios, con ruido
+        self.peso_barrio = self.peso_ciudad[self.barrio_ciudad] / por_ciudad[self.barrio_ciudad]
+        self.peso_barrio = self.peso_barrio * rng.lognormal(0, 0.5, n)
+        self.peso_barrio /= self.peso_barrio.sum()
+
+        sector = np.arange(n) - np.repeat(np.cumsum(por_ciudad) - por_ciudad, por_ciudad) + 1
+        prefijo = np.array(PREFIJOS_BARRIO)[sector % len(PREFIJOS_BARRIO)]
+        nombres = np.char.add(np.char.add(prefijo, " "), (sector // len(PREFIJOS_BARRIO) + 1).astype(str))
+
+        # Barrios dispersos alrededor del centro; las ciudades grandes ocupan más área
+        dispersion_km = 2 + 6 * np.sqrt(self.peso_ciudad / self.peso_ciudad.max())
+        centro = self.ciudad_centro[self.barrio_ciudad]
+        desvio = self.rng_geo.normal(0, 1, (n, 2)) * dispersion_km[self.barrio_ciudad, None] / KM_POR_GRADO
+        latitud = centro[:, 0] + desvio[:, 0]
+        longitud = centro[:, 1] + desvio[:, 1] / np.cos(np.radians(centro[:, 0]))
+
+        escritor = self._escritor(
+            "barrios", ["id_barrio", "id_ciudad", "nombre_barrio", "estrato", "latitud", "longitud"]
+        )
+        escritor.escribir(
+            id_barrio=np.arange(1, n + 1), id_ciudad=self.barrio_ciudad + 1,
+            nombre_barrio=nombres, estrato=self.barrio_estrato,
+            latitud=np.round(latitud, 6), longitud=np.round(longitud, 6)
+        )
+        escritor.cerrar()
+
+    def generar_oficios(self):
+        n = len(OFICIOS)
+        self.oficio_tarifa_hora = np.array([o[3] for o in OFICIOS], dtype=np.float64)
+        self.oficio_tarifa_visita = np.array([o[4] for o in OFICIOS], dtype=np.float64)
+        self.oficio_nombre = np.array([o[0] for o in OFICIOS])
+        # Popularidad sesgada, en orden aleatorio pero reproducible
+        self.peso_oficio = self.rng.permutation(pesos_zipf(n, 0.9))
+
+        escritor = self._escritor("oficios", ["id_oficio", "nombre_oficio", "categoria_servicio", "descripcion"])
+        escritor.escribir(
+            id_oficio=np.arange(1, n + 1), nombre_oficio=[o[0] for o in OFICIOS],
+            categoria_servicio=[o[1] for o in OFICIOS], descripcion=[o[2] for o in OFICIOS]
+        )
+        escritor.cerrar()
+
+        escritor = self._escritor("tarifas_mercado", ["id_tarifa", "id_oficio", "ciudad", "precio_min", "precio_max", "fuente"])
+        n_ciudades = min(self.args.ciudades, len(CIUDADES_BASE))
+        oficio = np.tile(np.arange(n), n_ciudades)
+        ciudad = np.repeat(np.arange(n_ciudades), n)
+        base = self.oficio_tarifa_visita[oficio] + 2 * self.oficio_tarifa_hora[oficio]
+        factor = 1.0 + 0.1 * self.peso_ciudad[ciudad] / self.peso_ciudad[0]
+        escritor.escribir(
+            id_tarifa=np.arange(1, len(oficio) + 1), id_oficio=oficio + 1,
+            ciudad=self.ciudad_nombres[ciudad],
+            precio_min=redondear_miles(base * 0.6 * factor), precio_max=redondear_miles(base * 1.8 * factor),
+            fuente=np.full(len(oficio), "Generador sintético")
+        )
+        escritor.cerrar()
+
+    # ---------- Usuarios ----------
+
+    def _fechas_registro(self, n):
+        dias = self.rng.integers(DIAS_HISTORIA, 3 * DIAS_HISTORIA, n)
+        return np.datetime_as_string(self.fecha_fin - dias.astype("timedelta64[D]"), unit="D")
+
+    def generar_solicitantes(self):
+        rng = self.rng
+        n = self.args.solicitantes
+        self.solicitante_barrio = rng.choice(len(self.peso_barrio), size=n, p=self.peso_barrio)
+        columnas = ["id_solicitante", "nombre_completo", "cedula", "telefono", "email",
+                    "id_barrio", "direccion", "acepta_habeas", "fecha_registro"]
+        escritor = self._escritor("solicitantes", columnas)
+        for inicio in range(0, n, self.args.lote):
+            fin = min(n, inicio + self.args.lote)
+            ids = np.arange(inicio + 1, fin + 1)
+            m = fin - inicio
+            escritor.escribir(
+                id_solicitante=ids, nombre_completo=nombres_completos(rng, m),
+                cedula=(1_000_000_000 + ids).astype(str),
+                telefono=(3_000_000_000 + rng.integers(0, 299_999_999, m)).astype(str),
+                email=np.char.add(np.char.add("solicitante", ids.astype(str)), "@correo.test"),
+                id_barrio=self.solicitante_barrio[inicio:fin] + 1,
+                direccion=np.char.add("Calle ", rng.integers(1, 200, m).astype(str)),
+                acepta_habeas=np.full(m, True), fecha_registro=self._fechas_registro(m)
+            )
+        escritor.cerrar()
+
+    def generar_trabajadores(self):
+        rng = self.rng
+        n = self.args.trabajadores
+        self.trabajador_barrio = rng.choice(len(self.peso_barrio), size=n, p=self.peso_barrio)
+        self.trabajador_ciudad = self.barrio_ciudad[self.trabajador_barrio]
+        # Calificaciones sesgadas hacia arriba (la mayoría entre 4 y 5)
+        self.trabajador_rating = np.round(1 + 4 * rng.beta(8, 2, n), 2)
+        self.trabajador_juridica = rng.random(n) < 0.08
+        experiencia = np.minimum(40, np.round(rng.gamma(2.0, 4.0, n))).astype(np.int64)
+
+        columnas = ["id_trabajador", "nombre_completo", "identificacion", "tipo_persona", "telefono", "email",
+                    "id_barrio", "direccion", "anos_experiencia", "calificacion_promedio", "disponibilidad",
+                    "cobertura_km", "tiene_arl", "fecha_registro"]
+        escritor = self._escritor("trabajadores", columnas)
+        for inicio in range(0, n, self.args.lote):
+            fin = min(n, inicio + self.args.lote)
+            ids = np.arange(inicio + 1, fin + 1)
+            m = fin - inicio
+            escritor.escribir(
+                id_trabajador=ids, nombre_completo=nombres_completos(rng, m),
+                identificacion=(2_000_000_000 + ids).astype(str),
+                tipo_persona=np.where(self.trabajador_juridica[inicio:fin], "juridica", "natural"),
+                telefono=(3_000_000_000 + rng.integers(0, 299_999_999, m)).astype(str),
+                email=np.char.add(np.char.add("trabajador", ids.astype(str)), "@correo.test"),
+                id_barrio=self.trabajador_barrio[inicio:fin] + 1,
+                direccion=np.char.add("Carrera ", rng.integers(1, 200, m).astype(str)),
+                anos_experiencia=experiencia[inicio:fin],
+                calificacion_promedio=self.trabajador_rating[inicio:fin],
+                disponibilidad=rng.choice(DISPONIBILIDADES, size=m, p=P_DISPONIBILIDAD),
+                cobertura_km=rng.choice([5, 8, 10, 12, 15, 20, 25, 30], size=m),
+                tiene_arl=rng.random(m) < 0.6, fecha_registro=self._fechas_registro(m)
+            )
+        escritor.cerrar()
+
+    def generar_trabajador_oficio(self):
+        rng = self.rng
+        n = self.args.trabajadores
+        n_oficios = len(OFICIOS)
+        # 1 a 3 oficios por trabajador, sin repetir oficio
+        cantidad = rng.choice([1, 2, 3], size=n, p=[0.6, 0.3, 0.1])
+        principal = rng.choice(n_oficios, size=n, p=self.peso_oficio)
+        salto1 = rng.integers(1, n_oficios, n)
+        salto2 = rng.integers(1, n_oficios - 1, n)
+        salto2 = salto2 + (salto2 >= salto1)
+
+        trabajador = np.concatenate([np.arange(n), np.flatnonzero(cantidad >= 2), np.flatnonzero(cantidad >= 3)])
+        oficio = np.concatenate([
+            principal,
+            (principal + salto1)[cantidad >= 2] % n_oficios,
+            (principal + salto2)[cantidad >= 3] % n_oficios,
+        ])
+        orden = np.argsort(trabajador, kind="stable")
+        trabajador, oficio = trabajador[orden], oficio[orden]
+        m = len(trabajador)
+
+        estrato = self.barrio_estrato[self.trabajador_barrio[trabajador]]
+        factor = FACTOR_ESTRATO[estrato - 1] * rng.lognormal(0, 0.2, m)
+        self.to_trabajador = trabajador
+        self.to_oficio = oficio
+        self.to_tarifa_hora = redondear_miles(self.oficio_tarifa_hora[oficio] * factor)
+        self.to_tarifa_visita = redondear_miles(self.oficio_tarifa_visita[oficio] * factor)
+
+        certificaciones = np.where(
+            rng.random(m) < 0.5, np.char.add("SENA ", self.oficio_nombre[oficio]), ""
+        )
+        columnas = ["id_trab_oficio", "id_trabajador", "id_oficio", "tarifa_hora_promedio",
+                    "tarifa_visita", "certificaciones"]
+        escritor = self._escritor("trabajador_oficio", columnas)
+        for inicio in range(0, m, self.args.lote):
+            fin = min(m, inicio + self.args.lote)
+            escritor.escribir(
+                id_trab_oficio=np.arange(inicio + 1, fin + 1), id_trabajador=trabajador[inicio:fin] + 1,
+                id_oficio=oficio[inicio:fin] + 1, tarifa_hora_promedio=self.to_tarifa_hora[inicio:fin],
+                tarifa_visita=self.to_tarifa_visita[inicio:fin], certificaciones=certificaciones[inicio:fin]
+            )
+        escritor.cerrar()
+
+        # Grupos (ciudad, oficio) y (oficio) ordenados por calificación descendente,
+        # para elegir trabajadores de servicios con sesgo hacia los mejor calificados.
+        rating = self.trabajador_rating[trabajador]
+        clave = self.trabajador_ciudad[trabajador] * n_oficios + oficio
+        self.grupo_orden = np.lexsort((-rating, clave))
+        self.grupo_clave = clave[self.grupo_orden]
+        self.oficio_orden = np.lexsort((-rating, oficio))
+        self.oficio_clave = oficio[self.oficio_orden]
+
+    def _elegir_en_grupo(self, claves_ordenadas, orden, claves, sesgo):
+        """Elige una fila de trabajador_oficio por clave; -1 si el grupo está vacío."""
+        inicio = np.searchsorted(claves_ordenadas, claves, side="left")
+        fin = np.searchsorted(claves_ordenadas, claves, side="right")
+        cantidad = fin - inicio
+        desplazamiento = np.floor(cantidad * self.rng.random(len(claves)) ** sesgo).astype(np.int64)
+        posicion = np.minimum(inicio + desplazamiento, np.maximum(fin - 1, 0))
+        return np.where(cantidad > 0, orden[np.minimum(posicion, len(orden) - 1)], -1)
+
+    # ---------- Operación ----------
+
+    def generar_operacion(self):
+        rng = self.rng
+        n = self.args.solicitudes
+        n_oficios = len(OFICIOS)
+        escritores = {
+            "solicitudes": self._escritor("solicitudes", [
+                "id_solicitud", "id_solicitante", "id_oficio", "descripcion_usuario", "urgencia",
+                "id_barrio_servicio", "fecha_creacion", "estado", "precio_estimado_mercado", "flag_alerta"]),
+            "recomendaciones": self._escritor("recomendaciones", [
+                "id_recomendacion", "id_solicitud", "id_trabajador", "score_relevancia", "distancia_km",
+                "motivo_top", "precio_estimado", "precio_propuesto", "explicacion", "es_asignado"]),
+            "servicios": self._escritor("servicios", [
+                "id_servicio", "id_solicitud", "id_trabajador", "fecha_asignacion", "fecha_cierre",
+                "costo_final_cop", "aplica_iva", "valor_iva_cop", "retencion_fuente_cop", "estado"]),
+            "calificaciones": self._escritor("calificaciones", [
+                "id_calificacion", "id_servicio", "quien_califica", "puntaje", "comentario", "fecha"]),
+            "alertas": self._escritor("alertas", [
+                "id_alerta", "id_solicitud", "id_recomendacion", "tipo_alerta", "severidad", "detalle", "fecha"]),
+            "clasificacion_logs": self._escritor("clasificacion_logs", [
+                "id_log", "id_solicitud", "texto_original", "id_oficio_predicho", "confianza", "modelo_version",
+                "fecha"]),
+        }
+        ids = {"servicio": 0, "recomendacion": 0, "calificacion": 0, "alerta": 0}
+        plantillas = np.array(PLANTILLAS_SOLICITUD)
+
+        for inicio in range(0, n, self.args.lote):
+            fin = min(n, inicio + self.args.lote)
+            m = fin - inicio
+            id_solicitud = np.arange(inicio + 1, fin + 1)
+
+            # --- Solicitudes: demanda creciente en el tiempo, oficios y ciudades sesgados.
+            # Las fechas crecen con el id, como en una tabla de solo-inserción real.
+            solicitante = rng.integers(0, self.args.solicitantes, m)
+            barrio = self.solicitante_barrio[solicitante]
+            ciudad = self.barrio_ciudad[barrio]
+            oficio = rng.choice(n_oficios, size=m, p=self.peso_oficio)
+            urgencia = rng.choice(URGENCIAS, size=m, p=P_URGENCIA)
+            cuantil = (id_solicitud - 1 + rng.random(m)) / n
+            segundos_atras = (DIAS_HISTORIA * 86400 * (1 - np.sqrt(cuantil))).astype(np.int64)
+            fecha = self.fecha_fin - segundos_atras.astype("timedelta64[s]")
+            estrato = self.barrio_estrato[barrio]
+            precio = redondear_miles(
+                (self.oficio_tarifa_visita[oficio] + 2 * self.oficio_tarifa_hora[oficio]) * FACTOR_ESTRATO[estrato - 1]
+            )
+            descripcion = np.char.replace(
+                plantillas[rng.integers(0, len(plantillas), m)], "{o}", np.char.lower(self.oficio_nombre[oficio])
+            )
+
+            # --- Servicios: 70% de las solicitudes con más de 2 días, asignadas a un
+            # trabajador del mismo oficio y ciudad (sesgo hacia los mejor calificados)
+            antigua = segundos_atras > 2 * 86400
+            con_servicio = antigua & (rng.random(m) < 0.7)
+            fila_to = self._elegir_en_grupo(self.grupo_clave, self.grupo_orden, ciudad * n_oficios + oficio, 2.5)
+            sin_local = fila_to < 0
+            fila_to[sin_local] = self._elegir_en_grupo(self.oficio_clave, self.oficio_orden, oficio[sin_local], 2.5)
+            con_servicio &= fila_to >= 0
+
+            idx = np.flatnonzero(con_servicio)
+            k = len(idx)
+            fila = fila_to[idx]
+            trabajador = self.to_trabajador[fila]
+            muy_antigua = segundos_atras[idx] > 14 * 86400
+            estado_servicio = np.where(
+                muy_antigua,
+                rng.choice(["completado", "cancelado", "en_proceso"], size=k, p=[0.88, 0.07, 0.05]),
+                rng.choice(["asignado", "en_proceso", "completado"], size=k, p=[0.3, 0.3, 0.4]),
+            )
+            horas = np.clip(rng.lognormal(np.log(2.0), 0.5, k), 0.5, 16)
+            costo = redondear_miles(self.to_tarifa_visita[fila] + self.to_tarifa_hora[fila] * horas)
+            juridica = self.trabajador_juridica[trabajador]
+            asignacion = fecha[idx] + (rng.exponential(3 * 3600, k)).astype("timedelta64[s]")
+            cerrado = np.isin(estado_servicio, ["completado", "cancelado"])
+            cierre = asignacion + (horas * 3600 + rng.exponential(86400, k)).astype("timedelta64[s]")
+            id_servicio = ids["servicio"] + np.arange(1, k + 1)
+            ids["servicio"] += k
+
+            estado_solicitud = np.full(m, "pendiente", dtype=object)
+            estado_solicitud[~antigua & ~con_servicio] = "pendiente"
+            estado_solicitud[antigua & ~con_servicio] = "cancelada"
+            estado_solicitud[idx] = np.select(
+                [estado_servicio == "completado", estado_servicio == "cancelado"],
+                ["completada", "cancelada"], default="asignada"
+            )
+
+            # --- Alertas: ~2% de las solicitudes
+            con_alerta = rng.random(m) < 0.02
+            a_idx = np.flatnonzero(con_alerta)
+            tipo = rng.integers(0, len(TIPOS_ALERTA), len(a_idx))
+
+            escritores["solicitudes"].escribir(
+                id_solicitud=id_solicitud, id_solicitante=solicitante + 1, id_oficio=oficio + 1,
+                descripcion_usuario=descripcion, urgencia=urgencia, id_barrio_servicio=barrio + 1,
+                fecha_creacion=fechas_texto(fecha), estado=estado_solicitud,
+                precio_estimado_mercado=precio, flag_alerta=con_alerta
+            )
+            escritores["servicios"].escribir(
+                id_servicio=id_servicio, id_solicitud=id_solicitud[idx], id_trabajador=trabajador + 1,
+                fecha_asignacion=fechas_texto(asignacion), fecha_cierre=fechas_texto(cierre, cerrado),
+                costo_final_cop=costo, aplica_iva=juridica,
+                valor_iva_cop=np.where(juridica, np.round(costo * 0.19), 0).astype(np.int64),
+                retencion_fuente_cop=np.where(juridica, np.round(costo * 0.04), 0).astype(np.int64),
+                estado=estado_servicio
+            )
+
+            # --- Recomendaciones: el asignado + 2 alternativas del mismo grupo
+            alternativa1 = self._elegir_en_grupo(self.grupo_clave, self.grupo_orden, (ciudad * n_oficios + oficio)[idx], 1.0)
+            alternativa2 = self._elegir_en_grupo(self.grupo_clave, self.grupo_orden, (ciudad * n_oficios + oficio)[idx], 1.0)
+            filas_rec = np.concatenate([fila, alternativa1, alternativa2])
+            sol_rec = np.tile(idx, 3)
+            asignado = np.concatenate([np.ones(k, bool), np.zeros(2 * k, bool)])
+            validas = filas_rec >= 0
+            validas[k:] &= self.to_trabajador[filas_rec[k:]] != np.tile(trabajador, 2)
+            filas_rec, sol_rec, asignado = filas_rec[validas], sol_rec[validas], asignado[validas]
+            r = len(filas_rec)
+            escritores["recomendaciones"].escribir(
+                id_recomendacion=ids["recomendacion"] + np.arange(1, r + 1),
+                id_solicitud=id_solicitud[sol_rec], id_trabajador=self.to_trabajador[filas_rec] + 1,
+                score_relevancia=np.round(np.clip(rng.beta(5, 2, r) + 0.1 * asignado, 0, 0.999), 3),
+                distancia_km=np.round(np.minimum(rng.gamma(2.0, 2.5, r), 999.99), 2),
+                motivo_top=rng.choice(MOTIVOS, size=r), precio_estimado=precio[sol_rec],
+                precio_propuesto=redondear_miles(self.to_tarifa_visita[filas_rec] + 2 * self.to_tarifa_hora[filas_rec]),
+                explicacion=np.full(r, ""), es_asignado=asignado
+            )
+            ids["recomendacion"] += r
+
+            # --- Calificaciones de servicios completados (del solicitante y a veces del trabajador)
+            completado = estado_servicio == "completado"
+            cal_sol = np.flatnonzero(completado & (rng.random(k) < 0.75))
+            cal_trab = np.flatnonzero(completado & (rng.random(k) < 0.3))
+            cal_idx = np.concatenate([cal_sol, cal_trab])
+            c = len(cal_idx)
+            base = np.concatenate([self.trabajador_rating[trabajador[cal_sol]], np.full(len(cal_trab), 4.5)])
+            puntaje = np.clip(np.round(rng.normal(base, 0.6), 1), 1.0, 5.0)
+            fecha_cal = cierre[cal_idx] + (rng.exponential(2, c) * 86400).astype("timedelta64[s]")
+            escritores["calificaciones"].escribir(
+                id_calificacion=ids["calificacion"] + np.arange(1, c + 1), id_servicio=id_servicio[cal_idx],
+                quien_califica=np.concatenate([np.full(len(cal_sol), "solicitante"), np.full(len(cal_trab), "trabajador")]),
+                puntaje=puntaje, comentario=np.full(c, ""),
+                fecha=np.datetime_as_string(fecha_cal, unit="D")
+            )
+            ids["calificacion"] += c
+
+            escritores["alertas"].escribir(
+                id_alerta=ids["alerta"] + np.arange(1, len(a_idx) + 1), id_solicitud=id_solicitud[a_idx],
+                id_recomendacion=np.full(len(a_idx), ""),
+                tipo_alerta=np.array([t[0] for t in TIPOS_ALERTA])[tipo],
+                severidad=rng.choice(["baja", "media", "alta"], size=len(a_idx), p=[0.5, 0.35, 0.15]),
+                detalle=np.array([t[1] for t in TIPOS_ALERTA])[tipo],
+                fecha=np.datetime_as_string(fecha[a_idx], unit="D")
+            )
+            ids["alerta"] += len(a_idx)
+
+            # --- Logs de clasificación: uno por solicitud, ~5% con oficio equivocado
+            error = rng.random(m) < 0.05
+            escritores["clasificacion_logs"].escribir(
+                id_log=id_solicitud, id_solicitud=id_solicitud, texto_original=descripcion,
+                id_oficio_predicho=np.where(error, rng.integers(0, n_oficios, m), oficio) + 1,
+                confianza=np.round(np.where(error, rng.beta(2, 3, m), rng.beta(9, 1.5, m)), 3),
+                modelo_version=np.full(m, "gemini-2.5-flash"),
+                fecha=fechas_texto(fecha + rng.integers(1, 10, m).astype("timedelta64[s]"))
+            )
+
+            print(f"   ↳ solicitudes: {fin:,}/{n:,}", flush=True)
+
+        for escritor in escritores.values():
+            escritor.cerrar()
+        return {nombre: escritor.filas for nombre, escritor in escritores.items()}
+
+    def generar(self):
+        pasos = [
+            ("ciudades, barrios y oficios", lambda: (self.generar_ciudades(), self.generar_barrios(), self.generar_oficios())),
+            ("solicitantes", self.generar_solicitantes),
+            ("trabajadores", self.generar_trabajadores),
+            ("trabajador_oficio", self.generar_trabajador_oficio),
+            ("operación (solicitudes, servicios, recomendaciones, ...)", self.generar_operacion),
+        ]
+        for descripcion, paso in pasos:
+            inicio = time.perf_counter()
+            print(f"🏗️  Generando {descripcion}...", flush=True)
+            paso()
+            print(f"   ✅ {time.perf_counter() - inicio:,.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos TaskPro")
+    parser.add_argument("--salida", type=Path, default=Path("datos_carga"))
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--fecha-fin", default=date.today().isoformat(),
+                        help="Fecha más reciente de la historia generada (AAAA-MM-DD)")
+    parser.add_argument("--ciudades", type=int, default=20)
+    parser.add_argument("--barrios-por-ciudad", type=int, default=40)
+    parser.add_argument("--solicitantes", type=int, default=200_000)
+    parser.add_argument("--trabajadores", type=int, default=100_000)
+    parser.add_argument("--solicitudes", type=int, default=1_000_000)
+    parser.add_argument("--lote", type=int, default=250_000, help="Filas generadas por bloque")
+    parser.add_argument("--comprimir", action="store_true", help="Escribir .csv.gz")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    GeneradorMarketplace(args).generar()
+    print(f"🎉 Datos generados en {args.salida} ({time.perf_counter() - inicio:,.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
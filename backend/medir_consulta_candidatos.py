@@ -0,0 +1,152 @@
+"""
+Microbenchmark de la consulta de candidatos del pipeline: versión anterior (query ORM
+construida en cada petición) contra la sentencia única de consultas.py, ejecutada como
+sentencia Core cacheada y como sentencia preparada en el servidor.
+
+Mide por separado el costo en Python de construir la consulta y obtener su clave de
+caché de compilación, y la latencia total por llamada. Usa la misma DATABASE_URL del backend.
+
+Ejecutar con: python medir_consulta_candidatos.py [--iteraciones 2000] [--oficio 1] [--ciudad 1]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio app al path para importar los módulos del backend
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+
+import database  # noqa: E402
+from database import (  # noqa: E402
+    SessionLocal, Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad
+)
+import consultas  # noqa: E402
+from consultas import buscar_candidatos, formatear_candidatos  # noqa: E402
+
+# El motor del backend se crea con echo=True; aquí solo estorba
+database.engine.echo = False
+
+
+def query_version_anterior(db, id_oficio, id_ciudad):
+    """Réplica de la consulta que main.py construía en cada petición."""
+    return (
+        db.query(Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad)
+        .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
+        .join(Oficio, TrabajadorOficio.id_oficio == Oficio.id_oficio)
+        .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+        .join(Ciudad, Barrio.id_ciudad == Ciudad.id_ciudad)
+        .filter(
+            Oficio.id_oficio == id_oficio,
+            Ciudad.id_ciudad == id_ciudad,
+            Trabajador.disponibilidad.in_(["disponible", "parcial", "HOY", "INMEDIATA", "PROGRAMADA"])
+        )
+        .order_by(
+            Trabajador.calificacion_promedio.desc(),
+            Trabajador.anos_experiencia.desc(),
+            Trabajador.id_trabajador
+        )
+        .limit(15)
+    )
+
+
+def candidatos_version_anterior(db, id_oficio, id_ciudad):
+    filas = query_version_anterior(db, id_oficio, id_ciudad).all()
+    return [
+        {
+            "id_trabajador": t.id_trabajador, "nombre_completo": t.nombre_completo,
+            "anos_experiencia": t.anos_experiencia, "calificacion_promedio": t.calificacion_promedio,
+            "cobertura_km": t.cobertura_km, "disponibilidad": t.disponibilidad, "tiene_arl": t.tiene_arl,
+            "id_oficio": o.id_oficio, "nombre_oficio": o.nombre_oficio,
+            "tarifa_hora_promedio": to.tarifa_hora_promedio, "tarifa_visita": to.tarifa_visita,
+            "nombre_barrio": b.nombre_barrio, "nombre_ciudad": c.nombre_ciudad,
+        }
+        for t, to, o, b, c in filas
+    ]
+
+
+def candidatos_core(db, id_oficio, id_ciudad):
+    consultas.USAR_PREPARADAS = False
+    return buscar_candidatos(db, id_oficio, id_ciudad)
+
+
+def candidatos_preparada(db, id_oficio, id_ciudad):
+    consultas.USAR_PREPARADAS = True
+    return buscar_candidatos(db, id_oficio, id_ciudad)
+
+
+def percentiles(tiempos):
+    tiempos = sorted(tiempos)
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+
+def medir_llamada(funcion, db, iteraciones, id_oficio, id_ciudad):
+    funcion(db, id_oficio, id_ciudad)  # calentamiento (y PREPARE)
+    db.expunge_all()
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion(db, id_oficio, id_ciudad)
+        tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+        db.expunge_all()
+    return percentiles(tiempos)
+
+
+def medir_construccion(iteraciones, id_oficio, id_ciudad, db):
+    """µs en Python para dejar lista la sentencia antes de ir a la caché de compilación.
+
+    SQLAlchemy reutiliza el SQL compilado según la clave de caché de la sentencia, así
+    que por petición se paga construir el objeto (solo la versión anterior) más generar
+    esa clave (en ambas). La sentencia de consultas.py ya está construida.
+    """
+    sentencia = consultas.SENTENCIAS_CANDIDATOS["candidatos_ciudad"]
+    anterior, actual = [], []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        query_version_anterior(db, id_oficio, id_ciudad).statement._generate_cache_key()
+        anterior.append((time.perf_counter() - inicio) * 1_000_000)
+
+        inicio = time.perf_counter()
+        sentencia._generate_cache_key()
+        actual.append((time.perf_counter() - inicio) * 1_000_000)
+    return percentiles(anterior), percentiles(actual)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark de la consulta de candidatos")
+    parser.add_argument("--iteraciones", type=int, default=2000)
+    parser.add_argument("--oficio", type=int, default=1)
+    parser.add_argument("--ciudad", type=int, default=1)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        anterior = formatear_candidatos(candidatos_version_anterior(db, args.oficio, args.ciudad))
+        for nombre, funcion in (("core", candidatos_core), ("preparada", candidatos_preparada)):
+            if formatear_candidatos(funcion(db, args.oficio, args.ciudad)) != anterior:
+                print(f"❌ La versión {nombre} no devuelve los mismos candidatos que la anterior")
+                return
+        print(f"✅ Mismos candidatos en las tres versiones ({anterior.count(chr(10)) + 1 if anterior else 0})")
+
+        (ant_med, ant_p95), (act_med, act_p95) = medir_construccion(args.iteraciones, args.oficio, args.ciudad, db)
+        print(f"\n📊 Construcción + clave de caché en Python ({args.iteraciones} iteraciones, µs)")
+        print(f"{'versión':<12}{'mediana':>10}{'p95':>10}")
+        print(f"{'anterior':<12}{ant_med:>10.1f}{ant_p95:>10.1f}")
+        print(f"{'actual':<12}{act_med:>10.1f}{act_p95:>10.1f}")
+
+        print(f"\n📊 Llamada completa ({args.iteraciones} iteraciones, µs)")
+        print(f"{'versión':<12}{'mediana':>10}{'p95':>10}")
+        for nombre, funcion in (
+            ("anterior", candidatos_version_anterior),
+            ("core", candidatos_core),
+            ("preparada", candidatos_preparada),
+        ):
+            mediana, p95 = medir_llamada(funcion, db, args.iteraciones, args.oficio, args.ciudad)
+            print(f"{nombre:<12}{mediana:>10.1f}{p95:>10.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
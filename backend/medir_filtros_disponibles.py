@@ -0,0 +1,141 @@
+"""
+Benchmark de /trabajadores/filtros/disponibles: versión anterior (una consulta por
+faceta) contra la versión actual (una sola sentencia con agregados FILTER).
+
+Mide número de consultas SQL y latencia por llamada para varias combinaciones de
+filtros. Usa la misma DATABASE_URL del backend.
+
+Ejecutar con: python medir_filtros_disponibles.py [--iteraciones 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import event, func
+
+# Agregar el directorio app al path para importar los módulos del backend
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+
+import database  # noqa: E402
+from database import (  # noqa: E402
+    SessionLocal, Trabajador, TrabajadorOficio, Oficio, Barrio, Ciudad
+)
+import main  # noqa: E402
+
+# El motor del backend se crea con echo=True; aquí solo estorba
+database.engine.echo = False
+
+
+def filtros_version_anterior(db, ciudad_id=None, oficio_id=None):
+    """Réplica de la implementación anterior: ~7 consultas que re-unen las mismas tablas."""
+    trabajadores_query = db.query(Trabajador)
+    if ciudad_id is not None:
+        trabajadores_query = (
+            trabajadores_query
+            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+            .filter(Barrio.id_ciudad == ciudad_id)
+        )
+    if oficio_id is not None:
+        trabajadores_query = (
+            trabajadores_query
+            .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
+            .filter(TrabajadorOficio.id_oficio == oficio_id)
+        )
+
+    ciudades = (
+        db.query(Ciudad, func.count(Trabajador.id_trabajador).label('total'))
+        .join(Barrio, Ciudad.id_ciudad == Barrio.id_ciudad)
+        .join(Trabajador, Barrio.id_barrio == Trabajador.id_barrio)
+    )
+    if oficio_id is not None:
+        ciudades = (
+            ciudades
+            .join(TrabajadorOficio, Trabajador.id_trabajador == TrabajadorOficio.id_trabajador)
+            .filter(TrabajadorOficio.id_oficio == oficio_id)
+        )
+    ciudades = ciudades.group_by(Ciudad.id_ciudad).order_by(Ciudad.nombre_ciudad).all()
+
+    oficios = (
+        db.query(Oficio, func.count(func.distinct(Trabajador.id_trabajador)).label('total'))
+        .join(TrabajadorOficio, Oficio.id_oficio == TrabajadorOficio.id_oficio)
+        .join(Trabajador, TrabajadorOficio.id_trabajador == Trabajador.id_trabajador)
+    )
+    if ciudad_id is not None:
+        oficios = (
+            oficios
+            .join(Barrio, Trabajador.id_barrio == Barrio.id_barrio)
+            .filter(Barrio.id_ciudad == ciudad_id)
+        )
+    oficios = oficios.group_by(Oficio.id_oficio).order_by(Oficio.nombre_oficio).all()
+
+    stats = trabajadores_query.with_entities(
+        func.max(Trabajador.calificacion_promedio),
+        func.min(Trabajador.calificacion_promedio)
+    ).first()
+    disponibilidades = trabajadores_query.with_entities(Trabajador.disponibilidad).distinct().all()
+    con_arl = trabajadores_query.filter(Trabajador.tiene_arl == True).count()  # noqa: E712
+    sin_arl = trabajadores_query.filter(Trabajador.tiene_arl == False).count()  # noqa: E712
+    return ciudades, oficios, stats, disponibilidades, con_arl, sin_arl
+
+
+def filtros_version_actual(db, ciudad_id=None, oficio_id=None):
+    """Llama directamente a la función del endpoint actual."""
+    return asyncio.run(main.obtener_filtros_disponibles(ciudad_id=ciudad_id, oficio_id=oficio_id, db=db))
+
+
+def medir(funcion, db, iteraciones, **filtros):
+    """Devuelve (consultas por llamada, mediana ms, p95 ms)."""
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", contar)
+    try:
+        funcion(db, **filtros)  # calentamiento
+        consultas.clear()
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            funcion(db, **filtros)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", contar)
+
+    tiempos.sort()
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1] if len(tiempos) >= 20 else tiempos[-1]
+    return len(consultas) / iteraciones, statistics.median(tiempos), p95
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark de /trabajadores/filtros/disponibles")
+    parser.add_argument("--iteraciones", type=int, default=200)
+    parser.add_argument("--ciudad", type=int, default=1)
+    parser.add_argument("--oficio", type=int, default=1)
+    args = parser.parse_args()
+
+    escenarios = [
+        ("sin filtros", {}),
+        ("ciudad", {"ciudad_id": args.ciudad}),
+        ("oficio", {"oficio_id": args.oficio}),
+        ("ciudad + oficio", {"ciudad_id": args.ciudad, "oficio_id": args.oficio}),
+    ]
+
+    db = SessionLocal()
+    try:
+        print(f"📊 Benchmark filtros disponibles ({args.iteraciones} iteraciones por escenario)")
+        print(f"{'escenario':<18}{'versión':<10}{'consultas':>10}{'mediana ms':>12}{'p95 ms':>10}")
+        for nombre, filtros in escenarios:
+            for version, funcion in (("anterior", filtros_version_anterior), ("actual", filtros_version_actual)):
+                n_consultas, mediana, p95 = medir(funcion, db, args.iteraciones, **filtros)
+                print(f"{nombre:<18}{version:<10}{n_consultas:>10.1f}{mediana:>12.2f}{p95:>10.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
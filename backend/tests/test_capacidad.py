@@ -0,0 +1,197 @@
+"""CapacidadTrabajadores: cupos, vencimiento de reservas, reservas por solicitud, versión y reconciliación."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import capacidad
+from capacidad import CapacidadTrabajadores
+
+
+class _Reloj:
+    """time.monotonic controlable para las pruebas de vencimiento."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+class _Engine:
+    """Engine mínimo para reconciliar(): devuelve {id_trabajador: servicios_en_proceso}."""
+
+    def __init__(self, activos: dict):
+        self.activos = activos
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+    def execute(self, sentencia):
+        return self
+
+    def all(self):
+        return list(self.activos.items())
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = _Reloj()
+    monkeypatch.setattr(capacidad, "time", SimpleNamespace(monotonic=reloj, perf_counter=time.perf_counter))
+    return reloj
+
+
+def test_reservar_respeta_el_maximo(reloj):
+    cupos = CapacidadTrabajadores(maximo=2, duracion_reserva=60)
+
+    assert [cupos.reservar(7) for _ in range(3)] == [True, True, False]
+    assert cupos.disponibles([7, 8]).tolist() == [0, 2]
+    assert cupos.saturados() == {7}
+    assert cupos.metricas()["rechazadas"] == 1
+
+
+def test_la_reserva_vence(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    assert cupos.reservar(7)
+
+    reloj.ahora += 59.9
+    assert cupos.disponibles([7]).tolist() == [0]
+
+    reloj.ahora += 0.2
+    assert cupos.disponibles([7]).tolist() == [1]
+    assert cupos.metricas()["vencidas"] == 1
+    assert cupos.reservar(7)
+
+
+def test_la_version_cambia_solo_al_saturar_o_liberar(reloj):
+    cupos = CapacidadTrabajadores(maximo=2, duracion_reserva=60)
+
+    cupos.reservar(7)
+    assert cupos.version == 0
+    cupos.reservar(7)
+    assert cupos.version == 1
+    cupos.reservar(7)  # rechazada
+    assert cupos.version == 1
+    cupos.liberar(7)
+    assert cupos.version == 2
+    cupos.liberar(7)
+    assert cupos.version == 2
+
+
+def test_el_vencimiento_de_un_saturado_cambia_la_version(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    cupos.reservar(7)
+    version = cupos.version
+
+    reloj.ahora += 61
+    assert cupos.saturados() == set()
+    assert cupos.version == version + 1
+
+
+def test_filtrar_conserva_el_orden_y_no_deja_sin_candidatos(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    candidatos = [{"id_trabajador": i} for i in (3, 1, 2)]
+    cupos.reservar(1)
+
+    assert [c["id_trabajador"] for c in cupos.filtrar(candidatos)] == [3, 2]
+
+    cupos.reservar(3)
+    cupos.reservar(2)
+    assert cupos.filtrar(candidatos) == candidatos
+
+
+def test_reservar_primero_salta_a_los_saturados(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    cupos.reservar(4)
+
+    assert cupos.reservar_primero([4, 9, 5]) == 9
+    assert cupos.reservar_primero([4, 9]) is None
+
+
+def test_reservar_para_una_solicitud_reemplaza_su_reserva(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    assert cupos.reservar_primero([4, 9], id_solicitud=50) == 4
+
+    # La asignación por lotes elige a otro trabajador para la misma solicitud
+    assert cupos.reservar(9, id_solicitud=50)
+    assert cupos.disponibles([4, 9]).tolist() == [1, 0]
+
+    # Renovarla con el mismo trabajador no pide un cupo más
+    assert cupos.reservar(9, id_solicitud=50)
+    assert cupos.metricas()["reservas_vigentes"] == 1
+
+
+def test_sin_cupo_se_conserva_la_reserva_anterior(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    cupos.reservar(4, id_solicitud=50)
+    cupos.reservar(9)
+
+    assert not cupos.reservar(9, id_solicitud=50)
+    assert cupos.disponibles([4, 9]).tolist() == [0, 0]
+
+
+def test_liberar_la_reserva_de_una_solicitud(reloj):
+    cupos = CapacidadTrabajadores(maximo=2, duracion_reserva=60)
+    cupos.reservar(7, id_solicitud=50)
+    cupos.reservar(7, id_solicitud=51)
+
+    cupos.liberar(id_solicitud=51)
+    cupos.liberar(id_solicitud=51)
+    cupos.liberar(id_solicitud=99)
+
+    assert cupos.metricas()["liberadas"] == 1
+    assert cupos.disponibles([7]).tolist() == [1]
+    # La que queda es la de la solicitud 50
+    cupos.liberar(id_solicitud=50)
+    assert cupos.disponibles([7]).tolist() == [2]
+
+
+def test_una_reserva_vencida_deja_libre_a_su_solicitud(reloj):
+    cupos = CapacidadTrabajadores(maximo=1, duracion_reserva=60)
+    cupos.reservar(4, id_solicitud=50)
+
+    reloj.ahora += 61
+    assert cupos.reservar(9, id_solicitud=50)
+    assert cupos.disponibles([4, 9]).tolist() == [1, 0]
+
+
+def test_reconciliar_da_por_concretadas_las_reservas(reloj):
+    cupos = CapacidadTrabajadores(maximo=2, duracion_reserva=60)
+    cupos.reconciliar(_Engine({}))
+    cupos.reservar(7)
+    cupos.reservar(7)
+
+    # La base ya registra uno de los dos servicios reservados
+    cupos.reconciliar(_Engine({7: 1}))
+
+    metricas = cupos.metricas()
+    assert metricas["concretadas"] == 1
+    assert metricas["reservas_vigentes"] == 1
+    assert cupos.disponibles([7]).tolist() == [0]
+
+
+def test_reservas_concurrentes_no_superan_el_maximo():
+    cupos = CapacidadTrabajadores(maximo=3, duracion_reserva=60)
+    aceptadas = []
+    inicio = threading.Barrier(8)
+
+    def reservar():
+        inicio.wait()
+        aceptadas.extend(ok for ok in (cupos.reservar(7) for _ in range(100)) if ok)
+
+    hilos = [threading.Thread(target=reservar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(aceptadas) == 3
+    assert cupos.metricas()["rechazadas"] == 8 * 100 - 3
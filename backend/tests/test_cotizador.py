@@ -0,0 +1,68 @@
+"""cotizador.cotizar: tarifas, horas por oficio y urgencia, redondeo y respaldo de mercado."""
+
+import numpy as np
+import pytest
+
+from cotizador import HORAS_DEFECTO, cotizaciones, cotizar, horas_estimadas
+
+
+def _candidato(tarifa_hora=None, tarifa_visita=None, oficio="Plomero", id_trabajador=1) -> dict:
+    return {
+        "id_trabajador": id_trabajador,
+        "nombre_oficio": oficio,
+        "tarifa_hora_promedio": tarifa_hora,
+        "tarifa_visita": tarifa_visita,
+    }
+
+
+@pytest.mark.parametrize("tarifa_hora, tarifa_visita, urgencia, esperado", [
+    # Plomero: 2 horas en urgencia media
+    (10000, 50000, "media", 50000),   # la visita es el cobro mínimo
+    (40000, 50000, "media", 80000),   # la mano de obra la supera
+    (40000, None, "media", 80000),    # sin visita, solo mano de obra
+    (None, 45000, "media", 45000),    # sin tarifa por hora, solo visita
+    (40000, None, "alta", 72000),     # 1.5 horas y 20% de recargo
+    (40000, None, "baja", 100000),    # 2.5 horas, sin recargo
+    (33333, None, "media", 67000),    # redondeo a miles
+    (40000, None, "URGENTE", 80000),  # urgencia desconocida: como media
+])
+def test_precio_por_tarifas(tarifa_hora, tarifa_visita, urgencia, esperado):
+    precios = cotizar([_candidato(tarifa_hora, tarifa_visita)], urgencia)
+
+    assert precios.dtype == np.int64
+    assert precios.tolist() == [esperado]
+
+
+def test_sin_tarifas_usa_la_mediana_de_mercado():
+    candidatos = [_candidato(id_trabajador=1), _candidato(40000, None, id_trabajador=2)]
+
+    precios = cotizar(candidatos, "media", {"p50": 87400})
+
+    assert precios.tolist() == [87000, 80000]
+
+
+def test_sin_tarifas_ni_mercado_cotiza_cero():
+    assert cotizar([_candidato()], "media").tolist() == [0]
+
+
+def test_horas_por_oficio_sin_tildes_ni_mayusculas():
+    assert horas_estimadas("  ALBAÑIL ", "media") == 8
+    assert horas_estimadas("Técnico de   Lavadoras", "media") == 1.5
+    assert horas_estimadas("Astronauta", "media") == HORAS_DEFECTO
+    assert horas_estimadas(None, None) == HORAS_DEFECTO
+
+
+def test_cada_candidato_con_las_horas_de_su_oficio():
+    candidatos = [
+        _candidato(20000, None, "Cerrajero", id_trabajador=1),
+        _candidato(20000, None, "Pintor", id_trabajador=2),
+    ]
+
+    assert cotizaciones(candidatos, "media") == {1: 20000, 2: 160000}
+
+
+def test_sin_candidatos():
+    precios = cotizar([], "alta")
+
+    assert precios.dtype == np.int64
+    assert len(precios) == 0
@@ -0,0 +1,71 @@
+"""Cubeta.actualizada frente a reconstruir la cubeta desde sus filas."""
+
+import random
+
+import numpy as np
+import pytest
+
+from indice_candidatos import Cubeta, _columnas
+from puntuacion import puntuar, vector_pesos
+from topk import Fragmentos, mejores
+
+from test_topk import _fila
+
+
+def _igual_a_reconstruida(cubeta: Cubeta):
+    reconstruida = Cubeta(list(cubeta.filas))
+    assert [fila["id_trabajador"] for fila in reconstruida.filas] == cubeta.ids.tolist()
+    for atributo in _columnas([]):
+        actual, esperado = getattr(cubeta, atributo), getattr(reconstruida, atributo)
+        assert np.array_equal(actual, esperado, equal_nan=actual.dtype != object), atributo
+
+
+@pytest.mark.parametrize("semilla", [1, 2, 3])
+def test_actualizar_trabajadores_equivale_a_reconstruir(semilla):
+    azar = random.Random(semilla)
+    siguiente = iter(range(1, 10_000))
+    cubeta = Cubeta([_fila(next(siguiente), azar) for _ in range(200)])
+    cubeta._fragmentos = Fragmentos(cubeta, 8)
+    for urgencia in ("alta", "media", "baja"):
+        cubeta.fragmentos.vista(vector_pesos(urgencia))
+
+    for _ in range(60):
+        ids = cubeta.ids.tolist()
+        quitar = set(azar.sample(ids, azar.randint(0, min(3, len(ids)))))
+        # Trabajadores que cambian (salen y vuelven con otros datos) y otros que llegan
+        nuevas = [_fila(i, azar) for i in quitar if azar.random() < 0.5]
+        nuevas += [_fila(next(siguiente), azar) for _ in range(azar.choice([0, 1, 2, 30]))]
+        cubeta = cubeta.actualizada(quitar, nuevas)
+
+        _igual_a_reconstruida(cubeta)
+        for urgencia in ("alta", "media", "baja"):
+            filas, scores, _, _, _ = mejores([cubeta.fragmentos], urgencia, 5)
+            todos, _ = puntuar(cubeta.filas, urgencia)
+            orden = sorted(range(len(cubeta)), key=lambda i: (-todos[i], cubeta.filas[i]["id_trabajador"]))[:5]
+            assert [fila["id_trabajador"] for fila in filas] == [cubeta.filas[i]["id_trabajador"] for i in orden]
+            assert np.allclose(scores, todos[orden])
+
+
+def test_la_vista_conserva_cada_fila_una_vez_y_parte_fragmentos_grandes():
+    azar = random.Random(4)
+    cubeta = Cubeta([_fila(i, azar) for i in range(1, 41)])
+    cubeta._fragmentos = Fragmentos(cubeta, 8)
+    cubeta.fragmentos.vista(vector_pesos("media"))
+
+    cubeta = cubeta.actualizada(set(), [_fila(i, azar) for i in range(41, 141)])
+
+    vista = cubeta.fragmentos.vista(vector_pesos("media"))
+    assert sorted(vista.orden.tolist()) == list(range(len(cubeta)))
+    assert max(vista.tamanos) <= 2 * 8
+    assert list(vista.clave) == sorted(vista.clave, reverse=True)
+
+
+def test_quitar_todas_las_filas():
+    azar = random.Random(5)
+    cubeta = Cubeta([_fila(i, azar) for i in (1, 2, 3)])
+    cubeta.fragmentos.vista(vector_pesos("alta"))
+
+    vacia = cubeta.actualizada({1, 2, 3}, [])
+
+    assert len(vacia) == 0
+    assert vacia.filas == []
@@ -0,0 +1,133 @@
+"""topk.mejores frente a puntuar y ordenar a todos los candidatos."""
+
+import random
+
+import numpy as np
+import pytest
+
+from indice_candidatos import Cubeta
+from puntuacion import puntuar
+from topk import Fragmentos, mejores
+
+
+DISPONIBILIDADES = ["HOY", "INMEDIATA", "disponible", "parcial", "PROGRAMADA", None]
+
+
+def _fila(id_trabajador: int, azar: random.Random, con_precio: bool = True) -> dict:
+    # Pocos valores distintos por columna: así hay empates de score que se desempatan por id
+    return {
+        "id_trabajador": id_trabajador,
+        "calificacion_promedio": azar.choice([3.5, 4.0, 4.5, 5.0]),
+        "anos_experiencia": azar.choice([0, 2, 5, 10, 20]),
+        "tarifa_visita": azar.choice([None, 40000, 60000, 90000]) if con_precio else None,
+        "tarifa_hora_promedio": azar.choice([None, 25000, 35000]) if con_precio else None,
+        "cobertura_km": 10,
+        "latitud": 4.6,
+        "longitud": -74.1,
+        "disponibilidad": azar.choice(DISPONIBILIDADES),
+    }
+
+
+def _cubetas(tamanos: list, semilla: int, tamano_fragmento: int, con_precio: bool = True) -> list:
+    azar = random.Random(semilla)
+    siguiente = iter(range(1, sum(tamanos) + 1))
+    cubetas = []
+    for n in tamanos:
+        cubeta = Cubeta([_fila(next(siguiente), azar, con_precio) for _ in range(n)])
+        cubeta._fragmentos = Fragmentos(cubeta, tamano_fragmento)
+        cubetas.append(cubeta)
+    return cubetas
+
+
+def _por_fuerza_bruta(cubetas: list, urgencia: str, k: int) -> tuple:
+    """Ids y scores de los k mejores puntuando a todos y ordenando por (-score, id)."""
+    filas = [fila for cubeta in cubetas for fila in cubeta.filas]
+    scores, _ = puntuar(filas, urgencia)
+    orden = sorted(range(len(filas)), key=lambda i: (-scores[i], filas[i]["id_trabajador"]))[:k]
+    return [filas[i]["id_trabajador"] for i in orden], scores[orden]
+
+
+@pytest.mark.parametrize("urgencia", ["alta", "media", "baja"])
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_mejores_coincide_con_ordenar_todos(urgencia, k):
+    cubetas = _cubetas([300, 57, 1, 120], semilla=7, tamano_fragmento=16)
+
+    filas, scores, contribuciones, total, _ = mejores([c.fragmentos for c in cubetas], urgencia, k)
+
+    ids_esperados, scores_esperados = _por_fuerza_bruta(cubetas, urgencia, k)
+    assert [fila["id_trabajador"] for fila in filas] == ids_esperados
+    assert np.allclose(scores, scores_esperados)
+    assert np.allclose(contribuciones.sum(axis=1), scores)
+    assert total == 478
+
+
+@pytest.mark.parametrize("urgencia", ["alta", "baja"])
+def test_mejores_sin_precios(urgencia):
+    # Nadie tiene tarifa: el componente de precio queda neutro para todos
+    cubetas = _cubetas([90, 40], semilla=3, tamano_fragmento=8, con_precio=False)
+
+    filas, scores, _, _, _ = mejores([c.fragmentos for c in cubetas], urgencia, 10)
+
+    ids_esperados, scores_esperados = _por_fuerza_bruta(cubetas, urgencia, 10)
+    assert [fila["id_trabajador"] for fila in filas] == ids_esperados
+    assert np.allclose(scores, scores_esperados)
+
+
+def test_empates_se_resuelven_por_id():
+    fila = {
+        "calificacion_promedio": 4.0, "anos_experiencia": 5, "tarifa_visita": 50000,
+        "tarifa_hora_promedio": None, "cobertura_km": 10, "latitud": 4.6, "longitud": -74.1,
+        "disponibilidad": "HOY",
+    }
+    cubeta = Cubeta([{**fila, "id_trabajador": i} for i in (9, 3, 7, 1, 5)])
+    cubeta._fragmentos = Fragmentos(cubeta, 2)
+
+    filas, _, _, _, _ = mejores([cubeta.fragmentos], "media", 3)
+
+    assert [f["id_trabajador"] for f in filas] == [1, 3, 5]
+
+
+def test_las_cotas_evitan_puntuar_todo():
+    cubetas = _cubetas([4000], semilla=11, tamano_fragmento=64)
+
+    _, _, _, total, puntuadas = mejores([c.fragmentos for c in cubetas], "media", 5)
+
+    assert total == 4000
+    assert puntuadas < total
+
+
+@pytest.mark.parametrize("urgencia", ["alta", "media", "baja"])
+def test_excluir_equivale_a_quitarlos_del_grupo(urgencia):
+    cubetas = _cubetas([300, 57, 120], semilla=9, tamano_fragmento=16)
+    filas = [fila for cubeta in cubetas for fila in cubeta.filas]
+    precio = lambda fila: fila["tarifa_visita"] or fila["tarifa_hora_promedio"]
+    con_precio = [fila for fila in filas if precio(fila) is not None]
+    # Los más baratos y los más caros (cambian el rango de precios), los mejores y algunos más
+    ids_mejores, _ = _por_fuerza_bruta(cubetas, urgencia, 10)
+    excluir = {fila["id_trabajador"] for fila in con_precio if precio(fila) in (40000, 90000)}
+    excluir |= set(ids_mejores) | {fila["id_trabajador"] for fila in filas[::7]} | {10_000}
+
+    seleccion, scores, _, total, _ = mejores([c.fragmentos for c in cubetas], urgencia, 10, excluir)
+
+    restantes = [Cubeta([f for f in c.filas if f["id_trabajador"] not in excluir]) for c in cubetas]
+    ids_esperados, scores_esperados = _por_fuerza_bruta(restantes, urgencia, 10)
+    assert [fila["id_trabajador"] for fila in seleccion] == ids_esperados
+    assert np.allclose(scores, scores_esperados)
+    assert total == sum(len(c) for c in restantes)
+
+
+def test_excluir_a_todos():
+    cubetas = _cubetas([20], semilla=2, tamano_fragmento=4)
+
+    filas, _, _, total, _ = mejores([c.fragmentos for c in cubetas], "media", 5, set(cubetas[0].ids.tolist()))
+
+    assert filas == [] and total == 0
+
+
+def test_k_mayor_que_los_candidatos():
+    cubetas = _cubetas([6], semilla=5, tamano_fragmento=4)
+
+    filas, scores, _, total, _ = mejores([c.fragmentos for c in cubetas], "alta", 10)
+
+    assert len(filas) == total == 6
+    assert list(scores) == sorted(scores, reverse=True)